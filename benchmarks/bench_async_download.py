@@ -0,0 +1,89 @@
+# Pages/sec through the cache server at concurrency 1/8/64: thread workers calling
+# utils.download.download against the asyncio AsyncDownloader, both talking to a
+# local stand-in server (utils.local_cache_server) with a fixed latency per request.
+# Then a check against a server that closes idle keep-alive connections: a second
+# batch after the pooled connections were closed must still come back 200.
+# run from the repo root: python benchmarks/bench_async_download.py [latency_ms]
+import os
+import sys
+import time
+import asyncio
+import multiprocessing
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.download import download
+from utils.async_download import AsyncDownloader
+from utils.local_cache_server import LocalCacheServer
+
+PAGE = b"<html><body>" + b"<p>some words on a page</p>" * 400 + b"</body></html>"
+
+
+def threaded(config, urls, concurrency):
+    with ThreadPoolExecutor(concurrency) as pool:
+        return list(pool.map(lambda url: download(url, config), urls))
+
+
+def with_asyncio(config, urls, concurrency):
+    async def run():
+        downloader = AsyncDownloader(config, pool_size=concurrency)
+        try:
+            return await asyncio.gather(*(downloader.fetch(url) for url in urls))
+        finally:
+            downloader.close()
+    return asyncio.run(run())
+
+
+def stale_connections(idle_timeout=0.2, concurrency=8):
+    server = LocalCacheServer(lambda url: (200, PAGE, None), idle_timeout=idle_timeout)
+    config = SimpleNamespace(cache_server=server.start(), user_agent="IR benchmark")
+
+    async def run():
+        downloader = AsyncDownloader(config, pool_size=concurrency)
+        try:
+            urls = [f"https://www.ics.uci.edu/page/{i}" for i in range(concurrency * 4)]
+            first = await asyncio.gather(*(downloader.fetch(url) for url in urls))
+            pooled = len(downloader.idle)
+            await asyncio.sleep(idle_timeout * 3)  # the server closes every pooled connection
+            second = await asyncio.gather(*(downloader.fetch(url) for url in urls))
+            return pooled, first + second
+        finally:
+            downloader.close()
+    try:
+        pooled, responses = asyncio.run(run())
+    finally:
+        server.stop()
+    failed = sum(resp.status != 200 for resp in responses)
+    print(f"server closing idle connections after {idle_timeout}s: {pooled} pooled connections went stale, "
+          f"{failed} of {len(responses)} urls failed")
+    assert pooled and not failed, "a stale pooled connection failed its url"
+
+
+def serve(latency, conn):
+    server = LocalCacheServer(lambda url: (200, PAGE, None), latency=latency)
+    conn.send(server.address)
+    server.httpd.serve_forever()
+
+
+def main(latency_ms=20):
+    # the server gets its own process so it doesn't fight the client for the GIL
+    parent_conn, child_conn = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=serve, args=(latency_ms / 1000, child_conn), daemon=True)
+    server.start()
+    config = SimpleNamespace(cache_server=parent_conn.recv(), user_agent="IR benchmark")
+    print(f"stand-in cache server at {config.cache_server}, {latency_ms}ms per request")
+    for concurrency in (1, 8, 64):
+        urls = [f"https://www.ics.uci.edu/page/{i}" for i in range(max(50, concurrency * 10))]
+        for name, func in (("threads + download", threaded), ("AsyncDownloader", with_asyncio)):
+            start = time.perf_counter()
+            responses = func(config, urls, concurrency)
+            elapsed = time.perf_counter() - start
+            assert all(resp.status == 200 and resp.raw_response.content == PAGE for resp in responses)
+            print(f"concurrency {concurrency:>2} {name:<20} {len(urls) / elapsed:>8.1f} pages/s")
+    server.terminate()
+    stale_connections()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
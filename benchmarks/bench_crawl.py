@@ -0,0 +1,107 @@
+# End to end offline crawl: the whole Crawler -> Worker -> scraper -> Frontier loop
+# against a replay server (utils/replay.py) serving a recorded or synthetic
+# corpus. Each configuration runs in its own process and reports throughput,
+# download and parse latency percentiles, CPU time and peak RSS.
+# run from the repo root: python benchmarks/bench_crawl.py [corpus_file] [latency_ms]
+# (with no corpus file a 2000 page synthetic one is made)
+import os
+import sys
+import time
+import resource
+import tempfile
+import multiprocessing
+from configparser import ConfigParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from utils.replay import replay_server, write_synthetic_corpus, SEED_HOSTS
+
+CONFIGURATIONS = [
+    ("1 thread", {"THREADCOUNT": "1"}),
+    ("4 threads", {"THREADCOUNT": "4"}),
+    ("8 threads", {"THREADCOUNT": "8"}),
+    ("async x16", {"DOWNLOADER": "async", "ASYNCCONCURRENCY": "16"}),
+    ("4 threads + 2 parsers", {"THREADCOUNT": "4", "PARSEPROCESSES": "2"}),
+]
+
+
+def serve(path, latency, conn):
+    server = replay_server(path, latency=latency)
+    conn.send(server.address)
+    server.httpd.serve_forever()
+
+
+def crawl(address, overrides, seeds, conn):
+    # fresh process per configuration, so peak RSS and CPU are its own
+    workdir = tempfile.mkdtemp()
+    os.chdir(workdir)  # Logs/, the save file and crawler_log.json land here
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+
+    import scraper
+    from crawler import Crawler, worker
+    from utils.config import Config
+    from utils.metrics import metrics
+
+    cparser = ConfigParser()
+    cparser.read(os.path.join(ROOT, "config.ini"))
+    cparser["CRAWLER"]["SEEDURL"] = ",".join(seeds)
+    cparser["CRAWLER"]["POLITENESS"] = "0"
+    cparser["LOCAL PROPERTIES"]["SAVE"] = "frontier.db"
+    cparser["LOCAL PROPERTIES"]["STORE"] = "sqlite"
+    cparser["LOCAL PROPERTIES"]["METRICSFILE"] = ""
+    for key, value in overrides.items():
+        section = "LOCAL PROPERTIES" if key == "THREADCOUNT" else "CRAWLER"
+        cparser[section][key] = value
+    config = Config(cparser)
+    config.cache_server = address
+    scraper.configure_log(config.checkpoint_pages, config.checkpoint_secs, fresh=True)
+
+    start = time.perf_counter()
+    crawler = Crawler(config, True)
+    crawler.start()
+    elapsed = time.perf_counter() - start
+
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    download = metrics.histogram("download_seconds")
+    parse = metrics.histogram("parse_seconds")
+    conn.send({
+        "pages": worker.PAGES_DOWNLOADED.total(),
+        "elapsed": elapsed,
+        "download": [download.quantile(q) for q in (0.5, 0.9, 0.99)],
+        "parse": [parse.quantile(q) for q in (0.5, 0.9, 0.99)],
+        "cpu": own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime,
+        "rss_mb": max(own.ru_maxrss, children.ru_maxrss) / 1024,
+    })
+
+
+def main(corpus=None, latency_ms=5):
+    seeds = [f"https://{host}" for host in SEED_HOSTS]
+    if corpus is None:
+        corpus = os.path.join(tempfile.mkdtemp(), "synthetic.corpus")
+        seeds = write_synthetic_corpus(corpus, pages=2000)
+    context = multiprocessing.get_context("spawn")
+    parent_conn, child_conn = context.Pipe()
+    server = context.Process(target=serve, args=(corpus, latency_ms / 1000, child_conn), daemon=True)
+    server.start()
+    address = parent_conn.recv()
+    print(f"corpus {corpus}, {latency_ms}ms per request")
+    print(f"{'configuration':<22} {'pages':>6} {'pages/s':>8} "
+          f"{'download p50/p90/p99 ms':>24} {'parse p50/p90/p99 ms':>21} {'cpu s':>6} {'rss MB':>7}")
+    for name, overrides in CONFIGURATIONS:
+        receive, send = context.Pipe()
+        process = context.Process(target=crawl, args=(address, overrides, seeds, send))
+        process.start()
+        stats = receive.recv()
+        process.join()
+        download = "/".join(f"{value * 1000:.1f}" for value in stats["download"])
+        parse = "/".join(f"{value * 1000:.1f}" for value in stats["parse"])
+        print(f"{name:<22} {stats['pages']:>6} {stats['pages'] / stats['elapsed']:>8.1f} "
+              f"{download:>24} {parse:>21} {stats['cpu']:>6.1f} {stats['rss_mb']:>7.1f}")
+    server.terminate()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else None, int(sys.argv[2]) if len(sys.argv) > 2 else 5)
@@ -0,0 +1,186 @@
+# FRONTIERORDER = lifo against priority (crawler/scoring.py) on a replayed
+# site built to waste a LIFO crawl's fetches: shallow content pages on
+# www.ics.uci.edu and on subdomains only linked from here and there, next to
+# traps the TRAP_PATTERNS don't know about, a day by day events archive whose
+# every day has list/grid/print copies, and a people directory with a faceted
+# ?dept=&role= copy per combination. Each order crawls the whole site in its own
+# process with one thread, and the bench counts the unique pages (the ones that
+# made it into the stats) found per 1,000 fetches and how soon the subdomains
+# turned up.
+# run from the repo root: python benchmarks/bench_frontier_order.py [content_pages]
+import os
+import sys
+import time
+import random
+import tempfile
+import multiprocessing
+from datetime import date, timedelta
+from configparser import ConfigParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from utils.local_cache_server import encode_payload
+from utils.replay import CorpusWriter, VOCABULARY, replay_server
+
+SUBDOMAINS = 20
+DEPTS = ["cs", "stats", "informatics", "ece", "math", "bio"]
+ROLES = ["faculty", "staff", "student", "postdoc", "emeritus"]
+VARIANTS = ["list", "grid", "print"]
+FIRST_DAY = date(2023, 1, 1)
+DAYS = 730
+CHECKPOINTS = (500, 1000, 2000)
+
+
+def html(rng, words, links):
+    start = rng.randrange(len(VOCABULARY) - 400)
+    topic = VOCABULARY[start:start + 400]
+    text = " ".join(rng.choice(topic) for _ in range(words))
+    anchors = "".join(f'<a href="{link}">{link}</a>' for link in links)
+    return f"<html><body><p>{text}</p>{anchors}</body></html>".encode("utf-8")
+
+
+def write_site(path, content_pages=500, seed=121):
+    ''' The site as a corpus file, returns the seed urls. '''
+    rng = random.Random(seed)
+    www = "https://www.ics.uci.edu"
+    hosts = [f"https://sub{i}.ics.uci.edu" for i in range(SUBDOMAINS)]
+    per_sub = content_pages // 10
+    day_url = lambda day: f"{www}/events/{day.year}/{day.month:02d}/{day.day:02d}"
+    random_day = lambda: day_url(FIRST_DAY + timedelta(days=rng.randrange(DAYS)))
+    if os.path.exists(path):
+        os.remove(path)
+    writer = CorpusWriter(path)
+
+    def page(url, content):
+        writer.record(url, encode_payload(url, 200, content))
+
+    page(www, html(rng, 200, [f"{www}/p/{i}" for i in range(5)] + [random_day(), f"{www}/people"]))
+    for i in range(content_pages):
+        links = [f"{www}/p/{(i + j) % content_pages}" for j in (1, 2)]
+        links += [f"{www}/p/{rng.randrange(content_pages)}" for _ in range(2)]
+        links += [random_day() for _ in range(2)]
+        if rng.random() < 0.1:
+            links.append(rng.choice(hosts))
+        page(f"{www}/p/{i}", html(rng, rng.randint(150, 800), links))
+    for host in hosts:
+        page(host, html(rng, 200, [f"{host}/p/{i}" for i in range(3)]))
+        for i in range(per_sub):
+            links = [f"{host}/p/{(i + j) % per_sub}" for j in (1, 2)]
+            links += [f"{www}/p/{rng.randrange(content_pages)}", random_day()]
+            page(f"{host}/p/{i}", html(rng, rng.randint(150, 800), links))
+    for n in range(DAYS):
+        # a new day is new text, its copies are exact duplicates of it
+        day = FIRST_DAY + timedelta(days=n)
+        url = day_url(day)
+        links = [day_url(day - timedelta(days=1)), day_url(day + timedelta(days=1))]
+        links += [f"{url}/{variant}" for variant in VARIANTS] + [f"{www}/p/{rng.randrange(content_pages)}"]
+        content = html(rng, 80, links)
+        page(url, content)
+        for variant in VARIANTS:
+            page(f"{url}/{variant}", content)
+    facets = [f"{www}/people?dept={dept}&role={role}" for dept in DEPTS for role in ROLES]
+    directory = html(rng, 400, facets)
+    page(f"{www}/people", directory)
+    for url in facets:
+        page(url, directory)
+    writer.close()
+    return [www]
+
+
+def serve(path, conn):
+    server = replay_server(path)
+    conn.send(server.address)
+    server.httpd.serve_forever()
+
+
+def crawl(address, order, seeds, conn):
+    workdir = tempfile.mkdtemp()
+    os.chdir(workdir)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+
+    import scraper
+    from crawler import Crawler
+    from utils.config import Config
+
+    cparser = ConfigParser()
+    cparser.read(os.path.join(ROOT, "config.ini"))
+    cparser["CRAWLER"]["SEEDURL"] = ",".join(seeds)
+    cparser["CRAWLER"]["POLITENESS"] = "0"
+    cparser["CRAWLER"]["RATECONTROL"] = "fixed"
+    cparser["CRAWLER"]["FRONTIERORDER"] = order
+    cparser["LOCAL PROPERTIES"]["THREADCOUNT"] = "1"  # one fetch at a time, the order is all that differs
+    cparser["LOCAL PROPERTIES"]["SAVE"] = "frontier.db"
+    cparser["LOCAL PROPERTIES"]["STORE"] = "sqlite"
+    cparser["LOCAL PROPERTIES"]["METRICSFILE"] = ""
+    config = Config(cparser)
+    config.cache_server = address
+    scraper.configure_log(config.checkpoint_pages, config.checkpoint_secs, fresh=True)
+
+    crawler = Crawler(config, True)
+    outcomes = []  # (url, outcome) in fetch order
+    learn = scraper.page_outcomes  # the scorer's, None with lifo
+
+    def note(url, outcome):
+        outcomes.append((url, outcome))
+        if learn is not None:
+            learn(url, outcome)
+    scraper.page_outcomes = note
+    start = time.perf_counter()
+    crawler.start()
+    conn.send({"outcomes": outcomes, "elapsed": time.perf_counter() - start})
+
+
+def summary(outcomes):
+    unique = [outcome == "unique" for _, outcome in outcomes]
+    total = sum(unique)
+    found, to_90 = 0, len(unique)
+    for fetches, good in enumerate(unique, 1):
+        found += good
+        if found >= 0.9 * total:
+            to_90 = fetches
+            break
+    hosts = {}
+    for fetches, (url, outcome) in enumerate(outcomes, 1):
+        if outcome == "unique":
+            hosts.setdefault(url.split("/")[2], fetches)
+    subdomains = sorted(fetches for host, fetches in hosts.items() if host.startswith("sub"))
+    return {
+        "fetches": len(unique),
+        "unique": total,
+        "per_1000": [sum(unique[:n]) for n in CHECKPOINTS],
+        "to_90": to_90,
+        "subdomains": [sum(fetches <= n for fetches in subdomains) for n in CHECKPOINTS],
+    }
+
+
+def main(content_pages=500):
+    corpus = os.path.join(tempfile.mkdtemp(), "site.corpus")
+    seeds = write_site(corpus, content_pages)
+    context = multiprocessing.get_context("spawn")
+    parent_conn, child_conn = context.Pipe()
+    server = context.Process(target=serve, args=(corpus, child_conn), daemon=True)
+    server.start()
+    address = parent_conn.recv()
+    checkpoints = "/".join(str(n) for n in CHECKPOINTS)
+    print(f"{content_pages} content pages on www, {content_pages // 10} on each of {SUBDOMAINS} subdomains, "
+          f"{DAYS} event days with {len(VARIANTS)} copies each, {len(DEPTS) * len(ROLES)} people facets")
+    print(f"{'order':<9} {'fetches':>8} {'unique':>7} {'seconds':>8} "
+          f"{f'unique in first {checkpoints}':>28} {'fetches to 90%':>15} {f'subdomains by {checkpoints}':>24}")
+    for order in ("lifo", "priority"):
+        receive, send = context.Pipe()
+        process = context.Process(target=crawl, args=(address, order, seeds, send))
+        process.start()
+        stats = receive.recv()
+        process.join()
+        result = summary(stats["outcomes"])
+        firsts = "/".join(str(n) for n in result["per_1000"])
+        subdomains = "/".join(str(n) for n in result["subdomains"])
+        print(f"{order:<9} {result['fetches']:>8} {result['unique']:>7} {stats['elapsed']:>8.1f} "
+              f"{firsts:>28} {result['to_90']:>15} {subdomains:>24}")
+    server.terminate()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,77 @@
+# add_url throughput of the old sync-per-url shelve Frontier against the batched
+# storage backends in crawler/storage.py.
+# run from the repo root: python benchmarks/bench_frontier_store.py [urls] [old_urls]
+# The old frontier gets slower as it grows (with dbm.dumb every sync rewrites the
+# whole index), so by default it only gets 10k urls.
+import os
+import sys
+import shelve
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import get_urlhash, normalize
+from crawler.storage import STORES
+
+
+class OldFrontier(object):
+    # add_url as it was: disk membership test and a sync for every url
+    def __init__(self, path):
+        self.save = shelve.open(path)
+        self.to_be_downloaded = list()
+
+    def add_url(self, url):
+        url = normalize(url)
+        urlhash = get_urlhash(url)
+        if urlhash not in self.save:
+            self.save[urlhash] = (url, False)
+            self.save.sync()
+            self.to_be_downloaded.append(url)
+
+    def close(self):
+        self.save.close()
+
+
+class NewFrontier(object):
+    # the in-memory seen set + batched store that Frontier uses now
+    def __init__(self, store, path):
+        self.save = STORES[store](path)
+        self.seen = set()
+        self.to_be_downloaded = list()
+
+    def add_url(self, url):
+        url = normalize(url)
+        urlhash = get_urlhash(url)
+        if urlhash not in self.seen:
+            self.seen.add(urlhash)
+            self.save.put(urlhash, url, False)
+            self.to_be_downloaded.append(url)
+
+    def close(self):
+        self.save.close()
+
+
+def run(frontier, count):
+    # every url is added twice, like a link seen on two pages
+    start = time.perf_counter()
+    for i in range(count):
+        frontier.add_url(f"https://www.ics.uci.edu/page/{i}")
+        if i % 2:
+            frontier.add_url(f"https://www.ics.uci.edu/page/{i - 1}")
+    frontier.close()
+    return count * 1.5 / (time.perf_counter() - start)
+
+
+def main(count=1000000, old_count=10000):
+    tmp = tempfile.mkdtemp()
+    print(f"old shelve, sync per url   ({old_count} urls): "
+          f"{run(OldFrontier(os.path.join(tmp, 'old.shelve')), old_count):>10.0f} add_url/s")
+    # shelve sits on the same dbm as the old frontier, so compare them at the same size
+    for store, size in (("shelve", old_count), ("sqlite", old_count), ("sqlite", count)):
+        frontier = NewFrontier(store, os.path.join(tmp, f"new{size}.{store}"))
+        print(f"{store + ', batched':<26} ({size} urls): {run(frontier, size):>10.0f} add_url/s")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    main(*args)
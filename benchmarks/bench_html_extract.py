@@ -0,0 +1,87 @@
+# Parse time per MB and peak memory of the one pass extractor (html_extract.py)
+# against BeautifulSoup + get_text + find_all, after checking both give the same
+# text and links on a fixture corpus (fails when they don't).
+# run from the repo root: python benchmarks/bench_html_extract.py
+import os
+import sys
+import time
+import random
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bs4 import BeautifulSoup
+from html_extract import extract_text_and_links
+from scraper import extract_next_links
+
+BASE_URL = "https://www.ics.uci.edu/dept/people/index.html"
+
+# small pages with the awkward bits: entities, scripts, comments, templates,
+# valueless and duplicate hrefs, unclosed tags, other encodings, byte order marks
+FIXTURES = [
+    b"<html><head><title>T &amp; x</title><style>p{}</style><script>var a='<a href=x>';</script></head>"
+    b"<body><!-- c --><p>Hello&nbsp;world &copy; 2020</p><template><p>hidden</p></template>"
+    b"<a href>empty</a><A HREF='/Up#frag'>u</A><a>no</a><a href=\"x\" href=\"y\">dup</a><br/>tail"
+    b"<![CDATA[cdata]]> done <a href='/self'/>end</body></html>",
+    b"<p>unclosed <b>bold <i>it</p> more <a href='../up?x=1&amp;y=2'>q</a>",
+    b"<!DOCTYPE html><p>caf\xc3\xa9</p><script>x</script>after",
+    b"<meta charset='latin-1'><p>caf\xe9 na\xefve</p>",
+    b"&lt;&gt; &amp &foo; &#65;&#x42; a&nbspb &#150; &AMP; &ampx",
+    b"<p>a<script>b</p>c</script>d</p><style/>e",
+    b"\xef\xbb\xbf<p>caf\xc3\xa9 <a href='/bom'>x</a></p>",
+    b"\xef\xbb\xbf<meta charset='latin-1'><p>caf\xc3\xa9</p>",
+    b"\xff\xfe" + "<p>caf\u00e9 utf-16</p>".encode("utf-16-le"),
+]
+
+
+def random_page(i):
+    words = ["informatics", "crawler", "faculty", "&amp;", "research", "caf\u00e9", "2024"]
+    parts = [f"<html><head><title>Page {i}</title><script>var x = {i};</script></head><body>"]
+    for j in range(random.randint(50, 400)):
+        choice = random.random()
+        if choice < 0.2:
+            parts.append(f'<a href="/p/{i}/{j}#s{j}" class="l">link {j}</a>')
+        elif choice < 0.25:
+            parts.append("<!-- comment --><style>.a{color:red}</style>")
+        else:
+            parts.append("<div><p>" + " ".join(random.choice(words) for _ in range(30)) + "</p></div>")
+    parts.append("</body></html>")
+    return "".join(parts).encode("utf-8")
+
+
+def soup_path(content):
+    soup = BeautifulSoup(content, "html.parser")
+    return soup.get_text(), extract_next_links(BASE_URL, soup)
+
+
+def stream_path(content):
+    return extract_text_and_links(BASE_URL, content)
+
+
+def measure(func, corpus):
+    tracemalloc.start()
+    start = time.perf_counter()
+    for content in corpus:
+        func(content)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    random.seed(121)
+    corpus = FIXTURES + [random_page(i) for i in range(150)]
+    mismatches = [i for i, content in enumerate(corpus) if soup_path(content) != stream_path(content)]
+    print(f"fixture corpus: {len(corpus) - len(mismatches)}/{len(corpus)} pages give the same text and links")
+    if mismatches:
+        print(f"  mismatching pages: {mismatches}")
+    assert not mismatches, f"{len(mismatches)} pages differ from BeautifulSoup"
+
+    megabytes = sum(len(content) for content in corpus) / 1e6
+    for name, func in (("BeautifulSoup", soup_path), ("stream", stream_path)):
+        elapsed, peak = measure(func, corpus)
+        print(f"{name:<14} {elapsed / megabytes * 1000:>8.1f} ms/MB   peak {peak / 1e6:>6.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
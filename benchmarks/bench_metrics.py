@@ -0,0 +1,110 @@
+# Overhead of the metrics in utils/metrics.py: the cost of one counter / timer
+# update, how many of them a page makes going through scraper.scraper, and the
+# share of the per page time that comes to. Also times the same pages with the
+# scraper's timers swapped for no-ops, and checks the Prometheus endpoint.
+# run from the repo root: python benchmarks/bench_metrics.py [pages]
+import os
+import sys
+import time
+import random
+import tempfile
+import urllib.request
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import scraper
+from utils.metrics import metrics, Registry, MetricsReporter, Histogram
+from benchmarks.bench_html_extract import random_page
+
+ROUNDS = 3
+
+
+class NullHistogram(Histogram):
+    def observe(self, value):
+        pass
+
+
+def corpus(pages):
+    random.seed(121)
+    result = []
+    for i in range(pages):
+        content = random_page(i)
+        resp = SimpleNamespace(status=200, content=content, headers={"Content-Type": "text/html"})
+        result.append((f"https://www.ics.uci.edu/page/{i}", resp))
+    return result
+
+
+def reset():
+    scraper.configure_log(10 ** 9, 10 ** 9, fresh=True)
+    scraper.visited_urls = scraper.SeenSet()
+    scraper.visited_hashes = scraper.SimHashIndex(max_k=scraper.SIMHASH_THRESHOLD - 1)
+    scraper.content_digests = scraper.SeenSet()
+    scraper.word_counts = scraper.COUNTERS[scraper.WORD_COUNTER]()
+
+
+def crawl(pages):
+    reset()
+    start = time.perf_counter()
+    for url, resp in pages:
+        scraper.scraper(url, resp)
+    return (time.perf_counter() - start) / len(pages)
+
+
+def updates():
+    total = 0
+    for metric in metrics.metrics.values():
+        if isinstance(metric, Histogram):
+            total += metric.count
+        elif hasattr(metric, "values"):
+            total += metric.total()
+    return total
+
+
+def main(pages=300):
+    registry = Registry()
+    counter = registry.counter("c")
+    histogram = registry.histogram("h")
+    n = 200000
+    start = time.perf_counter()
+    for _ in range(n):
+        counter.inc()
+    counter_us = (time.perf_counter() - start) / n * 1e6
+    start = time.perf_counter()
+    for _ in range(n):
+        with histogram.time():
+            pass
+    timer_us = (time.perf_counter() - start) / n * 1e6
+    print(f"counter.inc {counter_us:.2f} us, histogram.time() block {timer_us:.2f} us")
+
+    tmp = tempfile.mkdtemp()
+    scraper.LOG_FILE = os.path.join(tmp, "crawler_log.json")
+    sample = corpus(pages)
+    before = updates()
+    crawl(sample)
+    per_page = (updates() - before) / pages
+    with_metrics = min(crawl(sample) for _ in range(ROUNDS))
+    saved = {name: getattr(scraper, name) for name in ("CHECK_TIME", "APPLY_TIME", "SAVE_LOG_TIME", "PAGES_PARSED")}
+    stages = dict(scraper.STAGE_TIMES)
+    for name in ("CHECK_TIME", "APPLY_TIME", "SAVE_LOG_TIME"):
+        setattr(scraper, name, NullHistogram(name))
+    for stage in stages:
+        scraper.STAGE_TIMES[stage] = NullHistogram(stage)
+    without = min(crawl(sample) for _ in range(ROUNDS))
+    for name, value in saved.items():
+        setattr(scraper, name, value)
+    scraper.STAGE_TIMES.update(stages)
+
+    estimate = per_page * timer_us / (with_metrics * 1e6) * 100
+    print(f"{per_page:.1f} metric updates per page, {with_metrics * 1e3:.2f} ms per page")
+    print(f"estimated overhead {estimate:.3f}% of page time "
+          f"(measured: {without * 1e3:.2f} ms per page with the timers off)")
+
+    reporter = MetricsReporter(path=os.path.join(tmp, "metrics.json"), interval=3600, port=18765).start()
+    text = urllib.request.urlopen("http://127.0.0.1:18765/metrics").read().decode()
+    reporter.stop()
+    print(f"prometheus endpoint: {len(text.splitlines())} lines, e.g.")
+    print("\n".join([line for line in text.splitlines() if line.startswith("crawler_parse_seconds_")][-3:]))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 300)
@@ -0,0 +1,118 @@
+# CPU saved per rejected page by the pre-parse gate (page_gate.py) on a mixed
+# fixture corpus: normal pages, short pages, PDFs and images with and without a
+# Content-Type, and pages over the size limit. Prints the rejections by reason
+# and, per page, the gate's cost against what parsing it would have cost.
+# run from the repo root: python benchmarks/bench_page_gate.py [pages]
+import os
+import sys
+import logging
+import time
+import random
+import zlib
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import scraper
+from page_gate import check_page, OK
+
+URL = "https://www.stat.uci.edu/wp-content/uploads/abstract"
+HTML = {"Content-Type": "text/html; charset=utf-8"}
+WORDS = ["informatics", "crawler", "faculty", "research", "seminar", "statistics", "2024"]
+
+
+def html_page(rng, words):
+    parts = ["<html><head><title>t</title><script>var x = 1;</script></head><body>"]
+    while words > 0:
+        parts.append("<p>" + " ".join(rng.choice(WORDS) for _ in range(min(words, 30))) + "</p>")
+        parts.append('<a href="/p/%d">link</a>' % rng.randrange(10 ** 6))
+        words -= 30
+    parts.append("</body></html>")
+    return "".join(parts).encode("utf-8")
+
+
+def pdf_page(rng):
+    # text-ish header and objects around compressed streams, like the
+    # extensionless uploads the crawl ran into
+    parts = [b"%PDF-1.5\n%\xe2\xe3\xcf\xd3\n"]
+    for i in range(rng.randint(20, 60)):
+        stream = zlib.compress(os.urandom(rng.randint(500, 4000)))
+        parts.append(b"%d 0 obj\n<< /Length %d /Filter /FlateDecode >>\nstream\n" % (i, len(stream)))
+        parts.append(stream + b"\nendstream\nendobj\n")
+    return b"".join(parts)
+
+
+def png_page(rng):
+    return b"\x89PNG\r\n\x1a\n" + os.urandom(rng.randint(5000, 50000))
+
+
+def make_corpus(size, rng):
+    kinds = [
+        ("html", 0.55, lambda: (html_page(rng, rng.randint(100, 2000)), HTML)),
+        ("short html", 0.15, lambda: (html_page(rng, rng.randint(0, 40)), HTML)),
+        ("pdf, pdf type", 0.08, lambda: (pdf_page(rng), {"Content-Type": "application/pdf"})),
+        ("pdf, no type", 0.08, lambda: (pdf_page(rng), {})),
+        ("png, html type", 0.07, lambda: (png_page(rng), HTML)),
+        ("too large", 0.07, lambda: (html_page(rng, 120000), HTML)),
+    ]
+    corpus = []
+    for _ in range(size):
+        pick = rng.random()
+        for name, share, make in kinds:
+            if pick < share:
+                break
+            pick -= share
+        content, headers = make()
+        corpus.append((name, content, headers))
+    return corpus
+
+
+def parse_cost(content):
+    start = time.perf_counter()
+    try:
+        scraper.analyze_page(URL, content)
+    except Exception:
+        pass  # some binaries break the parser outright, that still cost the time
+    return time.perf_counter() - start
+
+
+def main(size=400):
+    logging.getLogger("bs4").setLevel(logging.ERROR)  # "could not be decoded" on every binary
+    rng = random.Random(121)
+    corpus = make_corpus(size, rng)
+    reasons = Counter()
+    gate_time = Counter()
+    parse_time = Counter()
+    soup_time = Counter()
+    pages = Counter()
+    for name, content, headers in corpus:
+        start = time.perf_counter()
+        reason = check_page(content, headers, scraper.MAX_PAGE_SIZE, scraper.MIN_WORD_COUNT)
+        gate_time[name] += time.perf_counter() - start
+        reasons[(name, reason)] += 1
+        pages[name] += 1
+        if reason != OK:
+            # what it cost before the gate: the page went through the parser
+            # (and the 1MB check only came after the download, like now)
+            if len(content) <= scraper.MAX_PAGE_SIZE:
+                scraper.HTML_EXTRACTOR = "stream"
+                parse_time[name] += parse_cost(content)
+                scraper.HTML_EXTRACTOR = "soup"
+                soup_time[name] += parse_cost(content)
+                scraper.HTML_EXTRACTOR = "stream"
+
+    print(f"{'kind':<16} {'pages':>6}  reasons")
+    for name in pages:
+        found = ", ".join(f"{reason} {count}" for (kind, reason), count in sorted(reasons.items()) if kind == name)
+        print(f"{name:<16} {pages[name]:>6}  {found}")
+    print()
+    print(f"{'kind':<16} {'gate us/page':>12} {'stream parse us/page':>21} {'soup parse us/page':>19}")
+    for name in pages:
+        rejected = sum(count for (kind, reason), count in reasons.items() if kind == name and reason != OK)
+        line = f"{name:<16} {gate_time[name] / pages[name] * 1e6:>12.1f}"
+        if rejected and parse_time[name]:
+            line += f" {parse_time[name] / rejected * 1e6:>21.0f} {soup_time[name] / rejected * 1e6:>19.0f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 400)
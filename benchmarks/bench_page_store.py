@@ -0,0 +1,78 @@
+# The page store (utils/page_store.py): write throughput and size with and
+# without zlib, random access to a page through the mmap, a full scan of one
+# column, and reanalyze.py over the store with 1, 2 and one process per core
+# (checking they all give the same report).
+# run from the repo root: python benchmarks/bench_page_store.py [pages]
+import os
+import sys
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.page_store import PageStore, PageReader
+from benchmarks.bench_html_extract import random_page
+import reanalyze
+
+LOOKUPS = 20000
+
+
+def size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def write(path, pages, compress):
+    store = PageStore(path, compress, fresh=True)
+    start = time.perf_counter()
+    for i, content in enumerate(pages):
+        store.add(f"https://www.ics.uci.edu/page/{i}", 200, content, "text/html; charset=utf-8",
+                  random.getrandbits(64), len(content) // 8)
+    store.close()
+    return time.perf_counter() - start
+
+
+def read(path, rows):
+    with PageReader(path) as reader:
+        order = [random.randrange(rows) for _ in range(LOOKUPS)]
+        start = time.perf_counter()
+        for i in order:
+            reader.url(i)
+            len(reader.body(i))
+        lookup = (time.perf_counter() - start) / LOOKUPS
+        start = time.perf_counter()
+        total = sum(reader.column("word_count"))
+        scan = time.perf_counter() - start
+    return lookup, scan, total
+
+
+def main(count=3000):
+    random.seed(121)
+    pages = [random_page(i) for i in range(count)]
+    raw_mb = sum(map(len, pages)) / 1e6
+    tmp = tempfile.mkdtemp()
+    print(f"{count} pages, {raw_mb:.1f} MB of html")
+    print(f"{'compress':>8} {'write MB/s':>10} {'store MB':>9} {'random page us':>15} {'column scan ms':>15}")
+    for compress in (0, 1, 6):
+        path = os.path.join(tmp, f"store{compress}")
+        elapsed = write(path, pages, compress)
+        lookup, scan, _ = read(path, count)
+        print(f"{compress:>8} {raw_mb / elapsed:>10.1f} {size(path) / 1e6:>9.1f} "
+              f"{lookup * 1e6:>15.1f} {scan * 1e3:>15.2f}")
+
+    print()
+    path = os.path.join(tmp, "store1")
+    reports = {}
+    for processes in sorted({1, 2, os.cpu_count() or 1}):
+        os.chdir(tmp)
+        sys.stdout = open(os.devnull, "w")  # apply_page prints every skipped page
+        start = time.perf_counter()
+        reports[processes] = reanalyze.reanalyze(path, processes, report=None,
+                                                 log_file=os.path.join(tmp, "log.json"))
+        elapsed = time.perf_counter() - start
+        sys.stdout = sys.__stdout__
+        print(f"reanalyze, {processes} process(es): {elapsed:.1f}s, {count / elapsed:.0f} pages/s")
+    print("same report:", len(set(reports.values())) == 1)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3000)
@@ -0,0 +1,113 @@
+# Pages/sec parsed inline (scraper.scraper on the worker thread) against the
+# ParsePipeline process pool with 1, 2, 4, ... processes up to the core count.
+# Every fifth page is an exact copy of one 40 pages back, and the run fails when
+# a copy got tokenized and SimHashed anyway (in the pool too, not only inline).
+# run from the repo root: python benchmarks/bench_parse_pipeline.py [pages]
+import os
+import sys
+import time
+import random
+import tempfile
+from threading import Event
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import scraper
+from crawler.pipeline import ParsePipeline
+
+WORDS = ["crawler", "search", "index", "informatics", "statistics", "research", "faculty",
+         "student", "course", "project", "seminar", "machine", "learning", "systems"]
+
+
+def make_corpus(count):
+    random.seed(121)
+    corpus = []
+    copies = 0
+    for i in range(count):
+        if i >= 40 and i % 5 == 4:
+            content = corpus[i - 40][1].content  # same page under another url
+            copies += 1
+        else:
+            paragraphs = "".join(
+                "<p>" + " ".join(f"{random.choice(WORDS)}{random.randrange(10000)}" for _ in range(60)) + "</p>"
+                for _ in range(30))
+            links = "".join(f'<a href="/page/{i}/{j}">link {j}</a>' for j in range(40))
+            content = f"<html><head><title>page {i}</title></head><body>{paragraphs}{links}</body></html>".encode()
+        resp = SimpleNamespace(status=200, content=content, headers={})
+        corpus.append((f"https://www.ics.uci.edu/page/{i}", resp))
+    return corpus, copies
+
+
+def count_checksum_only():
+    # pages analyze_page stopped after the checksum (no SimHash), counted as they are applied
+    counted = [0]
+    apply_page = scraper.apply_page
+
+    def counting(url, page):
+        counted[0] += page["simhash"] is None
+        return apply_page(url, page)
+    scraper.apply_page = counting
+    return counted
+
+
+def reset_stats():
+    scraper.configure_log(10 ** 9, 10 ** 9, fresh=True)
+    scraper.reset_stats()  # the content digests too, or every page is a copy of the last run's
+
+
+class CountingFrontier(object):
+    def __init__(self, expected):
+        self.expected = expected
+        self.completed = 0
+        self.all_done = Event()
+
+    def add_url(self, url):
+        pass
+
+    def mark_url_complete(self, url):
+        self.completed += 1
+        if self.completed == self.expected:
+            self.all_done.set()
+
+
+def main(count=400):
+    scraper.LOG_FILE = os.path.join(tempfile.mkdtemp(), "crawler_log.json")
+    scraper.print = lambda *args, **kwargs: None  # the skip messages aren't interesting here
+    corpus, copies = make_corpus(count)
+    checksum_only = count_checksum_only()
+    missed = []
+
+    reset_stats()
+    checksum_only[0] = 0
+    start = time.perf_counter()
+    for url, resp in corpus:
+        scraper.scraper(url, resp)
+    inline = count / (time.perf_counter() - start)
+    print(f"inline            {inline:>8.1f} pages/s, {checksum_only[0]}/{copies} copies stopped at the checksum")
+    if checksum_only[0] != copies:
+        missed.append("inline")
+
+    processes = 1
+    while processes <= (os.cpu_count() or 1):
+        reset_stats()
+        checksum_only[0] = 0
+        frontier = CountingFrontier(count)
+        pipeline = ParsePipeline(SimpleNamespace(parse_processes=processes, parse_queue_size=64), frontier)
+        pipeline.executor.submit(int).result()  # don't time process start up
+        start = time.perf_counter()
+        for url, resp in corpus:
+            pipeline.submit(url, resp)
+        frontier.all_done.wait()
+        rate = count / (time.perf_counter() - start)
+        pipeline.close()
+        print(f"{processes:>2} processes      {rate:>8.1f} pages/s ({rate / inline:.2f}x inline), "
+              f"{checksum_only[0]}/{copies} copies stopped at the checksum")
+        if checksum_only[0] != copies:
+            missed.append(f"{processes} processes")
+        processes *= 2
+    scraper.state_log.remove()
+    assert not missed, f"exact copies tokenized: {', '.join(missed)}"
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 400)
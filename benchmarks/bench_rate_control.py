@@ -0,0 +1,130 @@
+# Fixed POLITENESS against the adaptive per host delay (crawler/rate_control.py)
+# on a local cache server with five kinds of host: two fast healthy ones, a slow
+# one, a flaky one (30% 503s) and a dead one (every request a 604). Each
+# configuration crawls the same urls in its own process and reports good pages
+# per hour, when the healthy hosts were done, requests spent on the failing
+# hosts, circuit trips and the delay every host ended up with (the
+# host_delay_seconds gauge).
+# run from the repo root: python benchmarks/bench_rate_control.py [urls_per_host]
+import os
+import sys
+import time
+import random
+import tempfile
+import multiprocessing
+from threading import Thread
+from configparser import ConfigParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from utils.local_cache_server import LocalCacheServer
+
+HOSTS = {
+    # host: (latency seconds, error rate, error status)
+    "fast.ics.uci.edu": (0.005, 0.0, None),
+    "www.cs.uci.edu": (0.005, 0.0, None),
+    "slow.stat.uci.edu": (0.15, 0.0, None),
+    "flaky.informatics.uci.edu": (0.005, 0.3, 503),
+    "dead.ics.uci.edu": (0.005, 1.0, 604),
+}
+CONFIGURATIONS = [
+    ("fixed 0.5s", {"RATECONTROL": "fixed", "POLITENESS": "0.5"}),
+    ("fixed 0.1s", {"RATECONTROL": "fixed", "POLITENESS": "0.1"}),
+    ("adaptive, floor 0.05s", {"RATECONTROL": "adaptive", "POLITENESS": "0.5", "POLITENESSFLOOR": "0.05"}),
+]
+
+
+def pages(url):
+    host = url.split("/")[2]
+    latency, error_rate, error_status = HOSTS[host]
+    time.sleep(latency)
+    if random.random() < error_rate:
+        return error_status, b"", None
+    words = " ".join(f"{url.rsplit('/', 1)[-1]}x{random.randrange(10 ** 6)}" for _ in range(120))
+    return 200, f"<html><body><p>{words}</p></body></html>".encode("utf-8"), None
+
+
+def serve(conn):
+    server = LocalCacheServer(pages)
+    conn.send(server.address)
+    server.httpd.serve_forever()
+
+
+def crawl(address, overrides, seeds, per_host, conn):
+    workdir = tempfile.mkdtemp()
+    os.chdir(workdir)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+
+    import scraper
+    from crawler import Crawler, worker
+    from utils.config import Config
+    from utils.metrics import metrics
+
+    cparser = ConfigParser()
+    cparser.read(os.path.join(ROOT, "config.ini"))
+    cparser["CRAWLER"]["SEEDURL"] = ",".join(seeds)
+    cparser["CRAWLER"]["CIRCUITSECONDS"] = "0.25"  # short, so the dead host is given up on quickly
+    cparser["CRAWLER"]["POLITENESSCEILING"] = "2"
+    cparser["LOCAL PROPERTIES"]["THREADCOUNT"] = "5"
+    cparser["LOCAL PROPERTIES"]["SAVE"] = "frontier.db"
+    cparser["LOCAL PROPERTIES"]["STORE"] = "sqlite"
+    cparser["LOCAL PROPERTIES"]["METRICSFILE"] = ""
+    for key, value in overrides.items():
+        cparser["CRAWLER"][key] = value
+    config = Config(cparser)
+    config.cache_server = address
+    scraper.configure_log(config.checkpoint_pages, config.checkpoint_secs, fresh=True)
+
+    start = time.perf_counter()
+    crawler = Crawler(config, True)
+    healthy = [host for host, (_, error_rate, _) in HOSTS.items() if not error_rate]
+    healthy_done = []
+
+    def watch():
+        # when every healthy host has had all its urls downloaded
+        hosts = crawler.frontier.rate_control.hosts
+        while not all(host in hosts and hosts[host].pages >= per_host for host in healthy):
+            time.sleep(0.02)
+        healthy_done.append(time.perf_counter() - start)
+    Thread(target=watch, daemon=True).start()
+    crawler.start()
+    elapsed = time.perf_counter() - start
+    snapshot = metrics.snapshot()["metrics"]
+    conn.send({
+        "elapsed": elapsed,
+        "healthy_done": healthy_done[0] if healthy_done else elapsed,
+        "statuses": worker.PAGES_DOWNLOADED.snapshot(),
+        "delays": snapshot.get("host_delay_seconds") or {},
+        "trips": sum((snapshot.get("circuit_trips_total") or {}).values()),
+    })
+
+
+def main(per_host=40):
+    seeds = [f"https://{host}/page/{i}" for host in HOSTS for i in range(per_host)]
+    context = multiprocessing.get_context("spawn")
+    parent_conn, child_conn = context.Pipe()
+    server = context.Process(target=serve, args=(child_conn,), daemon=True)
+    server.start()
+    address = parent_conn.recv()
+    print(f"{per_host} urls on each of {len(HOSTS)} hosts, 5 threads")
+    print(f"{'configuration':<22} {'seconds':>8} {'healthy done s':>15} {'good pages/hour':>16} "
+          f"{'failed requests':>16} {'trips':>6}  end delay per host")
+    for name, overrides in CONFIGURATIONS:
+        receive, send = context.Pipe()
+        process = context.Process(target=crawl, args=(address, overrides, seeds, per_host, send))
+        process.start()
+        stats = receive.recv()
+        process.join()
+        good = stats["statuses"].get("200", 0)
+        failed = sum(count for status, count in stats["statuses"].items() if status != "200")
+        delays = ", ".join(f"{host.split('.')[0]} {delay:.2f}" for host, delay in sorted(stats["delays"].items()))
+        print(f"{name:<22} {stats['elapsed']:>8.1f} {stats['healthy_done']:>15.1f} "
+              f"{good / stats['elapsed'] * 3600:>16.0f} "
+              f"{failed:>16} {stats['trips']:>6}  {delays}")
+    server.terminate()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 40)
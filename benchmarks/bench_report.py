@@ -0,0 +1,118 @@
+# report.py against the old way of making the report: loading the whole
+# crawler_log.json, replaying the delta log into the scraper globals and
+# sorting the whole word dict. The saved state is a made-up crawl of N pages
+# with Zipf distributed words, half in the snapshot and half in the delta log,
+# once with exact and once with approx (scraper.WORD_COUNTER) word counts. Prints the
+# time of each with 1, 2, 4 and one process per core, and fails when a report
+# differs from the old one.
+# The speedup column is measured, so it only shows scaling on a box with that
+# many cores. The bound next to it is for a box that has them, from that run's
+# CPU times measured in the workers: the workers' startup side by side, the map
+# and reduce tasks spread over that many cores, plus everything else the run
+# took (on this box) counted as serial.
+# run from the repo root: python benchmarks/bench_report.py [pages]
+import os
+import sys
+import time
+import random
+import tempfile
+from itertools import accumulate
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import scraper
+import report
+
+VOCABULARY = 400000
+WORDS_PER_PAGE = 300
+HOSTS = ["www.ics.uci.edu", "vision.ics.uci.edu", "ngs.ics.uci.edu", "www.cs.uci.edu", "www.stat.uci.edu"]
+
+
+def make_state(path, pages, counter):
+    rng = random.Random(121)
+    words = [f"w{i}" for i in range(VOCABULARY)]
+    cum_weights = list(accumulate(1 / (i + 1) for i in range(VOCABULARY)))
+    scraper.WORD_COUNTER = counter
+    scraper.LOG_FILE = path
+    scraper.configure_log(500, 10 ** 9, fresh=True)
+    scraper.reset_stats()
+    for i in range(pages):
+        url = f"https://{rng.choice(HOSTS)}/page/{i}"
+        page_counts = {}
+        for word in rng.choices(words, cum_weights=cum_weights, k=WORDS_PER_PAGE):
+            page_counts[word] = page_counts.get(word, 0) + 1
+        record = {"url": url, "tracked": True, "words": page_counts,
+                  "word_count": rng.randint(50, 5000), "new_urls": []}
+        scraper._replay_record(record)  # what apply_page would have done to the stats
+        scraper.state_log.append(record)
+        if i == pages // 2:
+            scraper.save_log()  # snapshot of the first half
+    scraper.state_log.checkpoint()
+
+
+def old_report(path):
+    scraper.reset_stats()
+    scraper.configure_log(500, 10 ** 9)
+    scraper.load_log()
+    if scraper.WORD_COUNTER == "exact":
+        top = sorted(scraper.word_counts.counts.items(), key=lambda item: item[1], reverse=True)[:50]
+    else:
+        top = scraper.word_counts.top(50)  # only the sketch's top words are exact enough
+    return scraper.format_report(sum(scraper.subdomains.values()), scraper.longest_page, top, scraper.subdomains)
+
+
+def words(text):
+    # the top 50 lines; ties may be listed in another order
+    return sorted(line for line in text.splitlines() if ": " in line and not line.startswith(("Total", "Longest")))
+
+
+def makespan(seconds, cores):
+    # longest task first onto the least loaded core
+    loads = [0.0] * cores
+    for task in sorted(seconds, reverse=True):
+        loads[loads.index(min(loads))] += task
+    return max(loads)
+
+
+def bound(stats, cores):
+    # the workers start side by side, every task is spread over the cores and
+    # whatever else the run took is counted as serial
+    parallel = stats["startup"] + stats["map"] + stats["reduce"]
+    serial = max(0.0, stats["wall"] - sum(parallel))
+    return (serial + max(stats["startup"], default=0.0) + makespan(stats["map"], cores)
+            + makespan(stats["reduce"], cores))
+
+
+def main(pages=20000):
+    print(f"{pages} pages, {os.cpu_count()} core(s) here")
+    failed = []
+    for counter in ("exact", "approx"):
+        tmp = tempfile.mkdtemp()
+        path = os.path.join(tmp, "crawler_log.json")
+        make_state(path, pages, counter)
+        sizes = [os.path.getsize(name) / 1e6 for name in (path, f"{path}.delta")]
+        print(f"{counter} counts: snapshot {sizes[0]:.1f} MB, delta log {sizes[1]:.1f} MB")
+
+        sys.stdout = open(os.devnull, "w")
+        start = time.perf_counter()
+        expected = old_report(path)
+        old = time.perf_counter() - start
+        sys.stdout = sys.__stdout__
+        print(f"  {'load + replay + sort':<26} {old:>6.2f}s")
+        single = None
+        for processes in sorted({1, 2, 4, os.cpu_count() or 1}):
+            stats = {}
+            sys.stdout = open(os.devnull, "w")
+            text = report.build_report(path, processes, stats=stats)
+            sys.stdout = sys.__stdout__
+            single = single or stats["wall"]
+            same = words(text) == words(expected) and text.splitlines()[:2] == expected.splitlines()[:2]
+            if not same:
+                failed.append((counter, processes))
+            print(f"  {f'report.py, {processes} process(es)':<26} {stats['wall']:>6.2f}s  "
+                  f"{len(stats['map'])} map tasks  speedup {single / stats['wall']:.2f}x  "
+                  f"bound on {processes} cores {single / bound(stats, processes):.2f}x  same report: {same}")
+    assert not failed, f"reports differ from the old one: {failed}"
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,111 @@
+# Decoding the cache server's payload, the old Response (cbor.loads and
+# unpickle everything up front) against the lazy one in utils/response.py, for
+# the kinds of fetches scraper.check_response turns down and for a page that
+# gets parsed. Per kind: time per response through the decode and the checks
+# (and analyze_page for the accepted page), and the peak memory tracemalloc
+# sees on top of the downloaded bytes.
+# run from the repo root: python benchmarks/bench_response.py [rounds]
+import os
+import sys
+import time
+import pickle
+import random
+import tracemalloc
+
+import cbor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import scraper
+from utils.response import Response
+from utils.local_cache_server import encode_payload
+from utils.replay import VOCABULARY
+
+
+class EagerResponse(object):
+    ''' utils/response.py as it was. '''
+    def __init__(self, resp_dict):
+        self.url = resp_dict["url"]
+        self.status = resp_dict["status"]
+        self.error = resp_dict["error"] if "error" in resp_dict else None
+        try:
+            self.raw_response = (
+                pickle.loads(resp_dict["response"])
+                if "response" in resp_dict else
+                None)
+        except TypeError:
+            self.raw_response = None
+        # what the scraper reads now, straight off the unpickled response
+        self.content = self.raw_response.content if self.raw_response is not None else None
+        self.headers = self.raw_response.headers if self.raw_response is not None else {}
+
+
+def eager(payload):
+    return EagerResponse(cbor.loads(payload))
+
+
+def html(rng, words, links=20):
+    text = " ".join(rng.choice(VOCABULARY) for _ in range(words))
+    anchors = "".join(f'<a href="/p/{rng.randrange(10000)}">x</a>' for _ in range(links))
+    return f"<html><body><p>{text}</p>{anchors}</body></html>".encode()
+
+
+def payloads():
+    rng = random.Random(121)
+    url = "https://www.ics.uci.edu/p/1"
+    return [
+        ("404 page", encode_payload(url, 404, html(rng, 300)), False),
+        ("601 error", encode_payload(url, 601, error="cache server: no answer"), False),
+        ("301 redirect", encode_payload(url, 301, b"", {"Location": "https://www.ics.uci.edu/p/2"}), False),
+        ("pdf 400KB", encode_payload(url, 200, b"%PDF-1.5\n" + rng.randbytes(400000),
+                                     {"Content-Type": "application/pdf"}), False),
+        ("html 3MB", encode_payload(url, 200, html(rng, 400000)), False),
+        ("html 40KB", encode_payload(url, 200, html(rng, 6000, 100)), True),
+        ("html 400KB", encode_payload(url, 200, html(rng, 60000, 500)), True),
+    ]
+
+
+def handle(decode, payload, url, accepted):
+    resp = decode(payload)
+    early = scraper.check_response(url, resp)
+    if accepted:
+        assert early is None
+        scraper.analyze_page(url, resp.content)
+    return resp
+
+
+def timed(decode, payload, accepted, rounds):
+    url = "https://www.ics.uci.edu/p/1"
+    start = time.perf_counter()
+    for _ in range(rounds):
+        handle(decode, payload, url, accepted)
+    return (time.perf_counter() - start) / rounds
+
+
+def peak(decode, payload, accepted):
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    resp = handle(decode, payload, "https://www.ics.uci.edu/p/1", accepted)
+    used = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    del resp
+    return used
+
+
+def main(rounds=200):
+    sys.stdout = open(os.devnull, "w")  # check_response prints every skip
+    rows = []
+    for name, payload, accepted in payloads():
+        n = max(rounds // 20, 5) if accepted or len(payload) > 1000000 else rounds
+        old = (timed(eager, payload, accepted, n), peak(eager, payload, accepted))
+        new = (timed(Response.from_payload, payload, accepted, n), peak(Response.from_payload, payload, accepted))
+        rows.append((name, len(payload), accepted, old, new))
+    sys.stdout = sys.__stdout__
+    print(f"{'response':<14} {'payload':>9} {'parsed':>6}  {'old us':>9} {'new us':>9}  {'old peak KB':>11} {'new peak KB':>11}")
+    for name, size, accepted, old, new in rows:
+        print(f"{name:<14} {size // 1024:>7}KB {'yes' if accepted else 'no':>6}  {old[0] * 1e6:>9.1f} "
+              f"{new[0] * 1e6:>9.1f}  {old[1] / 1024:>11.1f} {new[1] / 1024:>11.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
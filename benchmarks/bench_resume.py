@@ -0,0 +1,131 @@
+# Startup of a resumed crawl (launch.py without --restart) with 100k and 1M
+# urls in the save file (1 in 10 still to download, sqlite store) and as many
+# visited urls in the crawl log. The old startup read every row of the save
+# file and ran the scraper source check 4 times per worker before the first
+# fetch; the new one queues the first chunk of pending urls from the partial
+# index and reads the rest on a thread. Prints the time load_log takes, the
+# time from Frontier() to the first url a worker gets (worker source checks
+# included) and until the save file is read completely.
+# run from the repo root: python benchmarks/bench_resume.py [sizes...]
+import os
+import sys
+import time
+import random
+import sqlite3
+import tempfile
+import multiprocessing
+from inspect import getsource
+from configparser import ConfigParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SIZES = (100000, 1000000)
+THREADS = 8
+HOSTS = 50
+
+
+def url_of(i):
+    return f"https://h{i % HOSTS}.ics.uci.edu/p/{i}/page"
+
+
+def build(directory, size):
+    ''' A save file and crawl log like a crawl of `size` urls leaves behind. '''
+    os.chdir(directory)
+    import scraper
+    from utils import get_urlhash
+    from utils.seen_set import SeenSet
+    from crawler.storage import SQLiteStore
+    SQLiteStore("frontier.db").close()  # the schema
+    db = sqlite3.connect("frontier.db")
+    with db:
+        db.executemany("INSERT INTO urls (urlhash, url, completed) VALUES (?, ?, ?)",
+                       ((get_urlhash(url_of(i)), url_of(i), int(i % 10 != 0)) for i in range(size)))
+    db.close()
+    rng = random.Random(121)
+    scraper.configure_log(50, 30, fresh=True)
+    scraper.visited_urls = SeenSet()
+    scraper.visited_urls.update(url_of(i) for i in range(size))
+    scraper.word_counts.update({f"w{rng.randrange(200000)}": rng.randint(1, 50) for _ in range(100000)})
+    scraper.subdomains.update({f"h{i}.ics.uci.edu": size // HOSTS for i in range(HOSTS)})
+    scraper.save_log()
+
+
+def old_check_scraper_source(scraper):
+    # what every Worker() ran before
+    assert {getsource(scraper).find(req) for req in {"from requests import", "import requests"}} == {-1}
+    assert {getsource(scraper).find(req) for req in {"from urllib.request import", "import urllib.request"}} == {-1}
+
+
+def resume(directory, mode, conn):
+    os.chdir(directory)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+    import scraper
+    from crawler.frontier import Frontier
+    from crawler.worker import check_scraper_source
+    from utils.config import Config
+    from utils.seen_set import DigestTable
+
+    class OldFrontier(Frontier):
+        def _parse_save_file(self):
+            # the old one: every row, on the main thread
+            for urlhash, url, completed in self.save.items():
+                self.seen.add(urlhash)
+                if not completed and scraper.is_valid(url):
+                    self.to_be_downloaded.put(url)
+
+    if mode == "old":
+        DigestTable.reserve = lambda self, count: None  # SeenSet.load grew as it went
+    cparser = ConfigParser()
+    cparser.read(os.path.join(ROOT, "config.ini"))
+    cparser["CRAWLER"]["SEEDURL"] = url_of(0)
+    cparser["CRAWLER"]["ROBOTS"] = "false"
+    cparser["LOCAL PROPERTIES"]["SAVE"] = "frontier.db"
+    cparser["LOCAL PROPERTIES"]["STORE"] = "sqlite"
+    cparser["LOCAL PROPERTIES"]["METRICSFILE"] = ""
+    config = Config(cparser)
+
+    start = time.perf_counter()
+    scraper.configure_log(config.checkpoint_pages, config.checkpoint_secs)
+    scraper.load_log()
+    loaded = time.perf_counter()
+    frontier = (OldFrontier if mode == "old" else Frontier)(config, False)
+    for _ in range(THREADS):
+        if mode == "old":
+            old_check_scraper_source(scraper)
+        else:
+            check_scraper_source()
+    url = frontier.get_tbd_url()
+    first = time.perf_counter()
+    if frontier.loader is not None:
+        frontier.loader.join()
+    done = time.perf_counter()
+    queued = len(frontier.to_be_downloaded) + 1
+    frontier.close()
+    conn.send({"log": loaded - start, "first": first - loaded, "all": done - loaded,
+               "queued": queued, "seen": len(frontier.seen), "url": url})
+
+
+def main(sizes=SIZES):
+    context = multiprocessing.get_context("spawn")
+    print(f"{'saved urls':>10} {'startup':<8} {'load_log s':>10} {'first url s':>12} {'all read s':>11} "
+          f"{'queued':>8} {'seen':>9}")
+    for size in sizes:
+        directory = tempfile.mkdtemp()
+        process = context.Process(target=build, args=(directory, size))
+        process.start()
+        process.join()
+        for mode in ("old", "new"):
+            receive, send = context.Pipe()
+            process = context.Process(target=resume, args=(directory, mode, send))
+            process.start()
+            stats = receive.recv()
+            process.join()
+            print(f"{size:>10} {mode:<8} {stats['log']:>10.2f} {stats['first']:>12.3f} {stats['all']:>11.2f} "
+                  f"{stats['queued']:>8} {stats['seen']:>9}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or SIZES)
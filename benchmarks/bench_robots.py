@@ -0,0 +1,200 @@
+# robots.txt and sitemaps (crawler/robots.py) against a local stand-in cache
+# server: a few hosts whose robots.txt disallows /private/, one asks for a
+# Crawl-delay, and each has a sitemap index pointing at a sitemap of pages that
+# no page links to. robots.txt answers slowly on purpose, the workers shouldn't
+# notice. Prints the cost of an allowed() lookup, then the same crawl with
+# ROBOTS = false and true: pages downloaded, /private/ pages downloaded, urls
+# skipped, urls that came from sitemaps, time to the first page and in total.
+# The server notes when every request came and went, and the run fails when two
+# requests to one host overlapped or the Crawl-delay host was hit sooner than
+# its delay after robots.txt came back (robots.txt and sitemaps included).
+# run from the repo root: python benchmarks/bench_robots.py [pages_per_host]
+import os
+import sys
+import time
+import random
+import tempfile
+import multiprocessing
+from threading import Lock
+from configparser import ConfigParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from utils.local_cache_server import LocalCacheServer
+from utils.replay import VOCABULARY
+
+HOSTS = ["www.ics.uci.edu", "vision.ics.uci.edu", "www.stat.uci.edu", "www.informatics.uci.edu"]
+SLOW_HOST = "www.stat.uci.edu"  # Crawl-delay: 0.2
+CRAWL_DELAY = 0.2
+ROBOTS_LATENCY = 0.3
+
+
+def site(per_host):
+    def pages(url):
+        scheme_host, _, path = url.partition("//")[2].partition("/")
+        host, path = scheme_host, "/" + path
+        base = f"https://{host}"
+        if path == "/robots.txt":
+            time.sleep(ROBOTS_LATENCY)
+            lines = ["User-agent: *", "Disallow: /private/", f"Sitemap: {base}/sitemap_index.xml"]
+            if host == SLOW_HOST:
+                lines.append(f"Crawl-delay: {CRAWL_DELAY}")
+            return 200, "\n".join(lines).encode(), {"Content-Type": "text/plain"}
+        if path == "/sitemap_index.xml":
+            return 200, (f'<?xml version="1.0"?><sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                         f'<sitemap><loc>{base}/sitemap.xml</loc></sitemap></sitemapindex>').encode(), None
+        if path == "/sitemap.xml":
+            locs = "".join(f"<url><loc>{base}/orphan/{i}</loc></url>" for i in range(per_host // 4))
+            return 200, (f'<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                         f'{locs}</urlset>').encode(), None
+        if path == "/" or path.startswith(("/p/", "/private/", "/orphan/")):
+            rng = random.Random(url)
+            number = int(path.rsplit("/", 1)[-1] or 0)
+            links = [f"{base}/p/{(number + step) % per_host}" for step in (1, 2, 7)]
+            links.append(f"{base}/private/{number}")
+            text = " ".join(rng.choice(VOCABULARY) for _ in range(200))
+            anchors = "".join(f'<a href="{link}">x</a>' for link in links)
+            return 200, f"<html><body><p>{text}</p>{anchors}</body></html>".encode(), None
+        return 404, b"", None
+    return pages
+
+
+def logged(pages, path):
+    # every request as "host start end path", for impolite()
+    lock = Lock()
+
+    def answer(url):
+        start = time.time()
+        try:
+            return pages(url)
+        finally:
+            host, _, path_ = url.partition("//")[2].partition("/")
+            with lock, open(path, "a") as log:
+                log.write(f"{host} {start} {time.time()} /{path_}\n")
+    return answer
+
+
+def impolite(path):
+    ''' Requests that overlapped another one to the same host, or came to the
+    Crawl-delay host sooner than its delay after the one before. '''
+    by_host = {}
+    with open(path) as log:
+        for line in log:
+            host, start, end, url = line.split()
+            by_host.setdefault(host, []).append((float(start), float(end), url))
+    bad = []
+    for host, requests in by_host.items():
+        requests.sort()
+        delay_known = False
+        for (_, end, before), (start, _, url) in zip(requests, requests[1:]):
+            delay_known = delay_known or before == "/robots.txt"
+            gap = start - end
+            if gap < 0 or (host == SLOW_HOST and delay_known and gap < CRAWL_DELAY - 0.005):
+                bad.append(f"{host}{url} {gap:+.3f}s after {before}")
+    return bad
+
+
+def serve(per_host, path, conn):
+    server = LocalCacheServer(logged(site(per_host), path))
+    conn.send(server.address)
+    server.httpd.serve_forever()
+
+
+def crawl(address, robots, conn):
+    workdir = tempfile.mkdtemp()
+    os.chdir(workdir)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+
+    import scraper
+    from crawler import Crawler, worker
+    from utils.config import Config
+    from utils.metrics import metrics
+
+    cparser = ConfigParser()
+    cparser.read(os.path.join(ROOT, "config.ini"))
+    cparser["CRAWLER"]["SEEDURL"] = ",".join(f"https://{host}/" for host in HOSTS)
+    cparser["CRAWLER"]["POLITENESS"] = "0.02"
+    cparser["CRAWLER"]["POLITENESSFLOOR"] = "0.02"
+    cparser["CRAWLER"]["ROBOTS"] = robots
+    cparser["LOCAL PROPERTIES"]["THREADCOUNT"] = "4"
+    cparser["LOCAL PROPERTIES"]["SAVE"] = "frontier.db"
+    cparser["LOCAL PROPERTIES"]["STORE"] = "sqlite"
+    cparser["LOCAL PROPERTIES"]["METRICSFILE"] = ""
+    config = Config(cparser)
+    config.cache_server = address
+    scraper.configure_log(config.checkpoint_pages, config.checkpoint_secs, fresh=True)
+
+    downloaded = []
+    real_scraper = scraper.scraper
+
+    def note(url, resp):
+        downloaded.append((time.perf_counter(), url))
+        return real_scraper(url, resp)
+    scraper.scraper = note
+    start = time.perf_counter()
+    crawler = Crawler(config, True)
+    crawler.start()
+    elapsed = time.perf_counter() - start
+    snapshot = metrics.snapshot()["metrics"]
+    conn.send({
+        "pages": worker.PAGES_DOWNLOADED.total(),
+        "private": sum("/private/" in url for _, url in downloaded),
+        "orphans": sum("/orphan/" in url for _, url in downloaded),
+        "skipped": sum((snapshot.get("robots_blocked_total") or {}).values()),
+        "first": downloaded[0][0] - start if downloaded else None,
+        "elapsed": elapsed,
+    })
+
+
+def lookups(n=200000):
+    from crawler.robots import RobotsService
+    from urllib.robotparser import RobotFileParser
+
+    class Config(object):
+        user_agent = "IR UW25 bench"
+    os.chdir(tempfile.mkdtemp())  # the service's Logs/ doesn't land in the repo
+    service = RobotsService(Config())
+    parser = RobotFileParser()
+    parser.parse(["User-agent: *", "Disallow: /private/", "Disallow: /tmp/"])
+    for host in HOSTS:
+        service.rules[host] = (parser, time.time() + 3600)
+    urls = [f"https://{HOSTS[i % len(HOSTS)]}/{'private' if i % 10 == 0 else 'p'}/{i}" for i in range(n)]
+    start = time.perf_counter()
+    for url in urls:
+        service.allowed(url)
+    service.close()
+    return (time.perf_counter() - start) / n
+
+
+def main(per_host=200):
+    print(f"allowed() on cached rules: {lookups() * 1e6:.1f} us per url")
+    context = multiprocessing.get_context("spawn")
+    requests = os.path.join(tempfile.mkdtemp(), "requests.log")
+    parent_conn, child_conn = context.Pipe()
+    server = context.Process(target=serve, args=(per_host, requests, child_conn), daemon=True)
+    server.start()
+    address = parent_conn.recv()
+    print(f"{per_host} linked pages on each of {len(HOSTS)} hosts, robots.txt takes {ROBOTS_LATENCY}s, 4 threads")
+    print(f"{'ROBOTS':<8} {'pages':>6} {'/private/':>10} {'skipped':>8} {'from sitemap':>13} "
+          f"{'first page s':>13} {'seconds':>8}")
+    bad = []
+    for robots in ("false", "true"):
+        open(requests, "w").close()
+        receive, send = context.Pipe()
+        process = context.Process(target=crawl, args=(address, robots, send))
+        process.start()
+        stats = receive.recv()
+        process.join()
+        print(f"{robots:<8} {stats['pages']:>6} {stats['private']:>10} {stats['skipped']:>8} "
+              f"{stats['orphans']:>13} {stats['first']:>13.2f} {stats['elapsed']:>8.1f}")
+        bad += [f"ROBOTS={robots} {request}" for request in impolite(requests)]
+    server.terminate()
+    for request in bad[:10]:
+        print("too soon:", request)
+    assert not bad, f"{len(bad)} requests broke the politeness of their host"
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,69 @@
+# Per page cost of save_log at 10k/100k/1M visited urls: the old full JSON rewrite
+# against the snapshot + append-only delta log.
+# run from the repo root: python benchmarks/bench_save_log.py [max_urls]
+import os
+import sys
+import json
+import random
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import scraper
+
+PAGES = 200
+
+
+def old_save_log(path, urls):
+    # what save_log did before: rewrite everything after every page (visited_urls
+    # was a set of strings back then)
+    log_data = {
+        "visited_urls": list(urls),
+        "word_counts": scraper.word_counts.to_state(),
+        "subdomains": scraper.subdomains,
+        "longest_page": scraper.longest_page
+    }
+    with open(path, "w") as file:
+        json.dump(log_data, file)
+
+
+def fake_page(i):
+    words = {f"w{random.randrange(50000)}": random.randint(1, 5) for _ in range(300)}
+    new_urls = [f"https://www.ics.uci.edu/page/{i}/{j}" for j in range(20)]
+    return {"url": f"https://www.ics.uci.edu/page/{i}", "tracked": True, "words": words,
+            "word_count": sum(words.values()), "new_urls": new_urls}
+
+
+def main(max_urls=1000000):
+    random.seed(121)
+    tmp = tempfile.mkdtemp()
+    scraper.LOG_FILE = os.path.join(tmp, "crawler_log.json")
+    print(f"{'visited':>9} {'full rewrite ms/page':>21} {'delta log ms/page':>18}")
+    for size in (10000, 100000, 1000000):
+        if size > max_urls:
+            break
+        urls = {f"https://www.ics.uci.edu/seed/{i}" for i in range(size)}
+        scraper.visited_urls = scraper.SeenSet(capacity=size)
+        scraper.visited_urls.update(urls)
+        scraper.word_counts = scraper.COUNTERS[scraper.WORD_COUNTER]()
+        scraper.word_counts.update({f"w{i}": i for i in range(50000)})
+        scraper.subdomains = {"www.ics.uci.edu": size}
+        scraper.configure_log(50, 30, fresh=True)
+        scraper.save_log()  # start from a snapshot like a resumed crawl would
+
+        pages = [fake_page(i) for i in range(PAGES)]
+        start = time.perf_counter()
+        for record in pages[:20]:  # full rewrites get slow, 20 is plenty
+            old_save_log(os.path.join(tmp, "old_log.json"), urls)
+        old_ms = (time.perf_counter() - start) / 20 * 1000
+
+        start = time.perf_counter()
+        for record in pages:
+            scraper._replay_record(record)
+            scraper.save_log(record)
+        new_ms = (time.perf_counter() - start) / PAGES * 1000
+        print(f"{size:>9} {old_ms:>21.2f} {new_ms:>18.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -0,0 +1,54 @@
+# Bytes per url for a Python set of url strings against utils.seen_set.SeenSet
+# (exact digest table, with a Bloom filter in front, and Bloom filter only), at
+# 1M and 10M urls, plus measured and reported false positive rates.
+# run from the repo root: python benchmarks/bench_seen_set.py [max_urls]
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.seen_set import SeenSet
+
+PROBES = 100000
+SET_LIMIT = 1000000  # a set of 10M url strings needs more RAM than this box has
+
+
+def url(i):
+    return f"https://www.ics.uci.edu/~faculty/research/projects/page{i}.html"
+
+
+def build(factory, count):
+    tracemalloc.start()
+    seen = factory()
+    for i in range(count):
+        seen.add(url(i))
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return seen, size
+
+
+def main(max_urls=10000000):
+    kinds = [
+        ("set of str", set),
+        ("SeenSet exact", SeenSet),
+        ("SeenSet exact + bloom", lambda: SeenSet(bloom=True)),
+        ("SeenSet bloom only", lambda: SeenSet(exact=False)),
+    ]
+    for count in (1000000, 10000000):
+        if count > max_urls:
+            break
+        for name, factory in kinds:
+            if factory is set and count > SET_LIMIT:
+                continue
+            seen, size = build(factory, count)
+            line = f"{count:>9} urls  {name:<22} {size / count:>7.1f} bytes/url"
+            if isinstance(seen, SeenSet):
+                false_hits = sum(url(i) in seen for i in range(count, count + PROBES))
+                line += (f"  fp measured {false_hits / PROBES:.2e}"
+                         f" reported {seen.false_positive_rate():.2e}")
+            print(line)
+            del seen
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000000)
@@ -0,0 +1,156 @@
+# launch.py --shards (crawler/sharding.py) as local processes on one box: the
+# same replayed multi host site crawled by one process and by 2 and 4 shards.
+# Prints the wall time, pages/s, how the parsed pages split over the shards and
+# whether the merged report (report.py over every shard's log) has the same
+# longest page length and top words as the single process one, and fails when
+# it doesn't or when the shards parsed more pages between them (a host crawled
+# by two shards). The unique page counts are left out of the comparison: a page
+# only counts when no page fetched before it linked to it in the same process
+# (see track_unique_pages), so they depend on the order pages were fetched in
+# and on how the hosts were split.
+# run from the repo root: python benchmarks/bench_sharding.py [hosts] [pages_per_host] [latency_ms]
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+import multiprocessing
+from configparser import ConfigParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from utils.local_cache_server import encode_payload
+from utils.replay import CorpusWriter, VOCABULARY, replay_server
+
+SHARDS = (2, 4)
+
+
+def write_site(path, hosts, per_host, seed=121):
+    ''' Every page links three pages of its own host and two of other hosts.
+        The first host's sitemap lists a page of every host, so its shard has
+        to forward the sitemap urls of the hosts it doesn't own. '''
+    rng = random.Random(seed)
+    names = [f"https://h{i}.ics.uci.edu" for i in range(hosts)]
+    writer = CorpusWriter(path)
+    for host in names:
+        for i in range(per_host):
+            links = [f"{host}/p/{(i + step) % per_host}" for step in (1, 2, 5)]
+            links += [f"{rng.choice(names)}/p/{rng.randrange(per_host)}" for _ in range(2)]
+            start = rng.randrange(len(VOCABULARY) - 300)
+            text = " ".join(rng.choice(VOCABULARY[start:start + 300]) for _ in range(rng.randint(100, 600)))
+            anchors = "".join(f'<a href="{link}">x</a>' for link in links)
+            url = f"{host}/p/{i}"
+            writer.record(url, encode_payload(url, 200, f"<html><body><p>{text}</p>{anchors}</body></html>".encode()))
+    robots, sitemap = f"{names[0]}/robots.txt", f"{names[0]}/sitemap.xml"
+    writer.record(robots, encode_payload(robots, 200, f"User-agent: *\nSitemap: {sitemap}\n".encode()))
+    locs = "".join(f"<url><loc>{host}/p/{per_host // 2}</loc></url>" for host in names)
+    writer.record(sitemap, encode_payload(sitemap, 200, (
+        f'<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{locs}</urlset>').encode()))
+    writer.close()
+    return [f"{names[0]}/p/0"]
+
+
+def serve(path, latency, conn):
+    server = replay_server(path, latency=latency)
+    conn.send(server.address)
+    server.httpd.serve_forever()
+
+
+def make_config(address, seeds):
+    from utils.config import Config
+    cparser = ConfigParser()
+    cparser.read(os.path.join(ROOT, "config.ini"))
+    cparser["CRAWLER"]["SEEDURL"] = ",".join(seeds)
+    cparser["CRAWLER"]["POLITENESS"] = "0"
+    cparser["CRAWLER"]["ROBOTS"] = "true"  # for the sitemap, the other hosts' robots.txt are 404s
+    cparser["LOCAL PROPERTIES"]["THREADCOUNT"] = "4"
+    cparser["LOCAL PROPERTIES"]["SAVE"] = "frontier.db"
+    cparser["LOCAL PROPERTIES"]["STORE"] = "sqlite"
+    cparser["LOCAL PROPERTIES"]["METRICSFILE"] = ""
+    config = Config(cparser)
+    config.cache_server = address
+    return config
+
+
+def single(address, seeds, conn):
+    os.chdir(tempfile.mkdtemp())
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+    import scraper
+    from crawler import Crawler
+    config = make_config(address, seeds)
+    scraper.configure_log(config.checkpoint_pages, config.checkpoint_secs, fresh=True)
+    start = time.perf_counter()
+    Crawler(config, True).start()
+    elapsed = time.perf_counter() - start
+    scraper.state_log.checkpoint()
+    conn.send((elapsed, [os.path.abspath(scraper.LOG_FILE)]))
+
+
+def sharded(address, seeds, shards, conn):
+    os.chdir(tempfile.mkdtemp())
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+    from crawler.sharding import crawl_sharded
+    config = make_config(address, seeds)
+    start = time.perf_counter()
+    logs = crawl_sharded(config, shards, True)
+    conn.send((time.perf_counter() - start, [os.path.abspath(log) for log in logs]))
+
+
+def pages_logged(log):
+    # seq of the last record, every parsed page gets one
+    with open(f"{log}.delta", "rb") as file:
+        lines = file.read().splitlines()
+    return json.loads(lines[-1])["seq"] if lines else 0
+
+
+def compared(text):
+    lines = text.splitlines()
+    # the longest page's word count and the top words; which of the pages tied
+    # for longest wins depends on the order they were fetched in
+    return [lines[1].rsplit(" with ", 1)[-1]] + lines[2:lines.index("", 2)]
+
+
+def main(hosts=32, per_host=60, latency_ms=10):
+    import report
+    corpus = os.path.join(tempfile.mkdtemp(), "site.corpus")
+    seeds = write_site(corpus, hosts, per_host)
+    context = multiprocessing.get_context("spawn")
+    parent_conn, child_conn = context.Pipe()
+    server = context.Process(target=serve, args=(corpus, latency_ms / 1000, child_conn), daemon=True)
+    server.start()
+    address = parent_conn.recv()
+    print(f"{hosts} hosts x {per_host} pages, {latency_ms}ms per request, 4 threads per process, "
+          f"{os.cpu_count()} cpu(s)")
+    print(f"{'run':<10} {'seconds':>8} {'pages/s':>8}  {'pages per shard':<20} same longest page and top words")
+    expected = total = None
+    failed = []
+    for shards in (1,) + SHARDS:
+        receive, send = context.Pipe()
+        args = (address, seeds, send) if shards == 1 else (address, seeds, shards, send)
+        process = context.Process(target=single if shards == 1 else sharded, args=args)
+        process.start()
+        elapsed, logs = receive.recv()
+        process.join()
+        sys.stdout = open(os.devnull, "w")
+        text = compared(report.build_report(logs, processes=1))
+        sys.stdout = sys.__stdout__
+        expected = expected or text
+        per_shard = [pages_logged(log) for log in logs]
+        total = total or sum(per_shard)
+        name = "1 process" if shards == 1 else f"{shards} shards"
+        print(f"{name:<10} {elapsed:>8.1f} {sum(per_shard) / elapsed:>8.1f}  "
+              f"{'/'.join(map(str, per_shard)):<20} {text == expected}")
+        if text != expected or sum(per_shard) != total:
+            failed.append(name)
+    server.terminate()
+    # a host crawled by two shards shows up as pages parsed twice
+    assert not failed, f"not the same crawl as one process: {', '.join(failed)}"
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:4]))
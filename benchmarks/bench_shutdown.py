@@ -0,0 +1,131 @@
+# Stopping a crawl part way (crawler/shutdown.py) and resuming it: launch.py on
+# a replayed multi host site, stopped by Ctrl-C (SIGINT), by MAXPAGES and by
+# MAXSECONDS, and for comparison killed outright with SIGKILL (what a crash, or
+# a Ctrl-C before, left behind). Then a --shards 2 crawl stopped by SIGINT. Each
+# stopped crawl is then resumed to the end (the sharded one with --shards 2 too).
+# Prints the shutdown latency, pages lost in flight, pages downloaded again
+# after the resume, and whether the final report has the same longest page length
+# and top words as a crawl that never stopped.
+# run from the repo root: python benchmarks/bench_shutdown.py [hosts] [pages_per_host]
+import os
+import sys
+import glob
+import time
+import random
+import signal
+import tempfile
+import multiprocessing
+from configparser import ConfigParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from utils.local_cache_server import encode_payload
+from utils.replay import CorpusWriter, VOCABULARY
+
+STOP_AFTER = 3.0  # seconds after the process starts, for SIGINT and SIGKILL
+RUNS = [
+    ("never stopped", {}, None, 1),
+    ("SIGINT", {}, signal.SIGINT, 1),
+    ("MAXPAGES", {"MAXPAGES": "300"}, None, 1),
+    ("MAXSECONDS", {"MAXSECONDS": "2"}, None, 1),
+    ("SIGKILL", {}, signal.SIGKILL, 1),
+    ("SIGINT, 2 shards", {}, signal.SIGINT, 2),
+]
+
+
+def write_site(path, hosts, per_host, seed=121):
+    rng = random.Random(seed)
+    names = [f"https://h{i}.ics.uci.edu" for i in range(hosts)]
+    writer = CorpusWriter(path)
+    for host in names:
+        for i in range(per_host):
+            links = [f"{host}/p/{(i + step) % per_host}" for step in (1, 2, 5)]
+            links.append(f"{rng.choice(names)}/p/{rng.randrange(per_host)}")
+            text = " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(100, 600)))
+            anchors = "".join(f'<a href="{link}">x</a>' for link in links)
+            url = f"{host}/p/{i}"
+            writer.record(url, encode_payload(url, 200, f"<html><body><p>{text}</p>{anchors}</body></html>".encode()))
+    writer.close()
+    return [f"{name}/p/0" for name in names]
+
+
+def crawl(directory, corpus, seeds, restart, budget, shards, conn):
+    os.chdir(directory)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+    import launch
+    from utils.metrics import metrics
+
+    cparser = ConfigParser()
+    cparser.read(os.path.join(ROOT, "config.ini"))
+    cparser["CRAWLER"]["SEEDURL"] = ",".join(seeds)
+    cparser["CRAWLER"]["POLITENESS"] = "0.05"
+    cparser["CRAWLER"]["RATECONTROL"] = "fixed"
+    cparser["CRAWLER"]["ROBOTS"] = "false"
+    for key, value in budget.items():
+        cparser["CRAWLER"][key] = value
+    cparser["LOCAL PROPERTIES"]["THREADCOUNT"] = "4"
+    cparser["LOCAL PROPERTIES"]["SAVE"] = "frontier.db"
+    cparser["LOCAL PROPERTIES"]["STORE"] = "sqlite"
+    cparser["LOCAL PROPERTIES"]["METRICSFILE"] = ""
+    with open("run.ini", "w") as file:
+        cparser.write(file)
+    launch.main("run.ini", restart, replay=corpus, shards=shards)
+    snapshot = metrics.snapshot()["metrics"]
+    conn.send({"latency": snapshot["shutdown_seconds"], "lost": snapshot["shutdown_lost_pages"]})
+
+
+def downloads(directory):
+    count = 0
+    for path in glob.glob(os.path.join(directory, "Logs", "Worker.log")) + glob.glob(
+            os.path.join(directory, "shards", "shard-*", "Logs", "Worker.log")):
+        with open(path) as file:
+            count += sum(" - Downloaded " in line for line in file)
+    return count
+
+
+def compared(directory):
+    with open(os.path.join(directory, "report.txt")) as file:
+        lines = file.read().splitlines()
+    # the longest page's word count (pages tie at 600 words) and the top words
+    return [lines[1].rsplit(" with ", 1)[-1]] + lines[2:lines.index("", 2)]
+
+
+def run(context, directory, corpus, seeds, restart, budget=None, kill=None, shards=1):
+    receive, send = context.Pipe()
+    process = context.Process(target=crawl, args=(directory, corpus, seeds, restart, budget or {}, shards, send))
+    process.start()
+    if kill is not None:
+        time.sleep(STOP_AFTER)
+        os.kill(process.pid, kill)
+    stats = receive.recv() if kill != signal.SIGKILL else None
+    process.join()
+    return stats
+
+
+def main(hosts=8, per_host=150):
+    corpus = os.path.join(tempfile.mkdtemp(), "site.corpus")
+    seeds = write_site(corpus, hosts, per_host)
+    context = multiprocessing.get_context("spawn")
+    print(f"{hosts} hosts x {per_host} pages, 4 threads, POLITENESS 0.05, stopped {STOP_AFTER:g}s after start")
+    print(f"{'stopped by':<17} {'pages before':>12} {'shutdown s':>10} {'lost':>5} {'downloaded again':>17} "
+          f"{'same report':>12}")
+    expected = None
+    for name, budget, kill, shards in RUNS:
+        directory = tempfile.mkdtemp()
+        stats = run(context, directory, corpus, seeds, True, budget, kill, shards)
+        before = downloads(directory)
+        if expected is None:
+            expected, total = compared(directory), before
+            print(f"{name:<17} {before:>12}")
+            continue
+        run(context, directory, corpus, seeds, False, shards=shards)
+        again = downloads(directory) - total
+        latency = f"{stats['latency']:.2f}" if stats else "-"
+        lost = stats["lost"] if stats else "-"
+        print(f"{name:<17} {before:>12} {latency:>10} {lost:>5} {again:>17} {str(compared(directory) == expected):>12}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
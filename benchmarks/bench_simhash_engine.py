@@ -0,0 +1,74 @@
+# Throughput (pages/sec) of make_simhash vs the numpy engine, plus a golden-set check
+# that both engines make the same near-duplicate calls (fails when they don't).
+# run from the repo root: python benchmarks/bench_simhash_engine.py
+import os
+import sys
+import random
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from simhash_basic import make_simhash, make_simhash_fast, make_simhash_batch, simhash_diff, HAVE_NUMPY
+
+THRESHOLD = 5
+
+
+def random_page(words, n):
+    return " ".join(random.choice(words) for _ in range(n))
+
+
+def edit(page, fraction):
+    # replace a fraction of the words to get a near copy
+    tokens = page.split()
+    for _ in range(int(len(tokens) * fraction)):
+        tokens[random.randrange(len(tokens))] = "edited"
+    return " ".join(tokens)
+
+
+def golden_pairs(words):
+    # (a, b, is_near_duplicate) for exact copies, tiny edits and unrelated pages
+    pairs = []
+    for _ in range(100):
+        page = random_page(words, random.randint(300, 3000))
+        pairs.append((page, page, True))
+        pairs.append((page, edit(page, 0.001), True))
+        pairs.append((page, random_page(words, random.randint(300, 3000)), False))
+    return pairs
+
+
+def throughput(func, pages):
+    start = time.perf_counter()
+    func(pages)
+    return len(pages) / (time.perf_counter() - start)
+
+
+def main():
+    if not HAVE_NUMPY:
+        print("numpy is not installed, nothing to compare")
+        return
+    random.seed(121)
+    words = ["".join(random.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(random.randint(2, 10)))
+             for _ in range(5000)]
+
+    wrong = []
+    pairs = golden_pairs(words)
+    for i, (a, b, expected) in enumerate(pairs):
+        old = simhash_diff(make_simhash(a), make_simhash(b)) < THRESHOLD
+        new = simhash_diff(make_simhash_fast(a), make_simhash_fast(b)) < THRESHOLD
+        if old != expected or new != expected:
+            wrong.append((i, expected, old, new))
+    print(f"golden set: {len(pairs) - len(wrong)}/{len(pairs)} pairs classified the same by both engines")
+    for i, expected, old, new in wrong:
+        print(f"  pair {i}: expected {expected}, make_simhash {old}, make_simhash_fast {new}")
+    assert not wrong, f"{len(wrong)} golden pairs classified wrong"
+
+    for size in (2000, 20000, 200000):  # roughly 2KB, 20KB and 200KB of text
+        pages = [random_page(words, size // 7) for _ in range(max(3, 200000 // size))]
+        old = throughput(lambda ps: [make_simhash(p) for p in ps], pages)
+        fast = throughput(lambda ps: [make_simhash_fast(p) for p in ps], pages)
+        batch = throughput(make_simhash_batch, pages)
+        print(f"~{size // 1000}KB pages: make_simhash {old:.1f}/s, make_simhash_fast {fast:.1f}/s, "
+              f"make_simhash_batch {batch:.1f}/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# Lookup latency of SimHashIndex vs the old linear scan as the index grows.
+# run from the repo root: python benchmarks/bench_simhash_index.py [max_size]
+import os
+import sys
+import random
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from simhash_basic import SimHashIndex, simhash_diff
+
+K = 4
+QUERIES = 2000
+LINEAR_LIMIT = 100000  # linear scan gets too slow to bother past this
+
+
+def near(fp, bits):
+    for i in random.sample(range(64), bits):
+        fp ^= 1 << i
+    return fp
+
+
+def linear_has_within(hashes, fp, k):
+    for old in hashes:
+        if simhash_diff(fp, old) <= k:
+            return True
+    return False
+
+
+def main(max_size=1000000):
+    random.seed(121)
+    index = SimHashIndex(max_k=K)
+    stored = []
+    sizes = [s for s in (1000, 10000, 100000, 1000000) if s <= max_size]
+    print(f"{'size':>9} {'index us/query':>15} {'linear us/query':>16} {'agree':>6}")
+    for size in sizes:
+        while len(stored) < size:
+            fp = random.getrandbits(64)
+            stored.append(fp)
+            index.add(fp)
+
+        # half the queries are near copies of stored hashes, half are random
+        queries = [near(random.choice(stored), random.randint(0, 6)) if i % 2 else random.getrandbits(64)
+                   for i in range(QUERIES)]
+
+        start = time.perf_counter()
+        got = [index.has_within(q, K) for q in queries]
+        index_us = (time.perf_counter() - start) / QUERIES * 1e6
+
+        if size <= LINEAR_LIMIT:
+            sample = queries[:200]
+            start = time.perf_counter()
+            expected = [linear_has_within(stored, q, K) for q in sample]
+            linear_us = (time.perf_counter() - start) / len(sample) * 1e6
+            agree = "yes" if expected == got[:len(sample)] else "NO"
+            print(f"{size:>9} {index_us:>15.1f} {linear_us:>16.1f} {agree:>6}")
+        else:
+            print(f"{size:>9} {index_us:>15.1f} {'-':>16} {'-':>6}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
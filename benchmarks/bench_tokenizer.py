@@ -0,0 +1,73 @@
+# MB/sec of page text through the old tokenize + compute_word_frequencies
+# against the new tokenizer.py: tokenize, tokenize_and_count and the streaming
+# iter_tokens, after checking they all give the same counts.
+# run from the repo root: python benchmarks/bench_tokenizer.py [MB]
+import os
+import re
+import sys
+import time
+import random
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import tokenizer
+
+ROUNDS = 3
+
+
+def old_tokenize(text):
+    # tokenizer.tokenize before: compiled per call, every word lowercased twice
+    regex_pattern = re.compile(r"[A-Za-z0-9]+")
+    return [word.lower() for word in regex_pattern.findall(text) if word.lower() not in tokenizer.STOPWORDS]
+
+
+def make_pages(megabytes, rng):
+    vocabulary = [word.capitalize() if i % 7 == 0 else word
+                  for i, word in enumerate(sorted(tokenizer.STOPWORDS))]
+    vocabulary += [f"word{i}" for i in range(20000)] + [str(i) for i in range(500)]
+    vocabulary += list("abcxyz") + ["caf\u00e9", "na\u00efve", "\u212aelvin"]
+    pages, size = [], 0
+    while size < megabytes * 1024 * 1024:
+        words = rng.choices(vocabulary, k=rng.randint(100, 3000))
+        page = " ".join(word + rng.choice(("", "", ",", ".", "\n")) for word in words)
+        pages.append(page)
+        size += len(page)
+    return pages, size
+
+
+def timed(pages, size, function):
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for page in pages:
+            function(page)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return size / 2 ** 20 / best
+
+
+def main(megabytes=20):
+    pages, size = make_pages(megabytes, random.Random(121))
+    for page in pages[:50]:
+        expected = tokenizer.compute_word_frequencies(old_tokenize(page))
+        assert tokenizer.tokenize_and_count(page) == expected
+        assert Counter(tokenizer.tokenize(page)) == expected
+        assert Counter(tokenizer.iter_tokens(page)) == expected
+
+    engines = [
+        ("old tokenize + compute_word_frequencies",
+         lambda page: tokenizer.compute_word_frequencies(old_tokenize(page))),
+        ("tokenize + compute_word_frequencies",
+         lambda page: tokenizer.compute_word_frequencies(tokenizer.tokenize(page))),
+        ("tokenize_and_count", tokenizer.tokenize_and_count),
+        ("tokenize_and_count(min_length=2, drop_numeric)",
+         lambda page: tokenizer.tokenize_and_count(page, 2, True)),
+        ("Counter(iter_tokens)", lambda page: Counter(tokenizer.iter_tokens(page))),
+    ]
+    print(f"{len(pages)} pages, {size / 2 ** 20:.1f} MB of text")
+    for name, function in engines:
+        print(f"{name:<48} {timed(pages, size, function):>7.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 20)
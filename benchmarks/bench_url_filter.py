@@ -0,0 +1,88 @@
+# URLs/sec through is_valid + is_trap: the old per-call regex versions against the
+# precompiled url_filter.UrlClassifier, on a generated 1M url list. Also checks
+# both give the same answers.
+# run from the repo root: python benchmarks/bench_url_filter.py [urls]
+import os
+import re
+import sys
+import time
+import random
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import scraper
+
+
+def old_is_trap(url):
+    parsed = urlparse(url)
+    if "doku.php" in parsed.path:
+        return True
+    for i in scraper.TRAP_PATTERNS:
+        if re.search(i, url):
+            return True
+    return False
+
+
+def old_is_valid(url):
+    parsed = urlparse(url)
+    if parsed.scheme not in set(["http", "https"]):
+        return False
+    allowed_domains = [".ics.uci.edu", ".cs.uci.edu", ".informatics.uci.edu", ".stat.uci.edu"]
+    if not any(parsed.netloc.endswith(domain) for domain in allowed_domains):
+        return False
+    if re.match(
+            r".*\.(css|js|bmp|gif|jpg|jpeg|png|pdf|ico"
+            + r"|tiff?|mid|mp2|mp3|mp4|wav|avi|mov|mpeg|m4v|mkv|ogg|ogv"
+            + r"|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx"
+            + r"|data|dat|exe|bz2|tar|msi|bin|7z|dmg|iso"
+            + r"|epub|dll|cnf|tgz|sha1|thmx|mso|arff|rtf|jar|csv"
+            + r"|rm|smil|wmv|swf|wma|zip|rar|gz|ical|ppsx|pps|mol)$",
+            parsed.path.lower()):
+        return False
+    return True
+
+
+def make_urls(count):
+    hosts = ["www.ics.uci.edu", "vision.ics.uci.edu", "www.cs.uci.edu", "www.stat.uci.edu",
+             "ics.uci.edu", "www.google.com", "wiki.ics.uci.edu", "www.informatics.uci.edu:8080"]
+    paths = ["/", "/about", "/people/faculty.html", "/files/paper.PDF", "/img/logo.png", "/doku.php",
+             "/events/calendar/2019-01", "/a.b/c", "/style.css", "/data.tiff", "/x.tif", "/archive.tar.gz"]
+    queries = ["", "", "", "?page=3", "?share=twitter", "?id=7&do=edit", "?utm_source=x", "?q=search",
+               "?tribe-bar-date=2020-01-01", "?replytocom=12"]
+    schemes = ["https", "https", "http", "ftp", "mailto"]
+    random.seed(121)
+    return [f"{random.choice(schemes)}://{random.choice(hosts)}{random.choice(paths)}"
+            f"{random.randrange(100000) if random.random() < 0.5 else ''}{random.choice(queries)}"
+            for _ in range(count)]
+
+
+def rate(func, urls):
+    start = time.perf_counter()
+    for url in urls:
+        func(url)
+    return len(urls) / (time.perf_counter() - start)
+
+
+def main(count=1000000):
+    urls = make_urls(count)
+    sample = urls[:50000]
+    same = all(old_is_valid(url) == scraper.is_valid(url) and old_is_trap(url) == scraper.is_trap(url)
+               for url in sample)
+    print(f"same answers on {len(sample)} urls: {same}")
+
+    def old(url):
+        return old_is_valid(url) and not old_is_trap(url)
+
+    def new(url):
+        return scraper.url_classifier.classify(url) == "ok"
+
+    print(f"old is_valid + is_trap     {rate(old, urls[:100000]):>10.0f} urls/s (first 100k)")
+    scraper.url_classifier.classify.cache_clear()
+    print(f"UrlClassifier.classify     {rate(new, urls):>10.0f} urls/s ({count} urls, about half repeats)")
+    cold = scraper.UrlClassifier(scraper.ALLOWED_DOMAINS, scraper.BLOCKED_EXTENSIONS,
+                                 scraper.TRAP_PATTERNS, cache_size=0)
+    print(f"UrlClassifier, no memo    {rate(lambda url: cold.classify(url) == 'ok', urls):>10.0f} urls/s")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
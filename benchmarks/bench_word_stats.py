@@ -0,0 +1,80 @@
+# Memory and per page update cost of the word count aggregators in
+# utils/word_stats.py over a synthetic stream of pages: the old plain dict
+# update from scraper.update_word_counts, WordCounts (exact) and
+# ApproxWordCounts (Count-Min Sketch), plus how many of the exact top 50 words
+# the sketch gets right.
+# run from the repo root: python benchmarks/bench_word_stats.py [pages]
+import os
+import sys
+import time
+import random
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.word_stats import WordCounts, ApproxWordCounts
+
+WORDS_PER_PAGE = 200
+VOCABULARY = 5000000  # zipf-ish, the long tail keeps bringing in new junk tokens
+REPORT_EVERY = 10
+
+
+class OldWordCounts(object):
+    # the loop scraper.update_word_counts ran on the global dict
+    def __init__(self):
+        self.counts = {}
+
+    def update(self, page_counts):
+        counts = self.counts
+        for word, count in page_counts.items():
+            counts[word] = counts.get(word, 0) + count
+
+    def top(self, n=50):
+        return sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:n]
+
+
+def dict_bytes(counts):
+    # the dict plus its keys and (non cached) int values
+    return (sys.getsizeof(counts) + sum(sys.getsizeof(word) for word in counts)
+            + sum(sys.getsizeof(count) for count in counts.values() if count > 256))
+
+
+def size_of(aggregator):
+    if isinstance(aggregator, ApproxWordCounts):
+        return aggregator.nbytes() + dict_bytes(aggregator.top_words.counts)
+    return dict_bytes(aggregator.counts)
+
+
+def make_pages(count, rng):
+    # word ids ~ 1/rank, drawn by inverting the cumulative log curve
+    for _ in range(count):
+        ids = [int(VOCABULARY ** rng.random()) for _ in range(WORDS_PER_PAGE)]
+        yield Counter(f"w{i}" for i in ids)
+
+
+def main(pages=1000000):
+    aggregators = {"old dict": OldWordCounts(), "exact": WordCounts(), "approx": ApproxWordCounts()}
+    spent = {name: 0.0 for name in aggregators}
+    rng = random.Random(121)
+    checkpoints = [pages // REPORT_EVERY * i for i in range(1, REPORT_EVERY + 1)]
+    print(f"{'pages':>9} {'aggregator':<10} {'MB':>8} {'us/page':>8} {'top50 ms':>9}")
+    done = 0
+    for page in make_pages(pages, rng):
+        for name, aggregator in aggregators.items():
+            start = time.perf_counter()
+            aggregator.update(page)
+            spent[name] += time.perf_counter() - start
+        done += 1
+        if done in checkpoints and done in (checkpoints[0], checkpoints[-1]):
+            for name, aggregator in aggregators.items():
+                start = time.perf_counter()
+                aggregator.top(50)
+                top_ms = (time.perf_counter() - start) * 1000
+                print(f"{done:>9} {name:<10} {size_of(aggregator) / 2 ** 20:>8.1f} "
+                      f"{spent[name] / done * 1e6:>8.1f} {top_ms:>9.3f}")
+    exact = set(word for word, _ in aggregators["exact"].top(50))
+    approx = set(word for word, _ in aggregators["approx"].top(50))
+    print(f"approx top 50 matches {len(exact & approx)}/50 of the exact top 50")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
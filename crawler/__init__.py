@@ -1,6 +1,10 @@
 from utils import get_logger
 from crawler.frontier import Frontier
 from crawler.worker import Worker
+from crawler.async_worker import AsyncWorker
+from crawler.pipeline import ParsePipeline
+from crawler.shutdown import ShutdownController
+from utils.metrics import MetricsReporter
 
 class Crawler(object):
     def __init__(self, config, restart, frontier_factory=Frontier, worker_factory=Worker):
@@ -9,18 +13,38 @@ class Crawler(object):
         self.frontier = frontier_factory(config, restart)
         self.workers = list()
         self.worker_factory = worker_factory
+        # parsing in a process pool, see crawler/pipeline.py
+        self.pipeline = ParsePipeline(config, self.frontier) if config.parse_processes else None
+        self.reporter = MetricsReporter(
+            path=config.metrics_file, interval=config.metrics_secs, port=config.metrics_port)
+        # signals, the crawl budget and the drain + flush at the end
+        self.shutdown = ShutdownController(
+            self.frontier, config.max_seconds, config.max_pages, config.max_bytes, config.drain_secs)
 
     def start_async(self):
-        self.workers = [
-            self.worker_factory(worker_id, self.config, self.frontier)
-            for worker_id in range(self.config.threads_count)]
+        self.reporter.start()
+        self.shutdown.start()
+        if self.config.downloader == "async" and self.worker_factory is Worker:
+            # one event loop thread does all the fetching
+            self.workers = [AsyncWorker(0, self.config, self.frontier)]
+        else:
+            self.workers = [
+                self.worker_factory(worker_id, self.config, self.frontier)
+                for worker_id in range(self.config.threads_count)]
         for worker in self.workers:
+            worker.pipeline = self.pipeline
+            worker.shutdown = self.shutdown
             worker.start()
 
     def start(self):
         self.start_async()
         self.join()
 
+    def stop(self, reason):
+        self.shutdown.stop(reason)
+
     def join(self):
-        for worker in self.workers:
-            worker.join()
+        # returns once the frontier is empty, or DRAINSECONDS at most after stop()
+        self.shutdown.drain(self.workers, self.pipeline)
+        self.shutdown.flush()
+        self.reporter.stop()
@@ -0,0 +1,71 @@
+import asyncio
+import time
+from threading import Thread
+
+from utils import get_logger
+from utils.async_download import AsyncDownloader
+from crawler.worker import check_scraper_source, DOWNLOAD_TIME, PAGES_DOWNLOADED, PROCESS_TIME
+import scraper
+
+# Picked with DOWNLOADER = async in config.ini. One thread runs an event loop with
+# ASYNCCONCURRENCY fetch tasks sharing a pool of connections to the cache server.
+# Scraping still runs on a thread pool so a slow page doesn't stall the loop.
+
+
+class AsyncWorker(Thread):
+    def __init__(self, worker_id, config, frontier):
+        self.logger = get_logger(f"AsyncWorker-{worker_id}", "Worker")
+        self.config = config
+        self.frontier = frontier
+        self.concurrency = config.async_concurrency
+        self.pipeline = None # set by the Crawler when PARSEPROCESSES > 0
+        self.shutdown = None # set by the Crawler, counts pages for the budget
+        check_scraper_source()
+        super().__init__(daemon=True)
+
+    def run(self):
+        asyncio.run(self._crawl())
+
+    async def _crawl(self):
+        downloader = AsyncDownloader(
+            self.config, pool_size=self.concurrency,
+            timeout=self.config.download_timeout, logger=self.logger)
+        try:
+            await asyncio.gather(*(self._fetch_loop(downloader) for _ in range(self.concurrency)))
+        finally:
+            downloader.close()
+        self.logger.info("Frontier is empty. Stopping Crawler.")
+
+    async def _fetch_loop(self, downloader):
+        loop = asyncio.get_running_loop()
+        while True:
+            # never block the loop waiting on the frontier, poll it instead
+            tbd_url = self.frontier.get_tbd_url(block=False)
+            if not tbd_url:
+                if self.frontier.is_finished():
+                    return  # done, or stopping (the other tasks finish their page)
+                await asyncio.sleep(0.05)
+                continue
+            started = time.perf_counter()
+            with DOWNLOAD_TIME.time():
+                resp = await downloader.fetch(tbd_url)
+            self.frontier.observe(tbd_url, time.perf_counter() - started, resp.status)
+            PAGES_DOWNLOADED.inc(label_value=str(resp.status))
+            if self.shutdown:
+                self.shutdown.count(resp.size)
+            self.logger.info(
+                f"Downloaded {tbd_url}, status <{resp.status}>, "
+                f"using cache {self.config.cache_server}.")
+            await loop.run_in_executor(None, self._process, tbd_url, resp)
+
+    def _process(self, tbd_url, resp):
+        if self.pipeline:
+            self.pipeline.submit(tbd_url, resp)
+            return
+        try:
+            with PROCESS_TIME.time():
+                for scraped_url in scraper.scraper(tbd_url, resp):
+                    self.frontier.add_url(scraped_url)
+        except Exception:
+            self.logger.exception(f"Failed on {tbd_url}.")
+        self.frontier.mark_url_complete(tbd_url)
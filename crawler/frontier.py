@@ -1,78 +1,267 @@
-import os
-import shelve
+import time
 
 from threading import Thread, RLock
 from queue import Queue, Empty
 
+import scraper
 from future.backports.urllib.parse import urldefrag
 from utils import get_logger, get_urlhash, normalize
 from scraper import is_valid
+from crawler.storage import STORES
+from crawler.scheduler import HostScheduler, PriorityHostScheduler
+from crawler.scoring import SCORERS
+from crawler.rate_control import RateController
+from crawler.robots import RobotsService
+from utils.seen_set import SeenSet
+from utils.metrics import metrics
 
-# Added RLock() for thread safety
+ROBOTS_WAIT = 0.1  # a host whose robots.txt is still coming is tried again after this
+RESUME_CHUNK = 1000  # urls read from the save file at a time on a resume
+# Added RLock() for thread safety, the per host scheduler does its own locking
 class Frontier(object):
     def __init__(self, config, restart):
         self.logger = get_logger("FRONTIER")
         self.config = config
-        self.to_be_downloaded = list()
-        #self.lock = RLock() # for multithreading
+        # urls waiting per host, politeness delay is applied per host not per worker
+        if self.config.frontier_order in SCORERS:
+            # best scored url first, the scorer learns from how every page turns out
+            self.scorer = SCORERS[self.config.frontier_order]()
+            self.to_be_downloaded = PriorityHostScheduler(self.config.time_delay, self.scorer.score)
+            scraper.page_outcomes = self.scorer.record
+        else:
+            self.scorer = None
+            self.to_be_downloaded = HostScheduler(self.config.time_delay)
+        # and that delay follows each host's latency and errors
+        self.rate_control = RateController(
+            self.config.time_delay, self.config.delay_floor, self.config.delay_ceiling,
+            self.config.circuit_errors, self.config.circuit_secs,
+            adaptive=self.config.rate_control == "adaptive")
+        # launch.py --shards: urls of other shards' hosts go to them (crawler/sharding.py)
+        self.shard = self.config.shard
+        # robots.txt rules fetched in the background, Crawl-delay goes to the
+        # rate controller and sitemap urls come back through add_urls. Its
+        # fetches take their turn in the scheduler like the host's pages
+        self.robots = None
+        if self.config.robots:
+            self.robots = RobotsService(
+                self.config, on_urls=self.add_urls, on_crawl_delay=self.rate_control.set_min_delay,
+                is_valid=is_valid, cache_size=self.config.robots_cache, ttl=self.config.robots_ttl,
+                fetchers=self.config.robots_fetchers, sitemap_urls=self.config.sitemap_urls,
+                hold=self.to_be_downloaded.hold, release=self.to_be_downloaded.release,
+                claim=self.to_be_downloaded.claim, done=self.host_done)
+        # every urlhash in the save file, so add_url never reads the disk. Same
+        # compact digest set the scraper uses for visited_urls
+        self.seen = SeenSet(bloom=self.config.seen_bloom)
+        self.lock = RLock() # for multithreading
+        self.loading = False  # the save file is still being read into seen / the queue
+        self.in_progress = 0  # urls handed to workers and not marked complete yet
+        self.given_up = set()  # hosts given up on after repeated errors, for this run
+        self.loader = None
+        self.closed = False
+        metrics.gauge("frontier_depth", "urls waiting to be downloaded", lambda: len(self.to_be_downloaded))
+        metrics.gauge("host_queue_size", "urls waiting per host", self.to_be_downloaded.host_sizes, label="host")
+        metrics.gauge("seen_urls", "urls the frontier has seen", lambda: len(self.seen))
+        store = STORES[self.config.frontier_store]
 
-        if not os.path.exists(self.config.save_file) and not restart:
+        if not store.exists(self.config.save_file) and not restart:
             # Save file does not exist, but request to load save.
             self.logger.info(
                 f"Did not find save file {self.config.save_file}, "
                 f"starting from seed.")
-        elif os.path.exists(self.config.save_file) and restart:
+        elif store.exists(self.config.save_file) and restart:
             # Save file does exists, but request to start from seed.
             self.logger.info(
                 f"Found save file {self.config.save_file}, deleting it.")
-            os.remove(self.config.save_file)
+            store.remove(self.config.save_file)
         # Load existing save file, or create one if it does not exist.
-        self.save = shelve.open(self.config.save_file)
+        self.save = store(
+            self.config.save_file, self.config.store_batch_size,
+            self.config.store_batch_secs)
+        if self.shard:
+            self.shard.attach(self)  # other shards' urls can come in from here on
         if restart:
             for url in self.config.seed_urls:
                 self.add_url(url)
+        elif self.save.is_empty():
+            for url in self.config.seed_urls:
+                self.add_url(url)
         else:
             # Set the frontier state with contents of save file.
             self._parse_save_file()
-            if not self.save:
-                for url in self.config.seed_urls:
-                    self.add_url(url)
 
     def _parse_save_file(self):
         ''' This function can be overridden for alternate saving techniques. '''
-        total_count = len(self.save)
-        tbd_count = 0
-        for url, completed in self.save.values():
-            if not completed and is_valid(url):
-                self.to_be_downloaded.append(url)
-                tbd_count += 1
-        self.logger.info(
-            f"Found {tbd_count} urls to be downloaded from {total_count} "
-            f"total urls discovered.")
-
-    def get_tbd_url(self):
+        # the first chunk of pending urls goes in the queue right away, the rest
+        # of them and then every urlhash for the seen set are read on a thread
+        # while the workers already download. Until it's done add_url asks the
+        # save file about urls the seen set doesn't know yet
+        with self.lock:
+            pending = self.save.pending_chunks(RESUME_CHUNK)
+            hashes = self.save.hash_chunks(RESUME_CHUNK)
+            first = next(pending, [])
+            self.loading = True
+        self.tbd_count = self._queue_saved(first)
+        self.to_be_downloaded.hold()  # the workers don't stop while urls are still coming
+        self.loader = Thread(target=self._load_save_file, args=(pending, hashes), daemon=True)
+        self.loader.start()
+
+    def _queue_saved(self, chunk):
+        # (urlhash, url) pending in the save file, is_valid again in case the rules changed
+        urls = []
+        with self.lock:
+            for urlhash, url in chunk:
+                self.seen.add(urlhash)
+                if is_valid(url):
+                    urls.append(url)
+        count = 0
+        for url in urls:
+            if self.shard and not self.shard.owns(url):
+                self.shard.forward(url)  # the shards were split differently last run
+                continue
+            self.to_be_downloaded.put(url)
+            count += 1
+        return count
+
+    def _load_save_file(self, pending, hashes):
+        started = time.perf_counter()
         try:
-            return self.to_be_downloaded.pop()
-        except IndexError:
-            return None
+            while True:
+                with self.lock:
+                    chunk = None if self.closed else next(pending, None)
+                if chunk is None:
+                    break
+                self.tbd_count += self._queue_saved(chunk)
+            while True:
+                with self.lock:
+                    chunk = None if self.closed else next(hashes, None)
+                    if chunk is None:
+                        break
+                    for urlhash in chunk:
+                        self.seen.add(urlhash)
+            with self.lock:
+                self.loading = False
+                if self.closed:
+                    return
+            self.logger.info(
+                f"Found {self.tbd_count} urls to be downloaded from {len(self.seen)} "
+                f"total urls discovered in {time.perf_counter() - started:.1f}s. Seen set uses "
+                f"{self.seen.nbytes()} bytes, false positive rate {self.seen.false_positive_rate():.2e}.")
+        except Exception:
+            self.logger.exception("Failed reading the save file.")
+        finally:
+            self.to_be_downloaded.release()
+
+    def get_tbd_url(self, block=True):
+        # blocks until some host is ready, None only when everything is done
+        # (with block=False, None also means no host is ready right now)
+        while True:
+            url = self.to_be_downloaded.get(block=block)
+            if url is None:
+                return url
+            allowed = self.robots.allowed(url) if self.robots else True  # in memory, never waits
+            if allowed:
+                with self.lock:
+                    self.in_progress += 1
+                return url
+            if allowed is None:
+                # robots.txt not here yet, the url goes back and its host waits a bit
+                self.to_be_downloaded.put(url)
+                self.to_be_downloaded.done(url, ROBOTS_WAIT)
+            else:
+                # disallowed, done without a download
+                with self.lock:
+                    self.save.put(get_urlhash(url), url, True)
+                self.to_be_downloaded.done(url, 0)
+
+    def is_finished(self):
+        return self.to_be_downloaded.finished() or self.to_be_downloaded.stopped
+
+    def stop(self):
+        # no more urls for the workers (crawler/shutdown.py), the ones queued stay
+        # in the save file for the next run
+        self.to_be_downloaded.stop()
 
     def add_url(self, url):
         url, _ = urldefrag(url)  ## added to make sure no # are added to frontier
         url = normalize(url)
+        if self.shard and not self.shard.owns(url):
+            self.shard.forward(url)  # another shard's host
+            return
         urlhash = get_urlhash(url)
-        if urlhash not in self.save:
-            self.save[urlhash] = (url, False)
+        with self.lock:
+            if self.closed:
+                return # a page that missed the end of the crawl
+            if not self.seen.add(urlhash):
+                return # seen before
+            if self.loading and self.save.contains(urlhash):
+                return # from the last run, not read into seen yet
+            self.save.put(urlhash, url, False) # written with the next batch
+        if self.given_up and HostScheduler.host_of(url) in self.given_up:
+            return # stays pending in the save file for the next run
+        self.to_be_downloaded.put(url)
+        if self.robots:
+            self.robots.prefetch(url)
 
-            self.save.sync()
-            self.to_be_downloaded.append(url)
+    def add_urls(self, urls):
+        # many at once (a sitemap), one lock for the lot
+        new = []
+        foreign = []
+        with self.lock:
+            if self.closed:
+                return
+            for url in urls:
+                url = normalize(urldefrag(url)[0])
+                if self.shard and not self.shard.owns(url):
+                    foreign.append(url)  # a sitemap can list other shards' hosts
+                    continue
+                urlhash = get_urlhash(url)
+                if self.seen.add(urlhash) and not (self.loading and self.save.contains(urlhash)):
+                    self.save.put(urlhash, url, False)
+                    new.append(url)
+        for url in foreign:
+            self.shard.forward(url)
+        for url in new:
+            if self.given_up and HostScheduler.host_of(url) in self.given_up:
+                continue # pending in the save file, like in add_url
+            self.to_be_downloaded.put(url)
+
+    def observe(self, url, seconds, status):
+        # a download finished (status None if it failed outright)
+        self.rate_control.observe(HostScheduler.host_of(url), seconds, status)
+
+    def host_done(self, url):
+        # a robots.txt or sitemap fetch is over, the host waits like after a page
+        self.to_be_downloaded.done(url, self.rate_control.delay(HostScheduler.host_of(url)))
 
     def mark_url_complete(self, url):
         urlhash = get_urlhash(url)
-        if urlhash not in self.save:
-            # This should not happen.
-            self.logger.error(
-                f"Completed url {url}, but have not seen it before.")
+        with self.lock:
+            if self.closed:
+                return # too late, it stays pending in the save file
+            self.in_progress -= 1
+            if urlhash not in self.seen:
+                # This should not happen.
+                self.logger.error(
+                    f"Completed url {url}, but have not seen it before.")
+                self.seen.add(urlhash)
+
+            self.save.put(urlhash, url, True)
+        # lets the next url from this host go after its politeness delay
+        host = HostScheduler.host_of(url)
+        self.to_be_downloaded.done(url, self.rate_control.delay(host))
+        if self.rate_control.given_up(host):
+            self.given_up.add(host)  # urls found for it later aren't queued either
+            dropped = self.to_be_downloaded.drop_host(host)
+            if dropped:
+                self.logger.warning(
+                    f"Giving up on {host} after repeated errors, "
+                    f"{len(dropped)} urls left for the next run.")
 
-        self.save[urlhash] = (url, True)
-        self.save.sync()
+    def close(self):
+        if self.robots:
+            self.robots.close()  # no more sitemap urls after this
+        # writes whatever is still waiting for a batch
+        with self.lock:
+            self.closed = True  # a loader still reading the save file stops
+            self.save.close()
 
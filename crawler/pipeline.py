@@ -0,0 +1,139 @@
+import os
+import time
+import multiprocessing
+from queue import Queue
+from threading import Thread, Semaphore, Condition
+from concurrent.futures import ProcessPoolExecutor
+
+from utils import get_logger
+from utils.seen_set import SeenSet
+import scraper
+
+# Used when PARSEPROCESSES > 0. Fetch workers only download and run the cheap
+# scraper.check_response checks, then push the page onto a bounded queue (put()
+# blocks when the parsers fall behind, which slows the fetchers down). A dispatcher
+# thread feeds a process pool running scraper.analyze_page, and results come back
+# here to be merged into the stats (scraper.apply_page) and the frontier.
+# Every parse process keeps its own copy of the content digests, so an exact copy
+# of a page stops before tokenizing and SimHash there too: it starts from the
+# digests of the resumed crawl, and each task brings the ones recorded since the
+# slowest process last said how far it got. A process the pool starts late misses
+# the ones before that, apply_page still catches those copies.
+
+_known_digests = None  # in a parse process: the content digests it knows about
+_known_count = 0       # how many of the parent's recorded digests are in it
+
+
+def _start_process(dumped):
+    global _known_digests
+    _known_digests = SeenSet()
+    _known_digests.load(dumped)
+
+
+def _analyze(url, content, offset, digests):
+    # runs in a parse process: digests are the parent's from number `offset` on
+    global _known_count
+    for digest in digests[max(0, _known_count - offset):]:
+        _known_digests.add_digest(digest)
+    _known_count = max(_known_count, offset + len(digests))
+    return scraper.analyze_page(url, content, _known_digests), os.getpid(), _known_count
+
+
+class ParsePipeline(object):
+    def __init__(self, config, frontier):
+        self.logger = get_logger("PIPELINE")
+        self.frontier = frontier
+        self.queue = Queue(maxsize=config.parse_queue_size)
+        # at most two pages per process waiting in the pool, the rest wait in the queue
+        self.in_pool = Semaphore(config.parse_processes * 2)
+        self.cond = Condition()
+        self.outstanding = 0  # pages queued or in the pool, not marked complete yet
+        self.digests = []      # recorded by apply_page since the pool started, from number digest_base on
+        self.digest_base = 0
+        self.known = {}        # parse process pid -> how many of them it has
+        # spawn, not fork: the crawler already has threads (and locks) by now
+        self.executor = ProcessPoolExecutor(
+            config.parse_processes, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_start_process, initargs=(scraper.content_digests.dump(),))
+        self.dispatcher = Thread(target=self._dispatch, daemon=True)
+        self.dispatcher.start()
+
+    def submit(self, url, resp):
+        ''' Called by a worker after download, blocks while the queue is full. '''
+        try:
+            early = scraper.check_response(url, resp)
+        except Exception:
+            self.logger.exception(f"Failed on {url}.")
+            early = []
+        if early is not None:
+            scraper.store_page(url, resp)
+            self._finish(url, early)
+            return
+        with self.cond:
+            self.outstanding += 1
+        self.queue.put((url, resp))
+
+    def _dispatch(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            url, resp = item
+            self.in_pool.acquire()
+            with self.cond:
+                # what the processes that answered so far may still be missing
+                offset = max(min(self.known.values(), default=0), self.digest_base)
+                digests = self.digests[offset - self.digest_base:]
+            try:
+                # a memoryview doesn't pickle, this copy is the one the pool needs anyway
+                future = self.executor.submit(_analyze, url, bytes(resp.content), offset, digests)
+            except RuntimeError:
+                return  # shut down by close() before the queue was empty
+            future.add_done_callback(lambda future, url=url, resp=resp: self._analyzed(url, resp, future))
+
+    def _analyzed(self, url, resp, future):
+        self.in_pool.release()
+        try:
+            page, pid, count = future.result()
+            scraper.store_page(url, resp, page)
+            links = scraper.apply_page(url, page)
+            self._known(pid, count, page["digest"])
+        except Exception:
+            self.logger.exception(f"Failed on {url}.")
+            links = []
+        self._finish(url, links)
+        with self.cond:
+            self.outstanding -= 1
+            self.cond.notify_all()
+
+    def _known(self, pid, count, digest):
+        with self.cond:
+            self.known[pid] = max(self.known.get(pid, 0), count)
+            self.digests.append(digest)  # apply_page recorded it, the processes get it with the next tasks
+            drop = min(self.known.values()) - self.digest_base
+            if drop > 0:
+                del self.digests[:drop]  # every process that answered has these
+                self.digest_base += drop
+
+    def _finish(self, url, links):
+        for scraped_url in links:
+            self.frontier.add_url(scraped_url)
+        self.frontier.mark_url_complete(url)
+
+    def close(self, timeout=None):
+        # everything already queued still gets parsed, for at most `timeout`
+        # seconds (crawler/shutdown.py), what's left after that is dropped
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        with self.cond:
+            while self.outstanding:
+                remaining = None if deadline is None else deadline - time.perf_counter()
+                if remaining is not None and remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+            drained = not self.outstanding
+        if drained:
+            self.queue.put(None)
+            self.dispatcher.join()
+            self.executor.shutdown(wait=True)
+        else:
+            self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,142 @@
+import time
+from threading import Lock
+
+from utils.metrics import metrics
+
+# Per host politeness that follows how the host is doing, instead of one fixed
+# POLITENESS for everybody. Every download feeds observe() with its latency and
+# status; the scheduler then asks delay() how long the host rests before its
+# next url.
+#  - healthy host (EWMA error rate under ERROR_TOLERANCE): its pace shrinks by
+#    SHRINK per page down to the floor, but not below the host's EWMA latency
+#    (a host that takes 0.3s to answer waits 0.3s, so we never keep more than
+#    about half of its time busy). Healthy hosts are never slower than
+#    POLITENESS. A host that errs more often keeps its pace.
+#  - error (5xx, 6xx from the cache server, 429, or no response at all): on top
+#    of the pace, exponential backoff, BACKOFF_START doubling with every error
+#    in a row, up to the ceiling. One good page ends the backoff.
+#  - `circuit_errors` errors in a row: the circuit opens and the host gets
+#    nothing for `circuit_secs` (doubling every time it trips again). After that
+#    one url goes through as a probe, a success closes the circuit. A host whose
+#    circuit trips MAX_TRIPS times in a row is given up on for this run (the
+#    frontier drops its queue, the urls stay in the save file for a restart).
+# With adaptive=False (RATECONTROL = fixed) delay() is always POLITENESS, like before.
+# Either way a host's robots.txt Crawl-delay (crawler/robots.py) is its minimum.
+
+EWMA_ALPHA = 0.2  # weight of the newest sample
+SHRINK = 0.9
+GROW = 2.0
+LATENCY_FACTOR = 1.0  # pace >= this * EWMA latency (up to POLITENESS)
+ERROR_STATUSES = (429,)
+BACKOFF_START = 1.0  # the first backoff waits at least this long
+ERROR_TOLERANCE = 0.1
+MAX_TRIPS = 5
+
+
+def is_error(status):
+    return not status or status >= 500 or status in ERROR_STATUSES  # 0: timed out (async)
+
+
+class HostState(object):
+    __slots__ = ("latency", "error_rate", "pace", "delay", "errors_in_row", "trips", "open_until", "pages")
+
+    def __init__(self, delay):
+        self.latency = None
+        self.error_rate = 0.0
+        self.pace = delay  # delay without the backoff
+        self.delay = delay
+        self.errors_in_row = 0
+        self.trips = 0
+        self.open_until = 0.0
+        self.pages = 0
+
+
+class RateController(object):
+    def __init__(self, delay, floor=None, ceiling=60.0, circuit_errors=5, circuit_secs=300.0, adaptive=True):
+        self.base = delay  # POLITENESS, where every host starts
+        self.floor = delay if floor is None else min(floor, delay)  # never slower than POLITENESS when healthy
+        self.ceiling = max(ceiling, self.base)
+        self.circuit_errors = circuit_errors
+        self.circuit_secs = circuit_secs
+        self.adaptive = adaptive
+        self.hosts = {}
+        self.min_delays = {}  # host -> Crawl-delay from its robots.txt
+        self.lock = Lock()
+        self.trips = metrics.counter("circuit_trips_total", "times a host's circuit opened", label="host")
+        metrics.gauge("host_delay_seconds", "current politeness delay per host",
+                      lambda: self._column("delay"), label="host")
+        metrics.gauge("host_latency_seconds", "EWMA download latency per host",
+                      lambda: self._column("latency"), label="host")
+        metrics.gauge("host_pages", "pages downloaded per host",
+                      lambda: self._column("pages"), label="host")
+        metrics.gauge("host_error_rate", "EWMA share of failed downloads per host",
+                      lambda: self._column("error_rate"), label="host")
+        metrics.gauge("open_circuits", "hosts getting no requests right now", self.open_hosts)
+        metrics.gauge("given_up_hosts", "hosts dropped after MAX_TRIPS trips",
+                      lambda: sum(state.trips >= MAX_TRIPS for state in list(self.hosts.values())))
+
+    def _state(self, host):
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = HostState(self.base)
+        return state
+
+    def observe(self, host, seconds, status):
+        ''' One finished download: `seconds` it took and its status (None if
+        there was no response at all). '''
+        error = is_error(status)
+        with self.lock:
+            state = self._state(host)
+            state.pages += 1
+            state.latency = seconds if state.latency is None else (
+                EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * state.latency)
+            state.error_rate = EWMA_ALPHA * error + (1 - EWMA_ALPHA) * state.error_rate
+            if not self.adaptive:
+                return
+            if state.error_rate < ERROR_TOLERANCE:
+                state.pace = max(self.floor, state.pace * SHRINK,
+                                 min(self.base, LATENCY_FACTOR * state.latency))
+            if error:
+                state.errors_in_row += 1
+                state.delay = min(self.ceiling, max(state.pace, BACKOFF_START) * GROW ** (state.errors_in_row - 1))
+                if state.errors_in_row >= self.circuit_errors:
+                    # open (again, after a failed probe): longer every time
+                    state.trips += 1
+                    state.open_until = time.time() + self.circuit_secs * GROW ** (state.trips - 1)
+                    state.errors_in_row = self.circuit_errors - 1  # one more error re-opens it
+                    self.trips.inc(label_value=host)
+            else:
+                state.errors_in_row = 0
+                state.trips = 0
+                state.open_until = 0.0
+                state.delay = min(self.ceiling, state.pace)
+
+    def set_min_delay(self, host, seconds):
+        ''' The host asked for at least `seconds` between requests (robots.txt
+        Crawl-delay), up to the ceiling. '''
+        with self.lock:
+            self.min_delays[host] = min(seconds, self.ceiling)
+
+    def delay(self, host):
+        ''' Seconds before the host's next url may be fetched. '''
+        with self.lock:
+            least = self.min_delays.get(host, 0.0)
+            state = self.hosts.get(host)
+            if not self.adaptive or state is None:
+                return max(self.base, least)
+            return max(state.delay, least, state.open_until - time.time())
+
+    def given_up(self, host):
+        with self.lock:
+            state = self.hosts.get(host)
+            return state is not None and state.trips >= MAX_TRIPS
+
+    def open_hosts(self):
+        now = time.time()
+        with self.lock:
+            return sum(1 for state in self.hosts.values() if state.open_until > now)
+
+    def _column(self, name):
+        with self.lock:
+            return {host: getattr(state, name) for host, state in self.hosts.items()
+                    if getattr(state, name) is not None}
@@ -0,0 +1,225 @@
+import gzip
+import time
+from io import BytesIO
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+from xml.etree import ElementTree
+
+from utils import get_logger
+from utils.download import download
+from utils.metrics import metrics
+
+# robots.txt and sitemaps, without ever making a worker wait on them (the old
+# can_fetch in scraper.py blocked on rp.read() and the crawl stalled).
+#  - the first time a host shows up its robots.txt is fetched on a small
+#    thread pool, through the cache server like any page (utils/download.py)
+#  - allowed(url) only looks at the parsed rules in memory: True / False, or
+#    None while the host's robots.txt is still on its way (the frontier holds
+#    the host back a moment and tries again)
+#  - rules are kept for `ttl` seconds in an LRU of at most `cache_size` hosts,
+#    a host that fell out is simply fetched again
+#  - a 4xx (no robots.txt) allows everything. No answer at all (5xx, 6xx from
+#    the cache server) allows everything too but is tried again after ERROR_TTL,
+#    a broken robots.txt shouldn't stop a host for the whole day
+#  - Crawl-delay (fractions too) goes to on_crawl_delay(host, seconds), the
+#    frontier hands it to the rate controller as the host's minimum delay
+#  - the Sitemap: lines are read (sitemap indexes one level down) and up to
+#    `sitemap_urls` urls per host go to on_urls(urls) in one batch
+#  - every robots.txt and sitemap fetch waits its turn with the host's pages:
+#    claim(url) before it (the frontier's HostScheduler.claim, one fetch per
+#    host at a time and after its delay) and done(url) after, which gives the
+#    host its politeness delay, Crawl-delay included
+
+ERROR_TTL = 600.0
+MAX_SITEMAPS = 10  # sitemap files read per host, index entries included
+MAX_ROBOTS_SIZE = 512 * 1024  # more than this of robots.txt is ignored, like Google does
+MAX_SITEMAP_SIZE = 50 * 1024 * 1024  # the sitemaps.org limit, also for a gzipped one unpacked
+
+
+def crawl_delay(lines, agent):
+    ''' Crawl-delay for `agent` (or *) in robots.txt lines. RobotFileParser only
+    takes whole seconds, plenty of sites ask for 0.5. '''
+    token = agent.split("/")[0].split()[0].lower() if agent.strip() else "*"
+    delays = {}
+    agents, in_rules = [], False
+    for line in lines:
+        key, _, value = line.split("#", 1)[0].partition(":")
+        key, value = key.strip().lower(), value.strip()
+        if key == "user-agent":
+            if in_rules:
+                agents, in_rules = [], False  # a new group
+            agents.append(value.lower())
+        elif key:
+            in_rules = True
+            if key == "crawl-delay":
+                try:
+                    for name in agents:
+                        delays.setdefault(name, float(value))
+                except ValueError:
+                    pass
+    for name, delay in delays.items():
+        if name != "*" and name in token:
+            return delay
+    return delays.get("*")
+
+
+def _tag(element):
+    return element.tag.rsplit("}", 1)[-1]  # without the namespace, not every sitemap has it
+
+
+class RobotsService(object):
+    def __init__(self, config, on_urls=None, on_crawl_delay=None, is_valid=None, cache_size=5000,
+                 ttl=86400.0, fetchers=2, sitemap_urls=5000, hold=None, release=None,
+                 claim=None, done=None):
+        self.logger = get_logger("ROBOTS")
+        self.config = config
+        self.agent = config.user_agent
+        self.on_urls = on_urls
+        self.on_crawl_delay = on_crawl_delay
+        self.is_valid = is_valid
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.sitemap_urls = sitemap_urls
+        # the scheduler counts a pending fetch as work in flight, so the crawl
+        # doesn't end while sitemap urls may still come
+        self.hold = hold
+        self.release = release
+        self.claim = claim
+        self.done = done
+        self.rules = OrderedDict()  # host -> (RobotFileParser or None for allow all, expires)
+        self.pending = set()        # hosts whose robots.txt is being fetched
+        self.sitemaps_read = set()  # hosts whose sitemaps were read, once per run
+        self.lock = Lock()
+        self.closed = False
+        self.executor = ThreadPoolExecutor(max_workers=fetchers, thread_name_prefix="robots")
+        self.blocked = metrics.counter("robots_blocked_total", "urls robots.txt disallowed", label="host")
+        self.fetch_time = metrics.histogram("robots_fetch_seconds", "robots.txt download and parse")
+        self.seeded = metrics.counter("sitemap_urls_total", "urls queued from sitemaps")
+        metrics.gauge("robots_cached_hosts", "hosts with robots.txt rules in memory", lambda: len(self.rules))
+
+    @staticmethod
+    def site_of(url):
+        parsed = urlparse(url)
+        return parsed.scheme or "https", parsed.netloc
+
+    def allowed(self, url):
+        ''' Never blocks. None when the rules aren't here yet (they are on their
+        way after this call). '''
+        scheme, host = self.site_of(url)
+        with self.lock:
+            entry = self.rules.get(host)
+            if entry is not None and entry[1] > time.time():
+                self.rules.move_to_end(host)
+                parser = entry[0]
+            else:
+                self._prefetch(scheme, host)
+                return None
+        if parser is None or parser.can_fetch(self.agent, url):
+            return True
+        self.blocked.inc(label_value=host)
+        return False
+
+    def prefetch(self, url):
+        ''' Starts fetching the url's robots.txt unless it's cached or coming. '''
+        scheme, host = self.site_of(url)
+        with self.lock:
+            entry = self.rules.get(host)
+            if entry is None or entry[1] <= time.time():
+                self._prefetch(scheme, host)
+
+    def _prefetch(self, scheme, host):
+        # self.lock is held
+        if host in self.pending or self.closed:
+            return
+        self.pending.add(host)
+        if self.hold:
+            self.hold()
+        self.executor.submit(self._fetch, scheme, host)
+
+    def _download(self, url):
+        # one polite fetch of the host, None if the crawl stopped while waiting
+        if self.claim and not self.claim(url):
+            return None
+        try:
+            return download(url, self.config, self.logger)
+        finally:
+            if self.claim and self.done:
+                self.done(url)
+
+    def _fetch(self, scheme, host):
+        parser, ttl, delay = None, ERROR_TTL, None
+        url = f"{scheme}://{host}/robots.txt"
+        claimed = self.claim is not None and self.claim(url)
+        try:
+            with self.fetch_time.time():
+                if claimed or self.claim is None:  # else the crawl stopped, tried again after ERROR_TTL
+                    resp = download(url, self.config, self.logger)
+                    if resp.status == 200 and resp.content is not None:
+                        parser = RobotFileParser(url)
+                        text = str(resp.content[:MAX_ROBOTS_SIZE], "utf-8", "replace")
+                        lines = text.splitlines()
+                        parser.parse(lines)
+                        delay = crawl_delay(lines, self.agent)
+                        ttl = self.ttl
+                    elif resp.status and 400 <= resp.status < 500:
+                        ttl = self.ttl  # no robots.txt, everything is allowed
+        except Exception:
+            self.logger.exception(f"Failed on robots.txt of {host}.")
+        finally:
+            if delay and self.on_crawl_delay:
+                self.on_crawl_delay(host, delay)  # before the first url can go
+            if claimed and self.done:
+                self.done(url)  # the host's delay from here on follows its Crawl-delay
+        try:
+            with self.lock:
+                self.rules[host] = (parser, time.time() + ttl)
+                self.rules.move_to_end(host)
+                while len(self.rules) > self.cache_size:
+                    self.rules.popitem(last=False)
+                read_sitemaps = parser is not None and host not in self.sitemaps_read
+                if read_sitemaps:
+                    self.sitemaps_read.add(host)
+            if read_sitemaps and self.sitemap_urls and self.on_urls:
+                self._read_sitemaps(host, parser.site_maps() or [])
+        finally:
+            with self.lock:
+                self.pending.discard(host)
+            if self.release:
+                self.release()
+
+    def _read_sitemaps(self, host, sitemaps):
+        urls = []
+        todo = [url for url in sitemaps if self.site_of(url)[1] == host]
+        for _ in range(MAX_SITEMAPS):
+            if not todo or len(urls) >= self.sitemap_urls or self.closed:
+                break
+            try:
+                resp = self._download(todo.pop(0))
+                if resp is None:
+                    break  # the crawl stopped
+                content = resp.content
+                if resp.status != 200 or content is None:
+                    continue
+                if content[:2] == b"\x1f\x8b":
+                    content = gzip.GzipFile(fileobj=BytesIO(content)).read(MAX_SITEMAP_SIZE)
+                root = ElementTree.fromstring(content[:MAX_SITEMAP_SIZE])
+            except Exception:
+                continue  # not there, or not XML
+            locs = [loc.text.strip() for loc in root.iter() if _tag(loc) == "loc" and loc.text]
+            if _tag(root) == "sitemapindex":
+                todo += [url for url in locs if self.site_of(url)[1] == host]
+            else:
+                urls += [url for url in locs if self.is_valid is None or self.is_valid(url)]
+        urls = urls[:self.sitemap_urls]
+        if urls and not self.closed:
+            self.seeded.inc(len(urls))
+            self.logger.info(f"Queued {len(urls)} urls from the sitemaps of {host}.")
+            self.on_urls(urls)
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+        self.executor.shutdown(wait=True, cancel_futures=True)
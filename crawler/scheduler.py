@@ -0,0 +1,262 @@
+import time
+from heapq import heappush, heappop, heapreplace
+from threading import Condition
+from urllib.parse import urlparse
+
+
+class HostScheduler(object):
+    ''' Hands out urls to many workers while keeping politeness per host.
+
+    Every host has its own stack of urls (LIFO, same order the old list gave) and
+    a time before which it must not be hit again. Hosts that have urls and are not
+    being fetched sit in a min-heap keyed on that time, so get() just looks at the
+    top of the heap. A host is busy from get() until done() is called for its url,
+    then it becomes ready again `delay` seconds later. '''
+    def __init__(self, delay):
+        self.delay = delay
+        self.cond = Condition()
+        self.queues = dict()       # host -> list of urls
+        self.ready = list()        # heap of (next allowed time, host)
+        self.next_allowed = dict() # host -> time
+        self.busy = set()          # hosts with a url being fetched
+        self.claiming = set()      # hosts claim() is waiting for
+        self.queued = 0
+        self.in_flight = 0
+        self.stopped = False  # stop(): get() hands out nothing more
+
+    def __len__(self):
+        return self.queued
+
+    @staticmethod
+    def host_of(url):
+        return urlparse(url).netloc
+
+    def put(self, url):
+        host = self.host_of(url)
+        with self.cond:
+            queue = self.queues.get(host)
+            if queue is None:
+                queue = self.queues[host] = list()
+            queue.append(url)
+            self.queued += 1
+            if len(queue) == 1 and host not in self.busy:
+                heappush(self.ready, (self.next_allowed.get(host, 0), host))
+                self.cond.notify()
+
+    def get(self, block=True, timeout=None):
+        ''' Next url whose host may be fetched now. Blocks until one is ready and
+        returns None once nothing is queued and no url is in flight (or when
+        block is False / the timeout runs out first). '''
+        deadline = None if timeout is None else time.time() + timeout
+        with self.cond:
+            while True:
+                if self.stopped:
+                    return None
+                wait = None
+                if self.ready:
+                    ready_at, host = self.ready[0]
+                    now = time.time()
+                    if ready_at <= now:
+                        heappop(self.ready)
+                        queue = self.queues.get(host)
+                        if queue is None or host in self.busy or host in self.claiming:
+                            continue  # dropped by drop_host (and maybe queued again) or claimed
+                        url = queue.pop()
+                        if not queue:
+                            del self.queues[host]
+                        self.queued -= 1
+                        self.busy.add(host)
+                        self.in_flight += 1
+                        return url
+                    wait = ready_at - now
+                elif not self.in_flight:
+                    # nothing left and nobody is going to add more
+                    return None
+                if not block:
+                    return None
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return None
+                    wait = remaining if wait is None else min(wait, remaining)
+                self.cond.wait(wait)
+
+    def done(self, url, delay=None):
+        ''' The url handed out by get() is finished, its host can go again after
+        `delay` (config politeness by default). '''
+        host = self.host_of(url)
+        with self.cond:
+            if host not in self.busy:
+                return
+            self.busy.discard(host)
+            self.in_flight -= 1
+            self.next_allowed[host] = time.time() + (self.delay if delay is None else delay)
+            if host in self.queues:
+                heappush(self.ready, (self.next_allowed[host], host))
+            self.cond.notify_all()
+
+    def claim(self, url):
+        ''' Makes the url's host busy for a fetch that isn't one of its queued
+        urls (robots.txt, a sitemap): waits until no url of the host is out and
+        its delay has passed, like get() would. done(url, delay) lets the host
+        go again. False when the scheduler was stopped first. '''
+        host = self.host_of(url)
+        with self.cond:
+            self.claiming.add(host)  # get() leaves the host alone meanwhile
+            try:
+                while not self.stopped:
+                    wait = self.next_allowed.get(host, 0) - time.time()
+                    if host not in self.busy and wait <= 0:
+                        self.busy.add(host)
+                        self.in_flight += 1
+                        return True
+                    self.cond.wait(wait if wait > 0 else None)
+                return False
+            finally:
+                self.claiming.discard(host)
+
+    def drop_host(self, host):
+        ''' Forgets the urls queued for a host, returns them. '''
+        with self.cond:
+            queue = self.queues.pop(host, [])
+            self.queued -= len(queue)
+            self.cond.notify_all()
+            return queue
+
+    def stop(self):
+        ''' The crawl is stopping: get() returns None from now on, to the
+        workers waiting in it too. put() and done() still work. '''
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+
+    def hold(self):
+        ''' Work outside the queues that may still put() urls (a sitemap being
+        read) counts as in flight, get() doesn't return None before release(). '''
+        with self.cond:
+            self.in_flight += 1
+
+    def release(self):
+        with self.cond:
+            self.in_flight -= 1
+            self.cond.notify_all()
+
+    def pending(self):
+        ''' (urls queued, urls in flight + holds) '''
+        with self.cond:
+            return self.queued, self.in_flight
+
+    def finished(self):
+        with self.cond:
+            return not self.queued and not self.in_flight
+
+    def host_sizes(self):
+        with self.cond:
+            return {host: len(queue) for host, queue in self.queues.items()}
+
+
+RESCORE_TRIES = 8  # urls re-scored per get() before the best one so far is taken
+RESCORE_MARGIN = 0.5  # a url only goes back when it got this much worse than the next one
+
+
+class PriorityHostScheduler(HostScheduler):
+    ''' Same politeness as HostScheduler, but urls come out best score first
+    (lowest `score(url)`, see crawler/scoring.py) instead of LIFO.
+
+    Every host's queue is a heap of (score, seq, url), ties going to the older
+    url. Among the hosts that may be fetched right now the one with the best head
+    goes first: hosts move from the time heap to `now_ready`, a heap of (head
+    score, seq, host). When put() gives a waiting host a better head the host
+    is pushed again, the old entry goes stale and is skipped when it comes up.
+    Scores are from when the url was queued, so the head is scored again on
+    its way out and goes back in if it got worse (its prefix turned out to be
+    a trap) and something else in the host is now better. All of it is
+    O(log n) per put and get. '''
+    def __init__(self, delay, score):
+        super().__init__(delay)
+        self.score = score
+        self.now_ready = list()  # heap of (head score, head seq, host)
+        self.waiting = set()     # hosts in now_ready
+        self.seq = 0
+
+    def put(self, url):
+        host = self.host_of(url)
+        score = self.score(url)
+        with self.cond:
+            self.seq += 1
+            entry = (score, self.seq, url)
+            queue = self.queues.get(host)
+            if queue is None:
+                queue = self.queues[host] = list()
+            heappush(queue, entry)
+            self.queued += 1
+            if host in self.busy:
+                return
+            if len(queue) == 1 and host not in self.waiting:
+                heappush(self.ready, (self.next_allowed.get(host, 0), host))
+                self.cond.notify()
+            elif host in self.waiting and queue[0] is entry:
+                heappush(self.now_ready, (score, self.seq, host))
+
+    def _take(self, queue):
+        # the head, scored again, or the next one if the head got worse
+        for _ in range(RESCORE_TRIES):
+            score, seq, url = queue[0]
+            fresh = self.score(url)
+            if fresh <= score + RESCORE_MARGIN or len(queue) == 1:
+                break
+            runner_up = queue[1][0] if len(queue) == 2 else min(queue[1][0], queue[2][0])
+            if fresh <= runner_up + RESCORE_MARGIN:
+                break
+            heapreplace(queue, (fresh, seq, url))
+        return heappop(queue)[2]
+
+    def get(self, block=True, timeout=None):
+        ''' Best url among the hosts that may be fetched now. Blocks and returns
+        None the same way as HostScheduler.get(). '''
+        deadline = None if timeout is None else time.time() + timeout
+        with self.cond:
+            while True:
+                if self.stopped:
+                    return None
+                wait = None
+                now = time.time()
+                while self.ready and self.ready[0][0] <= now:
+                    _, host = heappop(self.ready)
+                    queue = self.queues.get(host)
+                    if queue is None or host in self.waiting or host in self.busy or host in self.claiming:
+                        continue  # dropped by drop_host (and maybe queued again) or claimed
+                    self.waiting.add(host)
+                    heappush(self.now_ready, (queue[0][0], queue[0][1], host))
+                while self.now_ready:
+                    score, seq, host = heappop(self.now_ready)
+                    queue = self.queues.get(host)
+                    if host not in self.waiting or queue is None or queue[0][1] != seq:
+                        continue  # stale, the host has a newer entry
+                    self.waiting.discard(host)
+                    if host in self.busy:
+                        continue  # claimed while it waited, done() puts it back
+                    url = self._take(queue)
+                    if not queue:
+                        del self.queues[host]
+                    self.queued -= 1
+                    self.busy.add(host)
+                    self.in_flight += 1
+                    return url
+                if self.ready:
+                    wait = self.ready[0][0] - now
+                elif not self.in_flight:
+                    return None
+                if not block:
+                    return None
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return None
+                    wait = remaining if wait is None else min(wait, remaining)
+                self.cond.wait(wait)
+
+    def drop_host(self, host):
+        with self.cond:
+            self.waiting.discard(host)
+            return [url for _, _, url in super().drop_host(host)]
@@ -0,0 +1,85 @@
+from threading import Lock
+
+# Url scores for FRONTIERORDER = priority (crawler/scheduler.py
+# PriorityHostScheduler). Lower goes first. A score is made from the url alone
+# plus what the crawl has learned so far:
+#   - path depth and query parameter count: deep and parameter heavy urls are
+#     where traps (archives, facets, relative link loops) live
+#   - new hosts: a host nothing has been fetched from yet goes first, so new
+#     subdomains are found early
+#   - the path prefix's bad rate: the share of pages under the same host and
+#     first path segment that were duplicates, low content, traps or errors
+# The scraper tells the scorer how every page turned out through
+# scraper.page_outcomes. Other orders can be added to SCORERS.
+
+DEPTH_WEIGHT = 1.0
+QUERY_WEIGHT = 2.0
+BAD_WEIGHT = 8.0
+NEW_HOST_BONUS = 5.0
+# prior for the bad rate of a prefix nothing is known about yet, as if
+# PRIOR_PAGES pages had been seen with PRIOR_BAD of them bad
+PRIOR_BAD = 1.0
+PRIOR_PAGES = 4.0
+GOOD_OUTCOMES = frozenset(["unique"])
+NEUTRAL_OUTCOMES = frozenset(["redirect"])
+
+
+def split(url):
+    ''' (host, path, query) of a normalized absolute url, cheaper than urlsplit
+    for something called on every link. '''
+    start = url.find("//") + 2
+    end = len(url)
+    for mark in "?#":
+        found = url.find(mark, start)
+        if found != -1 and found < end:
+            end = found
+    query = url[end + 1:].split("#", 1)[0] if end < len(url) and url[end] == "?" else ""
+    slash = url.find("/", start, end)
+    if slash == -1:
+        return url[start:end], "", query
+    return url[start:slash], url[slash:end], query
+
+
+def prefix_of(host, path):
+    ''' host + first path segment, e.g. www.ics.uci.edu/events '''
+    start = 1 if path.startswith("/") else 0
+    end = path.find("/", start)
+    return host + "/" + (path[start:] if end == -1 else path[start:end])
+
+
+class UrlScorer(object):
+    def __init__(self):
+        self.prefixes = {}  # prefix -> [bad pages, pages]
+        self.host_pages = {}  # host -> pages fetched
+        self.lock = Lock()
+
+    def score(self, url):
+        host, path, query = split(url)
+        depth = path.count("/") - path.endswith("/")
+        params = query.count("&") + 1 if query else 0
+        bad, pages = self.prefixes.get(prefix_of(host, path), (0, 0))
+        bad_rate = (bad + PRIOR_BAD) / (pages + PRIOR_PAGES)
+        score = DEPTH_WEIGHT * depth + QUERY_WEIGHT * params + BAD_WEIGHT * bad_rate
+        if not self.host_pages.get(host):
+            score -= NEW_HOST_BONUS
+        return score
+
+    def record(self, url, outcome):
+        ''' How a fetched page turned out: "unique", "duplicate", "low_content",
+        "trap", "gated", "redirect" or "error". '''
+        if outcome in NEUTRAL_OUTCOMES:
+            return
+        host, path, _ = split(url)
+        prefix = prefix_of(host, path)
+        with self.lock:
+            stats = self.prefixes.get(prefix)
+            if stats is None:
+                stats = self.prefixes[prefix] = [0, 0]
+            stats[0] += outcome not in GOOD_OUTCOMES
+            stats[1] += 1
+            self.host_pages[host] = self.host_pages.get(host, 0) + 1
+
+
+SCORERS = {
+    "priority": UrlScorer,
+}
@@ -0,0 +1,325 @@
+import os
+import time
+import bisect
+import signal
+import hashlib
+import multiprocessing
+from threading import Thread, Condition
+from multiprocessing.connection import Listener, Client
+from urllib.parse import urlparse
+
+import scraper
+from crawler import Crawler
+from crawler.shutdown import ShutdownController
+from utils import get_logger
+from utils.seen_set import SeenSet
+from utils.metrics import metrics
+from utils.page_store import PageStore
+
+# launch.py --shards N: N crawler processes on one box, each owning the hosts a
+# consistent hash ring gives it (urlparse(url).netloc, so politeness per host
+# stays inside one process). Every shard has its own directory under
+# shard_dir with its own save file, crawl log, page store and Logs/.
+#  - Frontier.add_url and add_urls (sitemaps) keep the urls of their own hosts
+#    and hand the rest to ShardNode.forward(). They are batched per shard and
+#    sent over a unix socket (multiprocessing.connection) by a sender thread,
+#    the receiving shard puts them in its frontier with add_urls
+#  - each shard holds its scheduler open, so its workers wait for urls from
+#    other shards instead of quitting when their own queue runs dry
+#  - the parent asks every shard for (idle, sent, received) a few times a
+#    second. When all shards are idle and as many urls were received as sent,
+#    twice in a row with the same counts, nothing can be in flight anywhere
+#    and every shard is told to stop. A shard stopped by its own budget
+#    (MAXPAGES...) counts as idle once its pages in flight are done
+#  - Ctrl-C / SIGTERM go to the parent's ShutdownController (the shards ignore
+#    SIGINT, a terminal sends it to all of them): every shard is told to stop
+#    with the reason, drains and flushes like a single process crawl does, and
+#    a second Ctrl-C tells them to stop waiting for the pages in flight
+#  - afterwards report.py merges the shards' crawl logs into one report
+
+VNODES = 64  # points per shard on the ring
+BATCH = 500  # urls per message
+FLUSH_SECS = 0.2  # a partial batch waits at most this long
+STATUS_SECS = 0.25
+
+
+class HashRing(object):
+    ''' Consistent hashing of hosts to shards. Going from N to N+1 shards moves
+    about 1/(N+1) of the hosts. '''
+    def __init__(self, shards, vnodes=VNODES):
+        self.shards = shards
+        points = sorted((self._hash(f"shard-{shard}#{vnode}"), shard)
+                        for shard in range(shards) for vnode in range(vnodes))
+        self.points = [point for point, _ in points]
+        self.owners = [shard for _, shard in points]
+        self.hosts = {}  # host -> shard, hosts are few and looked up for every link
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+    def shard_of_host(self, host):
+        shard = self.hosts.get(host)
+        if shard is None:
+            i = bisect.bisect(self.points, self._hash(host)) % len(self.points)
+            shard = self.hosts[host] = self.owners[i]
+        return shard
+
+    def shard_of(self, url):
+        return self.shard_of_host(urlparse(url).netloc)
+
+
+def socket_path(shard_dir, shard):
+    return os.path.abspath(os.path.join(shard_dir, f"shard-{shard}.sock"))
+
+
+class ShardNode(object):
+    ''' One shard's end of the url exchange. attach() it to the frontier, which
+    then calls owns() / forward() for the urls it finds. '''
+    def __init__(self, index, shards, shard_dir, authkey, batch=BATCH, flush_secs=FLUSH_SECS):
+        self.logger = get_logger(f"SHARD-{index}")
+        self.index = index
+        self.ring = HashRing(shards)
+        self.addresses = [socket_path(shard_dir, shard) for shard in range(shards)]
+        self.authkey = authkey
+        self.batch = batch
+        self.flush_secs = flush_secs
+        self.outboxes = [[] for _ in range(shards)]
+        self.forwarded = SeenSet()  # every url goes to its shard once
+        self.clients = [None] * shards
+        self.cond = Condition()
+        self.sent = 0      # urls handed to a socket
+        self.received = 0  # urls from other shards already in the frontier
+        self.receiving = 0  # messages being added right now
+        self.sending = False  # a flush taken out of the outboxes, not counted in sent yet
+        self.stopping = False
+        self.frontier = None
+        self.forwarded_total = metrics.counter("shard_urls_forwarded_total", "urls sent to other shards", label="shard")
+        self.received_total = metrics.counter("shard_urls_received_total", "urls from other shards")
+        if os.path.exists(self.addresses[index]):
+            os.remove(self.addresses[index])  # left from a run that was killed
+        self.listener = Listener(self.addresses[index], family="AF_UNIX", authkey=authkey)
+        self.threads = [Thread(target=self._accept, daemon=True), Thread(target=self._send, daemon=True)]
+        for thread in self.threads:
+            thread.start()
+
+    def attach(self, frontier):
+        frontier.to_be_downloaded.hold()  # released by stop()
+        with self.cond:
+            self.frontier = frontier
+            self.cond.notify_all()
+
+    def owns(self, url):
+        return self.ring.shard_of(url) == self.index
+
+    def forward(self, url):
+        shard = self.ring.shard_of(url)
+        with self.cond:
+            if not self.forwarded.add(url):
+                return
+            outbox = self.outboxes[shard]
+            outbox.append(url)
+            if len(outbox) >= self.batch:
+                self.cond.notify()
+
+    def _send(self):
+        while True:
+            with self.cond:
+                if self.stopping:
+                    return
+                self.cond.wait(self.flush_secs)
+                batches = [(shard, outbox) for shard, outbox in enumerate(self.outboxes) if outbox]
+                for shard, _ in batches:
+                    self.outboxes[shard] = []
+                self.sending = bool(batches)
+            for shard, urls in batches:
+                done = 0  # urls in the batches that went out
+                try:
+                    if self.clients[shard] is None:
+                        self.clients[shard] = Client(self.addresses[shard], family="AF_UNIX", authkey=self.authkey)
+                    for start in range(0, len(urls), self.batch):
+                        self.clients[shard].send(urls[start:start + self.batch])
+                        done = min(start + self.batch, len(urls))
+                except OSError:
+                    # not listening yet (or gone), the rest goes again with the
+                    # next flush. Not the batches that got there, the other
+                    # shard would count them twice and sent == received never holds
+                    self.clients[shard] = None
+                    with self.cond:
+                        self.outboxes[shard][:0] = urls[done:]
+                with self.cond:
+                    self.sent += done
+                if done:
+                    self.forwarded_total.inc(done, label_value=str(shard))
+            with self.cond:
+                self.sending = False
+
+    def _accept(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                return  # closed
+            Thread(target=self._receive, args=(conn,), daemon=True).start()
+
+    def _receive(self, conn):
+        while True:
+            try:
+                urls = conn.recv()
+            except (EOFError, OSError):
+                return
+            with self.cond:
+                while self.frontier is None:
+                    self.cond.wait()  # other shards can be quicker than our frontier
+                self.receiving += 1
+            try:
+                self.frontier.add_urls(urls)
+            finally:
+                with self.cond:
+                    self.receiving -= 1
+                    self.received += len(urls)
+            self.received_total.inc(len(urls))
+
+    def status(self):
+        ''' (idle, sent, received). Idle: nothing queued or being fetched here
+        (only the hold from attach()) and nothing waiting to be sent. '''
+        scheduler = self.frontier.to_be_downloaded
+        queued, in_flight = scheduler.pending()
+        with self.cond:
+            # stopped by a budget, what's queued stays for the next run
+            idle = ((not queued or scheduler.stopped) and in_flight == 1 and not self.receiving
+                    and not self.sending and not any(self.outboxes))
+            return idle, self.sent, self.received
+
+    def stop(self):
+        # lets the workers finish once their queue is empty
+        self.frontier.to_be_downloaded.release()
+
+    def close(self):
+        with self.cond:
+            self.stopping = True
+            self.cond.notify_all()
+        self.threads[1].join()
+        for client in self.clients:
+            if client is not None:
+                client.close()
+        self.listener.close()
+
+
+class _StopRequest(object):
+    ''' What the parent's ShutdownController stops: a flag the status loop looks
+    at, the pipes to the shards are only used from that loop. '''
+    def __init__(self):
+        self.requested = False
+
+    def stop(self):
+        self.requested = True
+
+
+def _wait_for_force(control, crawler):
+    # a second Ctrl-C at the parent, stop waiting for the pages in flight
+    try:
+        if control.recv() == "force":
+            crawler.shutdown.forced.set()
+    except (EOFError, OSError):
+        pass
+
+
+def run_shard(config, index, shards, shard_dir, authkey, restart, control):
+    ''' One shard process: a whole Crawler in its own directory, answering the
+    parent's "status" and ("stop", reason) over `control`. '''
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the parent stops the shards
+    directory = os.path.join(shard_dir, f"shard-{index}")
+    os.makedirs(directory, exist_ok=True)
+    node = ShardNode(index, shards, shard_dir, authkey)
+    os.chdir(directory)
+    if config.metrics_port:
+        config.metrics_port += index
+    scraper.configure_log(config.checkpoint_pages, config.checkpoint_secs, fresh=restart)
+    if not restart:
+        scraper.load_log()
+    if config.page_store:
+        scraper.page_store = PageStore(config.page_store, config.page_store_compress, fresh=restart)
+    config.shard = node
+    crawler = Crawler(config, restart)
+    crawler.start_async()
+    while True:
+        message = control.recv()
+        if message == "status":
+            control.send(node.status())
+        else:
+            _, reason = message  # None when every shard ran dry
+            if reason:
+                crawler.stop(reason)
+                Thread(target=_wait_for_force, args=(control, crawler), daemon=True).start()
+            node.stop()
+            break
+    crawler.join()  # flushes the crawl log too, everything is in it for the merge
+    node.close()
+    if scraper.page_store:
+        scraper.page_store.close()
+    with open("report.txt", "w") as file:
+        file.write(scraper.get_report())
+    control.send(("done", sum(scraper.subdomains.values()), crawler.shutdown.stats["lost"]))
+
+
+def crawl_sharded(config, shards, restart, shard_dir="shards"):
+    ''' Runs `shards` shard processes until none has anything left to do,
+    returns the crawl log of every shard. '''
+    logger = get_logger("SHARDS")
+    os.makedirs(shard_dir, exist_ok=True)
+    # Ctrl-C / SIGTERM, from before the shards start so none of them misses it
+    stop_request = _StopRequest()
+    shutdown = ShutdownController(stop_request)
+    shutdown.install_signals()
+    authkey = os.urandom(16)
+    context = multiprocessing.get_context("spawn")
+    controls = []
+    processes = []
+    for index in range(shards):
+        parent, child = context.Pipe()
+        process = context.Process(target=run_shard, args=(
+            config, index, shards, shard_dir, authkey, restart, child))
+        process.start()
+        controls.append(parent)
+        processes.append(process)
+    previous = None
+    counts = (0, 0)
+    while not stop_request.requested:
+        time.sleep(STATUS_SECS)
+        for control in controls:
+            control.send("status")
+        statuses = [control.recv() for control in controls]
+        counts = (sum(sent for _, sent, _ in statuses), sum(received for _, _, received in statuses))
+        if all(idle for idle, _, _ in statuses) and counts[0] == counts[1]:
+            if counts == previous:
+                break  # same counts two rounds running, nothing was in between
+            previous = counts
+        else:
+            previous = None
+    for control in controls:
+        control.send(("stop", shutdown.reason))
+    forced = False
+    lost = 0
+    for index, (control, process) in enumerate(zip(controls, processes)):
+        while not control.poll(STATUS_SECS):
+            if shutdown.forced.is_set() and not forced:
+                forced = True
+                for other in controls:
+                    try:
+                        other.send("force")
+                    except OSError:
+                        pass  # that shard is already done
+        _, pages, shard_lost = control.recv()
+        lost += shard_lost
+        process.join()
+        logger.info(f"Shard {index} done, {pages} unique pages.")
+    if shutdown.reason is not None:
+        latency = time.perf_counter() - shutdown.requested
+        shutdown.latency.set(latency)
+        shutdown.lost.set(lost)
+        logger.info(f"Shards stopped ({shutdown.reason}), shutdown took {latency:.2f}s, "
+                    f"{lost} pages in flight were lost (downloaded again next run).")
+    shutdown.restore_signals()
+    logger.info(f"{counts[0]} urls went between shards.")
+    return [os.path.join(shard_dir, f"shard-{index}", scraper.LOG_FILE) for index in range(shards)]
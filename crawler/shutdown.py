@@ -0,0 +1,142 @@
+import time
+import signal
+from threading import Event, Lock, Timer, current_thread, main_thread
+
+import scraper
+from utils import get_logger
+from utils.metrics import metrics
+
+# How a crawl ends, whatever ends it: the frontier running dry, Ctrl-C /
+# SIGTERM, or the budget in config.ini (MAXSECONDS, MAXPAGES, MAXBYTES).
+#  - stop(reason) makes the frontier hand out no more urls; a worker waiting
+#    for one gets None, the others finish the page they have (scraped, links
+#    saved, marked complete) and exit. Idle workers only ever exit early like
+#    that: otherwise the scheduler keeps them waiting while any url is in
+#    flight, since its page can still add urls
+#  - drain() waits for that at most DRAINSECONDS after the stop, a second
+#    Ctrl-C cuts it short (a third one kills the process like it used to).
+#    Pages still in flight then are the lost work: their urls stay pending in
+#    the save file and are downloaded again by the next run
+#  - flush() then writes everything once: the frontier's last batch and the
+#    crawl log's buffered records. The summary (why it stopped, how long the
+#    shutdown took, pages lost) goes to Logs/SHUTDOWN.log and the metrics, and
+#    launch.py writes report.txt
+
+STOP_SIGNALS = (signal.SIGINT, signal.SIGTERM)
+JOIN_SECS = 0.2  # workers are joined in short steps so a signal handler gets to run
+
+
+class ShutdownController(object):
+    def __init__(self, frontier, max_seconds=0, max_pages=0, max_bytes=0, drain_secs=30.0):
+        self.logger = get_logger("SHUTDOWN")
+        self.frontier = frontier
+        self.max_seconds = max_seconds
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+        self.drain_secs = drain_secs
+        self.lock = Lock()
+        self.reason = None     # why the crawl stopped
+        self.requested = None  # perf_counter() of the stop
+        self.forced = Event()  # second signal, don't wait for the drain
+        self.pages = 0
+        self.bytes = 0
+        self.timer = None
+        self.previous = {}     # signal -> the handler before ours
+        self.stats = {}
+        self.stops = metrics.counter("shutdown_total", "crawl stops", label="reason")
+        self.latency = metrics.gauge("shutdown_seconds", "from the stop to the end of the final flush")
+        self.lost = metrics.gauge("shutdown_lost_pages", "pages in flight the drain gave up on")
+
+    def start(self):
+        # the time budget counts from here
+        if self.max_seconds:
+            self.timer = Timer(self.max_seconds, self.stop, (f"time budget of {self.max_seconds:g}s",))
+            self.timer.daemon = True
+            self.timer.start()
+
+    def install_signals(self):
+        ''' Ctrl-C / SIGTERM stop the crawl instead of killing it. Only works from
+        the main thread, does nothing elsewhere. '''
+        if current_thread() is not main_thread():
+            return
+        for signum in STOP_SIGNALS:
+            self.previous[signum] = signal.signal(signum, self._on_signal)
+
+    def restore_signals(self):
+        ''' The handlers from before install_signals() back. '''
+        for signum, handler in self.previous.items():
+            signal.signal(signum, handler)
+        self.previous = {}
+
+    def _on_signal(self, signum, frame):
+        if self.reason is None:
+            self.stop(signal.Signals(signum).name)
+        else:
+            self.logger.warning("Not waiting for the pages in flight, saving what's done.")
+            self.forced.set()
+            self.restore_signals()
+
+    def count(self, size):
+        ''' One page downloaded, `size` bytes of it. '''
+        with self.lock:
+            self.pages += 1
+            self.bytes += size
+            pages, size = self.pages, self.bytes
+        if self.max_pages and pages >= self.max_pages:
+            self.stop(f"page budget of {self.max_pages}")
+        elif self.max_bytes and size >= self.max_bytes:
+            self.stop(f"byte budget of {self.max_bytes}")
+
+    def stop(self, reason):
+        with self.lock:
+            if self.reason is not None:
+                return
+            self.reason = reason
+            self.requested = time.perf_counter()
+        self.stops.inc(label_value=reason.split(" ")[0])
+        self.logger.info(f"Stopping ({reason}), finishing the pages in flight.")
+        self.frontier.stop()
+
+    def _cut_short(self):
+        return self.reason is not None and (
+            self.forced.is_set() or time.perf_counter() - self.requested >= self.drain_secs)
+
+    def drain(self, workers, pipeline=None):
+        ''' Waits for the workers, then the parse pipeline, to finish. Gives up
+        DRAINSECONDS after a stop. '''
+        while not self._cut_short():
+            alive = [worker for worker in workers if worker.is_alive()]
+            if not alive:
+                break
+            alive[0].join(JOIN_SECS)
+        if pipeline:
+            remaining = None
+            if self.reason is not None:
+                remaining = 0 if self.forced.is_set() else max(0, self.drain_secs - (time.perf_counter() - self.requested))
+            pipeline.close(remaining)
+        if self.reason is None:
+            self.reason = "frontier empty"
+            self.requested = time.perf_counter()
+        self.stats["drain"] = time.perf_counter() - self.requested
+        self.stats["lost"] = self.frontier.in_progress
+        self.stats["queued"] = len(self.frontier.to_be_downloaded)
+
+    def flush(self):
+        ''' Everything to disk in one go, after drain(). '''
+        if self.timer:
+            self.timer.cancel()
+        started = time.perf_counter()
+        with scraper.state_lock:
+            self.frontier.close()  # the save file's last batch, one transaction
+            scraper.state_log.close()  # buffered page records, one append + fsync
+        done = time.perf_counter()
+        self.stats["flush"] = done - started
+        self.stats["latency"] = done - self.requested
+        self.latency.set(self.stats["latency"])
+        self.lost.set(self.stats["lost"])
+        self.restore_signals()
+        self.logger.info(
+            f"Crawl stopped ({self.reason}) after {self.pages} pages, {self.bytes} bytes. "
+            f"Drain {self.stats['drain']:.2f}s, flush {self.stats['flush']:.2f}s, shutdown took "
+            f"{self.stats['latency']:.2f}s. {self.stats['lost']} pages in flight were lost (downloaded "
+            f"again next run), {self.stats['queued']} urls left for the next run.")
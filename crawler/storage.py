@@ -0,0 +1,189 @@
+import os
+import time
+import shelve
+import sqlite3
+
+from utils.metrics import metrics
+
+# Storage backends for the Frontier save file. Both keep writes in memory and
+# commit them in groups (every `batch_size` writes or `batch_secs` seconds) instead
+# of syncing after every url, so a crash loses at most one batch. Frontier keeps
+# its own in-memory seen set, so the stores are only read once at startup, and
+# then in chunks: pending_chunks() first so the workers can start, hash_chunks()
+# for the seen set after. Both only cover what was saved before they were
+# called, contains() answers for the rest while they are being read.
+FLUSH_TIME = metrics.histogram("frontier_flush_seconds", "one batch written to the save file")
+
+
+class ShelveStore(object):
+    ''' The original shelve save file, synced in batches. '''
+    def __init__(self, path, batch_size=500, batch_secs=5.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.batch_secs = batch_secs
+        self.db = shelve.open(path)
+        self.dirty = 0
+        self.last_flush = time.time()
+
+    # dbm.dumb (and ndbm) keep the shelve in files named after the path
+    SUFFIXES = ("", ".dat", ".dir", ".bak", ".db")
+
+    @staticmethod
+    def exists(path):
+        return any(os.path.exists(path + suffix) for suffix in ShelveStore.SUFFIXES)
+
+    @staticmethod
+    def remove(path):
+        for suffix in ShelveStore.SUFFIXES:
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    def __len__(self):
+        return len(self.db)
+
+    def items(self):
+        # (urlhash, url, completed) for everything saved
+        for urlhash, (url, completed) in self.db.items():
+            yield urlhash, url, completed
+
+    def is_empty(self):
+        return next(iter(self.db), None) is None
+
+    def contains(self, urlhash):
+        return urlhash in self.db
+
+    def pending_chunks(self, size):
+        # no index here, every value is read; by key and not with items() so
+        # the puts in between don't upset the dbm iteration
+        return self._pending(list(self.db.keys()), size)
+
+    def _pending(self, keys, size):
+        for start in range(0, len(keys), size):
+            chunk = []
+            for urlhash in keys[start:start + size]:
+                url, completed = self.db[urlhash]
+                if not completed:
+                    chunk.append((urlhash, url))
+            if chunk:
+                yield chunk
+
+    def hash_chunks(self, size):
+        keys = list(self.db.keys())
+        return (keys[start:start + size] for start in range(0, len(keys), size))
+
+    def put(self, urlhash, url, completed):
+        self.db[urlhash] = (url, completed)
+        self.dirty += 1
+        if self.dirty >= self.batch_size or time.time() - self.last_flush >= self.batch_secs:
+            self.flush()
+
+    def flush(self):
+        if self.dirty:
+            with FLUSH_TIME.time():
+                self.db.sync()
+        self.dirty = 0
+        self.last_flush = time.time()
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+
+class SQLiteStore(object):
+    ''' SQLite in WAL mode, each batch of writes is one transaction. The urls
+    still to download have their own partial index, so a resume reads those
+    and not the whole table. '''
+    def __init__(self, path, batch_size=500, batch_secs=5.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.batch_secs = batch_secs
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")  # no fsync per commit in WAL mode
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS urls "
+            "(urlhash TEXT PRIMARY KEY, url TEXT NOT NULL, completed INTEGER NOT NULL)")
+        # built once on a save file from before it, kept up to date by sqlite after
+        self.db.execute("CREATE INDEX IF NOT EXISTS pending_urls ON urls(completed) WHERE completed = 0")
+        self.db.commit()
+        self.pending = {}
+        self.last_flush = time.time()
+
+    @staticmethod
+    def exists(path):
+        return os.path.exists(path)
+
+    @staticmethod
+    def remove(path):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    def __len__(self):
+        self.flush()
+        return self.db.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+
+    def items(self):
+        self.flush()
+        for urlhash, url, completed in self.db.execute("SELECT urlhash, url, completed FROM urls"):
+            yield urlhash, url, bool(completed)
+
+    def is_empty(self):
+        return not self.pending and self.db.execute("SELECT 1 FROM urls LIMIT 1").fetchone() is None
+
+    def contains(self, urlhash):
+        return (urlhash in self.pending
+                or self.db.execute("SELECT 1 FROM urls WHERE urlhash = ?", (urlhash,)).fetchone() is not None)
+
+    def pending_chunks(self, size):
+        # lists of (urlhash, url) not completed yet, through the partial index.
+        # Rows keep their rowid when updated (see flush), so paging by rowid up
+        # to the last one saved now doesn't miss or repeat any
+        return self._chunks(
+            "SELECT rowid, urlhash, url FROM urls WHERE completed = 0 AND rowid > ? AND rowid <= ? "
+            "ORDER BY rowid LIMIT ?", size)
+
+    def hash_chunks(self, size):
+        return self._chunks("SELECT rowid, urlhash FROM urls WHERE rowid > ? AND rowid <= ? ORDER BY rowid LIMIT ?",
+                            size, columns=1)
+
+    def _chunks(self, query, size, columns=2):
+        self.flush()
+        last = self.db.execute("SELECT MAX(rowid) FROM urls").fetchone()[0] or 0
+        return self._read_chunks(query, size, last, columns)
+
+    def _read_chunks(self, query, size, last, columns):
+        # one short query per chunk, the caller can write in between
+        after = 0
+        while after < last:
+            rows = self.db.execute(query, (after, last, size)).fetchall()
+            if not rows:
+                return
+            after = rows[-1][0]
+            yield [row[1] if columns == 1 else row[1:] for row in rows]
+
+    def put(self, urlhash, url, completed):
+        self.pending[urlhash] = (urlhash, url, int(completed))
+        if len(self.pending) >= self.batch_size or time.time() - self.last_flush >= self.batch_secs:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            with FLUSH_TIME.time(), self.db:
+                # an upsert, not INSERT OR REPLACE, keeps the rowid (see pending_chunks)
+                self.db.executemany(
+                    "INSERT INTO urls (urlhash, url, completed) VALUES (?, ?, ?) "
+                    "ON CONFLICT(urlhash) DO UPDATE SET url = excluded.url, completed = excluded.completed",
+                    self.pending.values())
+        self.pending = {}
+        self.last_flush = time.time()
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+
+STORES = {
+    "shelve": ShelveStore,
+    "sqlite": SQLiteStore,
+}
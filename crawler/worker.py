@@ -2,6 +2,7 @@ from threading import Thread
 from inspect import getsource
 from utils.download import download
 from utils import get_logger
+from utils.metrics import metrics
 import scraper
 import time
 
@@ -12,36 +13,69 @@ import time
 # each worker should fetch, process, and mark URLs independently.
 # use join() in crawler.py to finish
 
+_source_checked = False
+
+def check_scraper_source():
+    # basic check for requests in scraper, once per process: getsource reads
+    # the whole file and every worker used to do it four times
+    global _source_checked
+    if _source_checked:
+        return
+    source = getsource(scraper)
+    assert {source.find(req) for req in {"from requests import", "import requests"}} == {
+        -1}, "Do not use requests in scraper.py"
+    assert {source.find(req) for req in {"from urllib.request import", "import urllib.request"}} == {
+        -1}, "Do not use urllib.request in scraper.py"
+    _source_checked = True
+
+
+DOWNLOAD_TIME = metrics.histogram("download_seconds", "download per page, decoding included")
+PAGES_DOWNLOADED = metrics.counter("pages_downloaded_total", "pages downloaded", label="status")
+PROCESS_TIME = metrics.histogram("process_seconds", "scraper + add_url per page on the worker")
+
+
 class Worker(Thread):
     def __init__(self, worker_id, config, frontier):
         self.logger = get_logger(f"Worker-{worker_id}", "Worker")
         self.config = config
         self.frontier = frontier
-        self.start_time = time.time()
-        self.TIME_LIMIT = 20 #added change
-        # basic check for requests in scraper
-        assert {getsource(scraper).find(req) for req in {"from requests import", "import requests"}} == {
-            -1}, "Do not use requests in scraper.py"
-        assert {getsource(scraper).find(req) for req in {"from urllib.request import", "import urllib.request"}} == {
-            -1}, "Do not use urllib.request in scraper.py"
+        self.pipeline = None # set by the Crawler when PARSEPROCESSES > 0
+        self.shutdown = None # set by the Crawler, counts pages for the budget
+        check_scraper_source()
         super().__init__(daemon=True)
 
     def run(self):
         while True:
-            # if time.time() - self.start_time > self.TIME_LIMIT:
-            #     print("Worker time limit reached. Stopping crawler.")
-            #     scraper.get_report()
-            #     break
+            # the time limit lives in crawler/shutdown.py now (MAXSECONDS)
             tbd_url = self.frontier.get_tbd_url()
             if not tbd_url:
-                self.logger.info("Frontier is empty. Stopping Crawler.")
+                self.logger.info("Frontier is empty or the crawl is stopping. Stopping Crawler.")
                 break
-            resp = download(tbd_url, self.config, self.logger)
-            self.logger.info(
-                f"Downloaded {tbd_url}, status <{resp.status}>, "
-                f"using cache {self.config.cache_server}.")
-            scraped_urls = scraper.scraper(tbd_url, resp)
-            for scraped_url in scraped_urls:
-                self.frontier.add_url(scraped_url)
-            self.frontier.mark_url_complete(tbd_url)
-            time.sleep(self.config.time_delay)
\ No newline at end of file
+            try:
+                started = time.perf_counter()
+                try:
+                    with DOWNLOAD_TIME.time():
+                        resp = download(tbd_url, self.config, self.logger)
+                except Exception:
+                    self.frontier.observe(tbd_url, time.perf_counter() - started, None)
+                    raise
+                self.frontier.observe(tbd_url, time.perf_counter() - started, resp.status)
+                PAGES_DOWNLOADED.inc(label_value=str(resp.status))
+                if self.shutdown:
+                    self.shutdown.count(resp.size)
+                self.logger.info(
+                    f"Downloaded {tbd_url}, status <{resp.status}>, "
+                    f"using cache {self.config.cache_server}.")
+                if self.pipeline:
+                    # parsed in another process, the pipeline marks it complete
+                    self.pipeline.submit(tbd_url, resp)
+                    continue
+                with PROCESS_TIME.time():
+                    scraped_urls = scraper.scraper(tbd_url, resp)
+                    for scraped_url in scraped_urls:
+                        self.frontier.add_url(scraped_url)
+            except Exception:
+                # still have to mark it or the other workers wait on it forever
+                self.logger.exception(f"Failed on {tbd_url}.")
+            # no sleep here, the frontier holds this host back for its delay
+            self.frontier.mark_url_complete(tbd_url)
\ No newline at end of file
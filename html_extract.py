@@ -0,0 +1,107 @@
+# Single pass text + link extraction, used instead of BeautifulSoup by default
+# (scraper.HTML_EXTRACTOR). It gives the same text as soup.get_text() and the same
+# links as extract_next_links(url, soup), but never builds a tree: html.parser
+# callbacks append text and hrefs to two lists as the bytes go by.
+import re
+import codecs
+from html.entities import html5
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urldefrag
+
+# soup.get_text() leaves out whatever is inside these (bs4 >= 4.10)
+SKIP_TAGS = {"script", "style", "template"}
+META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([A-Za-z0-9_:.-]+)""", re.I)
+# a byte order mark wins over <meta charset> and isn't part of the text, like in bs4
+BOMS = ((codecs.BOM_UTF8, "utf-8"), (codecs.BOM_UTF16_LE, "utf-16-le"), (codecs.BOM_UTF16_BE, "utf-16-be"))
+
+
+class _TextAndLinks(HTMLParser):
+    def __init__(self):
+        # references are resolved below the same way bs4 does it, not html.unescape
+        super().__init__(convert_charrefs=False)
+        self.text = []
+        self.hrefs = []
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag == "a":
+            href = None
+            for name, value in attrs:
+                if name == "href":
+                    href = value or ""  # last one wins, like bs4
+            if href is not None:
+                self.hrefs.append(href)
+
+    def handle_startendtag(self, tag, attrs):
+        # <script/> and friends don't open anything
+        if tag not in SKIP_TAGS:
+            self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS and self.skip_depth:
+            self.skip_depth -= 1
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.text.append(data)
+
+    def handle_entityref(self, name):
+        # unknown names stay as they were (without the ;)
+        self.handle_data(html5.get(name + ";", f"&{name}"))
+
+    def handle_charref(self, name):
+        try:
+            number = int(name[1:], 16) if name[:1] in ("x", "X") else int(name)
+        except ValueError:
+            number = -1
+        data = None
+        if number <= 0 or 0xD800 <= number <= 0xDFFF or number > 0x10FFFF:
+            pass  # not a character, becomes U+FFFD like in bs4
+        elif number < 256:
+            # &#150; and friends usually mean windows-1252
+            try:
+                data = bytes([number]).decode("windows-1252")
+            except UnicodeDecodeError:
+                data = chr(number)
+        else:
+            data = chr(number)
+        self.handle_data(data or "\N{REPLACEMENT CHARACTER}")
+
+    def unknown_decl(self, data):
+        # <![CDATA[...]]> counts as text for get_text too
+        if data.startswith("CDATA[") and not self.skip_depth:
+            self.text.append(data[6:])
+
+
+def decode_html(content):
+    ''' bytes (or a memoryview) -> str, using the <meta charset> if there is one. '''
+    if isinstance(content, str):
+        return content
+    for bom, encoding in BOMS:
+        if bytes(content[:len(bom)]) == bom:
+            try:
+                return str(content[len(bom):], encoding)
+            except UnicodeDecodeError:
+                break
+    match = META_CHARSET.search(bytes(content[:2048]))
+    encodings = [match.group(1).decode("ascii")] if match else []
+    for encoding in encodings + ["utf-8"]:
+        try:
+            return str(content, encoding)
+        except (UnicodeDecodeError, LookupError):
+            pass
+    return str(content, "windows-1252", errors="replace")
+
+
+def extract_text_and_links(url, content):
+    ''' (visible text, absolute defragmented links) for a page in one pass. '''
+    parser = _TextAndLinks()
+    parser.feed(decode_html(content))
+    parser.close()
+    links = []
+    for href in parser.hrefs:
+        absolute_url, _ = urldefrag(urljoin(url, href)) # no frag
+        links.append(absolute_url)
+    return "".join(parser.text), links
@@ -3,21 +3,60 @@ from argparse import ArgumentParser
 
 from utils.server_registration import get_cache_server
 from utils.config import Config
+from utils.replay import CorpusWriter, replay_server
+from utils.page_store import PageStore
 from crawler import Crawler
+from crawler.sharding import crawl_sharded
+from report import build_report
+import scraper
 
 
-def main(config_file, restart):
+def main(config_file, restart, record=None, replay=None, shards=1, shard_dir="shards"):
     cparser = ConfigParser()
     cparser.read(config_file)
     config = Config(cparser)
-    config.cache_server = get_cache_server(config, restart)
+    if replay:
+        # offline, pages come from a recorded corpus (utils/replay.py)
+        config.cache_server = replay_server(replay).start()
+    else:
+        config.cache_server = get_cache_server(config, restart)
+    if shards > 1:
+        # one process per shard of hosts, then one report from all their logs
+        logs = crawl_sharded(config, shards, restart, shard_dir)
+        with open("report.txt", "w") as file:
+            file.write(build_report(logs))
+        return
+    if record:
+        config.recorder = CorpusWriter(record)
+    scraper.configure_log(config.checkpoint_pages, config.checkpoint_secs, fresh=restart)
+    if not restart:
+        scraper.load_log()
+    if config.page_store:
+        scraper.page_store = PageStore(config.page_store, config.page_store_compress, fresh=restart)
     crawler = Crawler(config, restart)
+    crawler.shutdown.install_signals()  # Ctrl-C stops the crawl cleanly (crawler/shutdown.py)
     crawler.start()
+    if config.recorder:
+        config.recorder.close()
+    if scraper.page_store:
+        scraper.page_store.close()
+    with open("report.txt", "w") as file:
+        file.write(scraper.get_report())
 
 
 if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("--restart", action="store_true", default=False)
     parser.add_argument("--config_file", type=str, default="config.ini")
+    parser.add_argument("--record", type=str, default=None,
+                        help="append every downloaded page to this corpus file")
+    parser.add_argument("--replay", type=str, default=None,
+                        help="crawl from this corpus file instead of the cache server")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="crawl with this many processes, each owning a share of the hosts")
+    parser.add_argument("--shard_dir", type=str, default="shards",
+                        help="where each shard keeps its save file, crawl log and Logs/")
     args = parser.parse_args()
-    main(args.config_file, args.restart)
+    if args.record and args.shards > 1:
+        parser.error("--record needs a single process, leave out --shards")
+    main(args.config_file, args.restart, args.record, args.replay, args.shards, args.shard_dir)
@@ -0,0 +1,112 @@
+# Cheap checks on a downloaded page before anything parses it (scraper.check_response).
+# They only look at the headers, the first bytes and a quick count of the
+# words, and each rejection comes back as a reason code so the scraper can
+# count them. The checks only reject a page the full parse would reject too
+# (or a page that is not HTML at all).
+
+OK = "ok"
+EMPTY = "empty"
+TOO_LARGE = "too_large"
+NOT_HTML = "not_html"  # Content-Type says it is something else
+BINARY = "binary"  # the bytes say it is something else
+TOO_FEW_WORDS = "too_few_words"
+
+# Content-Types the parser is worth running on; a missing header is left to
+# the byte sniffing below
+HTML_TYPES = ("text/", "application/xhtml+xml", "application/xml")
+
+# start of the file -> what it is (short ones like "BM" or "MZ" could start a
+# text page too, those files are caught by the NUL byte check instead)
+MAGIC_BYTES = (
+    (b"%PDF", "pdf"),
+    (b"%!PS", "postscript"),
+    (b"PK\x03\x04", "zip/office"),
+    (b"\xd0\xcf\x11\xe0", "old office"),
+    (b"{\\rtf", "rtf"),
+    (b"\x89PNG", "png"),
+    (b"GIF8", "gif"),
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"II*\x00", "tiff"),
+    (b"MM\x00*", "tiff"),
+    (b"RIFF", "wav/avi/webp"),
+    (b"OggS", "ogg"),
+    (b"fLaC", "flac"),
+    (b"\x1a\x45\xdf\xa3", "mkv/webm"),
+    (b"\x1f\x8b", "gzip"),
+    (b"BZh", "bzip2"),
+    (b"7z\xbc\xaf\x27\x1c", "7z"),
+    (b"Rar!", "rar"),
+    (b"\xfd7zXZ", "xz"),
+    (b"\x7fELF", "elf"),
+    (b"\xca\xfe\xba\xbe", "java class"),
+    (b"wOFF", "woff"),
+    (b"\x00\x01\x00\x00", "font"),
+)
+UTF16_BOMS = (b"\xff\xfe", b"\xfe\xff")
+SNIFF_BYTES = 1024
+
+# Upper bound on what len(text.split()) can come to after parsing: runs of
+# ASCII split on whitespace and markup characters, plus one for every non-ASCII
+# byte (it might decode to a space). Tags, scripts and entities only add to the
+# count, so a page under the limit here is under it after the parse as well.
+_SPLIT_ON = b" \t\n\r\x0b\x0c\x00\x1c\x1d\x1e\x1f<>&;" + bytes(range(0x80, 0x100))
+WORD_SEPARATORS = bytes(32 if c in _SPLIT_ON else c for c in range(256))
+NON_ASCII = bytes(range(0x80, 0x100))
+ESTIMATE_BYTES = 1024  # has_words looks at this much first, then 8x more each round
+
+def header(headers, name):
+    if not headers:
+        return ""
+    value = headers.get(name)
+    if value is None:
+        value = headers.get(name.lower())  # a plain dict instead of requests' CaseInsensitiveDict
+    return value or ""
+
+
+def sniff(content):
+    ''' What the first bytes say the page is, or None if it could be text. '''
+    start = bytes(content[:SNIFF_BYTES])  # content can be a memoryview
+    for magic, kind in MAGIC_BYTES:
+        if start.startswith(magic):
+            return kind
+    if b"\x00" in start and not start.startswith(UTF16_BOMS):
+        return "binary"
+    return None
+
+
+def estimate_words(data):
+    ''' Most words the parse could find in these bytes. '''
+    return len(data.translate(WORD_SEPARATORS).split()) + len(data) - len(data.translate(None, NON_ASCII))
+
+
+def has_words(content, min_words):
+    ''' True if the page could have min_words words; only looks at as much of
+    it as it takes to be sure. '''
+    if min_words <= 0:
+        return True
+    end = ESTIMATE_BYTES
+    while True:
+        if estimate_words(bytes(content[:end])) >= min_words:
+            return True
+        if end >= len(content):
+            return False
+        end *= 8
+
+def check_page(content, headers=None, max_size=None, min_words=0):
+    ''' Reason code for a page body and its response headers, OK if it should
+    be parsed. '''
+    if not content:
+        return EMPTY
+    length = header(headers, "Content-Length")
+    if max_size is not None and (len(content) > max_size or (length.isdigit() and int(length) > max_size)):
+        return TOO_LARGE
+    content_type = header(headers, "Content-Type").split(";", 1)[0].strip().lower()
+    if content_type and not content_type.startswith(HTML_TYPES):
+        return NOT_HTML
+    if sniff(content) is not None:
+        return BINARY
+    if bytes(content[:2]) in UTF16_BOMS:
+        return OK  # two bytes a character, the word count below doesn't work on it
+    if not has_words(content, min_words):
+        return TOO_FEW_WORDS
+    return OK
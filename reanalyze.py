@@ -0,0 +1,70 @@
+from argparse import ArgumentParser
+import time
+
+import scraper
+from page_gate import check_page, OK as GATE_OK
+from utils.page_store import map_store
+
+# Rebuilds the crawl stats and report.txt from a page store (PAGESTORE in
+# config.ini), no network. Pages are analyzed again in a process pool with the
+# current scraper.py and tokenizer.py (a new stopword list, thresholds, the
+# other html extractor...) and merged in store order, the same way the crawl
+# merged them. The rebuilt state goes to its own log file, the crawl's
+# crawler_log.json is left alone.
+#   python reanalyze.py pages --processes 4 --report report.txt
+
+
+def _analyze_rows(reader, start, stop):
+    # runs in a pool process: (url, reason, page) for every 200 page in the
+    # range, reason is a page_gate code or "trap" when the page stops before
+    # parsing, like check_response would have stopped it
+    results = []
+    status = reader.column("status")
+    for i in range(start, stop):
+        if status[i] != 200:
+            continue
+        url = reader.url(i)
+        content = bytes(reader.body(i))  # the parser wants bytes, one copy out of the mmap
+        reason = check_page(content, {"Content-Type": reader.content_type(i)},
+                            scraper.MAX_PAGE_SIZE, scraper.MIN_WORD_COUNT)
+        if reason == GATE_OK and scraper.is_trap(url):
+            reason = "trap"
+        page = scraper.analyze_page(url, content) if reason == GATE_OK else None
+        if page is not None:
+            page.pop("timings")
+        results.append((url, reason, page))
+    return results
+
+
+def reanalyze(store, processes=None, report="report.txt", log_file="reanalyze_log.json"):
+    start = time.time()
+    scraper.LOG_FILE = log_file
+    scraper.configure_log(10 ** 9, 10 ** 9, fresh=True)  # one snapshot at the end is enough
+    scraper.reset_stats()
+    pages = 0
+    for results in map_store(store, _analyze_rows, processes):
+        for url, reason, page in results:
+            pages += 1
+            if page is not None:
+                scraper.apply_page(url, page)
+            elif reason != "trap":
+                scraper.gate_rejections[reason] += 1
+    scraper.save_log()
+    text = scraper.get_report()
+    if report:
+        with open(report, "w") as file:
+            file.write(text)
+    print(f"Reanalyzed {pages} pages in {time.time() - start:.1f}s: "
+          f"{sum(scraper.subdomains.values())} unique, "
+          f"duplicates {dict(scraper.duplicates)}, rejected {dict(scraper.gate_rejections)}.")
+    return text
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("store", type=str, help="page store directory (PAGESTORE)")
+    parser.add_argument("--processes", type=int, default=None, help="default: one per core")
+    parser.add_argument("--report", type=str, default="report.txt")
+    parser.add_argument("--log_file", type=str, default="reanalyze_log.json")
+    args = parser.parse_args()
+    reanalyze(args.store, args.processes, args.report, args.log_file)
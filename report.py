@@ -0,0 +1,290 @@
+from argparse import ArgumentParser
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import heapq
+import json
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import zlib
+from urllib.parse import urlparse
+
+from utils.state_log import parse_word_lines
+from utils.word_stats import COUNTERS
+
+# Makes report.txt from the saved crawl state (crawler_log.json and its .delta
+# log) without loading it in one piece. Both files are cut into byte ranges at
+# line breaks: the delta log has one page record per line and the snapshot one
+# exact word count per line after its first line (utils/state_log.py), so
+# nothing depends on what the words look like. Map tasks parse a range each and
+# split their words in partitions by crc32. With a pool the partitions go to
+# files in a temp dir, so the words never pass through this process. Every
+# partition is merged and cut down to its top 50 (heapq) by its own reduce
+# task, and the final top 50 comes out of the partitions' top 50s, no full
+# sort. An approx (count-min sketch) snapshot or one from before the
+# word lines is loaded whole instead and the delta records go on top of it.
+# With a page store it runs reanalyze.py instead (the store has no word counts).
+# Several logs (the shards of launch.py --shards) make one report together.
+#   python report.py --log crawler_log.json --processes 4 --output report.txt
+#   python report.py --log shards/shard-*/crawler_log.json
+
+MIN_CHUNK_BYTES = 256 * 1024
+MAX_CHUNK_BYTES = 16 * 1024 * 1024
+TASKS_PER_PROCESS = 2  # more ranges than processes so a slow one doesn't hold up the rest
+
+
+def _cuts(path, start, stop, chunk):
+    # [start, ..., stop] with every cut but the ends moved up to a line break
+    cuts = [start]
+    with open(path, "rb") as file:
+        for cut in range(start + chunk, stop, chunk):
+            if cut <= cuts[-1]:
+                continue
+            file.seek(cut - 1)
+            file.readline()
+            cut = file.tell()
+            if cut >= stop:
+                break
+            cuts.append(cut)
+    cuts.append(stop)
+    return list(zip(cuts, cuts[1:]))
+
+
+def _read(path, start, stop, inode=None):
+    with open(path, "rb") as file:
+        if inode is not None and os.fstat(file.fileno()).st_ino != inode:
+            # the crawl wrote a new snapshot since the first line was read
+            raise RuntimeError(f"{path} was replaced while the report was made, run it again")
+        file.seek(start)
+        return file.read(stop - start)
+
+
+def _partition(words, partitions):
+    # every word is in `words` once, so it's a plain assignment
+    if partitions == 1:
+        return [words]
+    parts = [{} for _ in range(partitions)]
+    crc32 = zlib.crc32
+    for word, count in words.items():
+        parts[crc32(word.encode("utf-8")) % partitions][word] = count
+    return parts
+
+
+def _shuffle_out(parts, shuffle, task):
+    # with a pool every partition goes to its own file, the reduce task reads it
+    if shuffle is None:
+        return parts
+    names = []
+    for i, part in enumerate(parts):
+        names.append(os.path.join(shuffle, f"{task}-{i}"))
+        with open(names[-1], "wb") as file:
+            pickle.dump(part, file, pickle.HIGHEST_PROTOCOL)
+    return names
+
+
+def _shuffle_in(part):
+    if isinstance(part, str):
+        with open(part, "rb") as file:
+            return pickle.load(file)
+    return part
+
+
+def _map_words(path, start, stop, partitions, shuffle, task, inode):
+    # one range of the snapshot's word lines
+    words = parse_word_lines(_read(path, start, stop, inode))
+    return _shuffle_out(_partition(words, partitions), shuffle, task), Counter(), (0, None), 0
+
+
+def _map_records(path, start, stop, partitions, shuffle, task, done):
+    # one range of the delta log, the same updates scraper._replay_record makes
+    words = {}
+    subdomains = Counter()
+    longest = (0, None)
+    records = 0
+    for line in _read(path, start, stop).splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            break  # half written last line from a crash
+        if record["seq"] <= done:
+            continue
+        records += 1
+        if record["tracked"]:
+            subdomains[urlparse(record["url"]).netloc] += 1
+        for word, count in record["words"].items():
+            words[word] = words.get(word, 0) + count
+        if record["word_count"] > longest[0]:
+            longest = (record["word_count"], record["url"])
+    return _shuffle_out(_partition(words, partitions), shuffle, task), subdomains, longest, records
+
+
+def _merge_words(parts):
+    merged = Counter()
+    for part in parts:
+        merged.update(_shuffle_in(part))
+    return merged
+
+
+def _reduce_words(parts, k):
+    return _top(_merge_words(parts).items(), k)
+
+
+def _timed(function, *args):
+    # (result, CPU seconds it took, (pid, CPU seconds the process used before)),
+    # for the stats
+    start = time.process_time()
+    result = function(*args)
+    return result, time.process_time() - start, (os.getpid(), start)
+
+
+def _top(items, k):
+    # biggest counts first, ties alphabetical so the report doesn't depend on
+    # how the work was split
+    return heapq.nsmallest(k, items, key=lambda item: (-item[1], item[0]))
+
+
+def _read_snapshot(log_file):
+    ''' (the snapshot without its word lines, (start, stop, inode) of the word
+    lines or None when there are none). '''
+    with open(log_file, "rb") as file:
+        snapshot = json.loads(file.readline())  # the whole file for old snapshots
+        if "word_lines" not in snapshot:
+            return snapshot, None
+        stat = os.fstat(file.fileno())
+        return snapshot, (file.tell(), stat.st_size, stat.st_ino)
+
+
+def build_report(log_files="crawler_log.json", processes=None, k=50, domain="ics.uci.edu", stats=None):
+    ''' The report from one crawl log, or several merged (one per shard of a
+    launch.py --shards crawl, their hosts never overlap). `stats`, if given, gets
+    the CPU seconds of every map and reduce task and of every pool worker's
+    startup, and the wall time. '''
+    started = time.perf_counter()
+    if isinstance(log_files, str):
+        log_files = [log_files]
+    processes = processes or os.cpu_count() or 1
+    partitions = processes
+    loaded = None  # word counter for snapshots that had to be loaded whole
+    ranges = []    # (map function, path, start, stop, extra args)
+    subdomains = Counter()
+    longest = (None, 0)
+    for log_file in log_files:
+        delta_file = f"{log_file}.delta"
+        done = 0
+        if os.path.exists(log_file) and os.path.getsize(log_file):
+            snapshot, word_lines = _read_snapshot(log_file)
+            if word_lines is not None:
+                start, stop, inode = word_lines
+                ranges.append((_map_words, log_file, start, stop, (inode,)))
+            else:
+                counts = snapshot["word_counts"]
+                approx = isinstance(counts.get("table"), str)  # exact counts are ints
+                if loaded is None:
+                    loaded = COUNTERS["approx" if approx else "exact"](k)
+                    loaded.load(counts)
+                else:
+                    loaded.update(counts["top"] if approx else counts)
+            done = snapshot.get("seq", 0)
+            subdomains.update(snapshot["subdomains"])
+            if snapshot["longest_page"][1] > longest[1]:
+                longest = tuple(snapshot["longest_page"])
+        elif not os.path.exists(delta_file):
+            raise FileNotFoundError(log_file)
+        if os.path.exists(delta_file):
+            ranges.append((_map_records, delta_file, 0, os.path.getsize(delta_file), (done,)))
+
+    total = sum(stop - start for _, _, start, stop, _ in ranges)
+    chunk = min(MAX_CHUNK_BYTES, max(MIN_CHUNK_BYTES, total // (processes * TASKS_PER_PROCESS) + 1))
+    executor = shuffle = None
+    if processes > 1:
+        executor = ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn"))
+        shuffle = tempfile.mkdtemp(prefix="report-")
+    cuts = [(function, path, a, b, extra) for function, path, start, stop, extra in ranges
+            for a, b in _cuts(path, start, stop, chunk)]
+    tasks = [(function, path, a, b, partitions, shuffle, task) + extra
+             for task, (function, path, a, b, extra) in enumerate(cuts)]
+
+    records = 0
+    map_seconds, reduce_seconds = [], []
+    startup = {}  # pid -> CPU seconds before its first task (imports), pool workers only
+    try:
+        # map: partial counts per range, in file order so the longest page ties
+        # go the same way as in the crawl
+        if executor:
+            # biggest ranges first, the small ones fill in at the end
+            futures = {}
+            for i in sorted(range(len(tasks)), key=lambda i: tasks[i][2] - tasks[i][3]):
+                futures[i] = executor.submit(_timed, *tasks[i])
+            results = (futures[i].result() for i in range(len(tasks)))
+        else:
+            results = (_timed(*task) for task in tasks)
+        parts = [[] for _ in range(partitions)]
+        for (word_parts, page_subdomains, (word_count, url), count), seconds, (pid, before) in results:
+            map_seconds.append(seconds)
+            startup[pid] = min(before, startup.get(pid, before))
+            for i, part in enumerate(word_parts):
+                parts[i].append(part)
+            subdomains.update(page_subdomains)
+            if word_count > longest[1]:
+                longest = (url, word_count)
+            records += count
+        # reduce: each partition to its top k, then the top k of those. With a
+        # counter that's already in memory each partition is merged and goes on
+        # top of it, every word once
+        if loaded is None:
+            reduce, args = _reduce_words, (parts, [k] * partitions)
+        else:
+            reduce, args = _merge_words, (parts,)
+        if executor:
+            results = executor.map(_timed, [reduce] * partitions, *args)
+        else:
+            results = (_timed(reduce, *arg) for arg in zip(*args))
+        top_words = []
+        for result, seconds, (pid, before) in results:
+            reduce_seconds.append(seconds)
+            startup[pid] = min(before, startup.get(pid, before))
+            if loaded is None:
+                top_words += result
+            else:
+                loaded.update(result)
+        top_words = _top(top_words, k) if loaded is None else loaded.top(k)
+    finally:
+        if executor:
+            executor.shutdown()
+            shutil.rmtree(shuffle, ignore_errors=True)
+    if stats is not None:
+        stats.update(map=map_seconds, reduce=reduce_seconds, wall=time.perf_counter() - started,
+                     startup=list(startup.values()) if executor else [])
+    print(f"{len(tasks)} map tasks, {records} records after the snapshot, {processes} processes.")
+    import scraper  # not at the top, the pool's workers don't need it
+    return scraper.format_report(sum(subdomains.values()), longest, top_words, subdomains, domain)
+
+
+def main(log_files, store, processes, output, domain):
+    start = time.time()
+    import scraper
+    if store:
+        # the store has the pages themselves, the stats are rebuilt from them
+        from reanalyze import reanalyze
+        reanalyze(store, processes, report=None)
+        text = scraper.get_report(domain)
+    else:
+        text = build_report(log_files, processes, domain=domain)
+    with open(output, "w") as file:
+        file.write(text)
+    print(f"Wrote {output} in {time.time() - start:.1f}s.")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--log", type=str, nargs="+", default=["crawler_log.json"],
+                        help="saved crawl state, several are merged (one per shard)")
+    parser.add_argument("--store", type=str, default=None, help="page store directory, used instead of the log")
+    parser.add_argument("--processes", type=int, default=None, help="default: one per core")
+    parser.add_argument("--output", type=str, default="report.txt")
+    parser.add_argument("--domain", type=str, default="ics.uci.edu", help="whose subdomains are listed")
+    args = parser.parse_args()
+    main(args.log, args.store, args.processes, args.output, args.domain)
@@ -12,28 +12,43 @@
 # Rebasing and stashing via everyone
 # robots.txt implemented by suyash and arsheaa but removed coz not reading too many pages
 
-import re
-import json
-# import urllib.robotparser
-# from urllib.parse import urlparse
 from urllib.parse import urljoin, urlparse, urldefrag
 from bs4 import BeautifulSoup
-from tokenizer import tokenize
-from collections import deque
-from simhash_basic import make_simhash, simhash_diff
+from tokenizer import tokenize_and_count  # the one stopword list lives in tokenizer.py
+from html_extract import extract_text_and_links
+from url_filter import UrlClassifier, INVALID
+from page_gate import check_page, OK as GATE_OK
+from collections import deque, Counter
+from threading import RLock
+from simhash_basic import make_simhash_fast, SimHashIndex
+from utils.state_log import StateLog
+from utils.seen_set import SeenSet, digest64
+from utils.word_stats import COUNTERS, WordCounts
+from utils.metrics import metrics
+from time import perf_counter
 
 
 MIN_WORD_COUNT = 50
+MIN_TOKEN_LENGTH = 1  # shorter tokens are left out of the word counts
+DROP_NUMERIC_TOKENS = False  # True leaves all-digit tokens out of the word counts
 MAX_PAGE_SIZE = 1 * 1024 * 1024  # 1MB in size
-visited_urls = set()
-visited_hashes = set()
+HTML_EXTRACTOR = "stream"  # "stream" (html_extract.py, one pass) or "soup" (BeautifulSoup)
+visited_urls = SeenSet()  # 64-bit digests of the urls, not the strings (utils/seen_set.py)
+SIMHASH_THRESHOLD = 5  # pages closer than this many bits are duplicates
+visited_hashes = SimHashIndex(max_k=SIMHASH_THRESHOLD - 1)
+content_digests = SeenSet()  # digests of the normalized text, exact copies skip SimHash
+duplicates = Counter()  # "exact" / "near" duplicate pages skipped
 LOG_FILE = "crawler_log.json"
+state_log = StateLog(LOG_FILE)  # snapshot + append-only page records
 subdomains = {}
-word_counts = {}
+WORD_COUNTER = "exact"  # "exact" (Counter) or "approx" (Count-Min Sketch, fixed memory)
+word_counts = COUNTERS[WORD_COUNTER]()  # .top(50) for the report, see utils/word_stats.py
 longest_page = (None, 0)  # (URL, word count)
 url_queue = deque()
-STOPWORDS = set("""
-a about above after again against all am an and any are aren't as at be because been before being below between both but by can't cannot could couldn't did didn't do does doesn't doing don't down during each few for from further had hadn't has hasn't have haven't having he he'd he'll he's her here here's hers herself him himself his how how's i i'd i'll i'm i've if in into is isn't it it's its itself let's me more most mustn't my myself no nor not of off on once only or other ought our ours ourselves out over own same shan't she she'd she'll she's should shouldn't so some such than that that's the their theirs them themselves then there there's these they they'd they'll they're they've this those through to too under until up very was wasn't we we'd we'll we're we've were weren't what what's when when's where where's which while who who's whom why why's with won't would wouldn't you you'd you'll you're you've your yours yourself yourselves""".split())
+gate_rejections = Counter()  # pages check_page turned away, by reason
+page_store = None  # utils.page_store.PageStore when PAGESTORE is set, every downloaded page goes in
+page_outcomes = None  # called with (url, outcome) for every page, FRONTIERORDER = priority learns from it
+state_lock = RLock()  # workers share all of the globals above
 TRAP_PATTERNS = [
     r'\?sort=', r'\?order=', r'\?page=\d+',  # URLs
     r'\?date=', r'\?filter=', r'calendar', r'\?view=', r'\?session=', # calender
@@ -52,48 +67,57 @@ TRAP_PATTERNS = [
     r'\?redirect=',  # auto-redirects that could loop infinitely
     r'\?attachment_id=',  # media
 ]
-# robots_parsers = {}
-# Robots.txt sometimes stop our program from going to desired pages causing 0 crawls issue so rn commented
-# Dictionary to store parsed robots.txt per domain
-# robots_parsers = {}
-# def can_fetch(url):
-#     """Checks if the URL is allowed by robots.txt"""
-#     # the format learned from stacko.flow
-#     parsed = urlparse(url)
-#     domain = f"{parsed.scheme}://{parsed.netloc}/robots.txt"
-#     # Load txt
-#     if domain not in robots_parsers:
-#         rp = urllib.robotparser.RobotFileParser()
-#         rp.set_url(domain)
-#         try:
-#             rp.read()  # read robots.txt
-#             robots_parsers[domain] = rp
-#         except Exception as e:
-#             print(f"couldn't find robots.txt")
-#             return True # continue crawl
-#
-#     # so now we have checked
-#     return robots_parsers[domain].can_fetch("*", url)
+# our allowed domains
+ALLOWED_DOMAINS = [
+    ".ics.uci.edu",
+    ".cs.uci.edu",
+    ".informatics.uci.edu",
+    ".stat.uci.edu"
+]
+# we added more extensions we learned from ed and trials
+BLOCKED_EXTENSIONS = """css js bmp gif jpg jpeg png pdf ico
+    tif tiff mid mp2 mp3 mp4 wav avi mov mpeg m4v mkv ogg ogv
+    ps eps tex ppt pptx doc docx xls xlsx
+    data dat exe bz2 tar msi bin 7z dmg iso
+    epub dll cnf tgz sha1 thmx mso arff rtf jar csv
+    rm smil wmv swf wma zip rar gz ical ppsx pps mol""".split()
+# everything above compiled once (see url_filter.py)
+url_classifier = UrlClassifier(ALLOWED_DOMAINS, BLOCKED_EXTENSIONS, TRAP_PATTERNS)
+
+# per stage timings and counts (utils/metrics.py); analyze_page can run in another
+# process, so it sends its timings back with the page and apply_page records them
+CHECK_TIME = metrics.histogram("check_seconds", "check_response per page")
+STAGE_TIMES = {
+    stage: metrics.histogram(f"{stage}_seconds", f"analyze_page, {stage} step")
+    for stage in ("parse", "tokenize", "simhash", "links")}
+APPLY_TIME = metrics.histogram("apply_seconds", "apply_page per page, save_log included")
+SAVE_LOG_TIME = metrics.histogram("save_log_seconds", "save_log per call")
+PAGES_PARSED = metrics.counter("pages_parsed_total", "pages that made it to apply_page")
+metrics.gauge("gate_rejections", "pages turned away before parsing", lambda: dict(gate_rejections), label="reason")
+metrics.gauge("duplicate_pages", "pages skipped as duplicates", lambda: dict(duplicates), label="kind")
+metrics.gauge("duplicate_ratio", "duplicates / pages parsed",
+              lambda: sum(duplicates.values()) / max(1, PAGES_PARSED.total()))
+metrics.gauge("unique_pages", "pages counted in the report", lambda: sum(subdomains.values()))
+# robots.txt used to be checked here with a blocking rp.read() per domain, which
+# stalled the crawl (0 crawls). The frontier checks it now, fetched in the
+# background, see crawler/robots.py
 
 def is_trap(url):
     """Detects common crawler traps based on URL patterns."""
-    parsed = urlparse(url)
-    # somehow came in even when we removed from traps
-    if "doku.php" in parsed.path:
-        return True
-    # patterns
-    for i in TRAP_PATTERNS:
-        if re.search(i, url):
-            return True
-    return False
+    # precompiled in url_filter.py: substring checks for the plain string
+    # patterns (doku.php is one of them too), compiled regexes for the rest
+    return url_classifier.trap_pattern(url) is not None
 
 def is_similar(text):
     #Checks if a page is too similar
-    page_hash = make_simhash(text)
-    for old_hash in visited_hashes:
-        if simhash_diff(page_hash, old_hash) < 5:  # Adjust threshold as needed
+    return is_similar_hash(make_simhash_fast(text))
+
+def is_similar_hash(page_hash):
+    with state_lock:
+        # index lookup instead of comparing against every old hash
+        if visited_hashes.has_within(page_hash, SIMHASH_THRESHOLD - 1):
             return True  # Too similar, skip
-    visited_hashes.add(page_hash)
+        visited_hashes.add(page_hash)
     return False
 
 def scraper(url, resp):
@@ -106,78 +130,199 @@ def scraper(url, resp):
     #         resp.raw_response.url: the url, again
     #         resp.raw_response.content: the content of the page!
     # Return a list with the hyperlinks (as strings) scrapped from resp.raw_response.content
-
-    global longest_page # longest page
+    # resp.headers / resp.content are the same without unpickling the whole raw_response
+    # (content is a memoryview into the download, utils/response.py), use those here
+    # The work is split in three so crawler/pipeline.py can run analyze_page in other processes.
+    with CHECK_TIME.time():
+        early = check_response(url, resp)
+    if early is not None:
+        store_page(url, resp)
+        return early
+    page = analyze_page(url, resp.content, content_digests)
+    store_page(url, resp, page)
+    return apply_page(url, page)
+
+def store_page(url, resp, page=None):
+    # keeps the downloaded body for reanalyze.py, with what analyze_page found
+    # when the page got that far
+    if page_store is None or resp.content is None:
+        return
+    page = page or {}
+    page_store.add(url, resp.status, resp.content, resp.headers.get("Content-Type", ""),
+                   page.get("simhash"), page.get("word_count", 0))
+
+def check_response(url, resp):
+    # steps 1-4, cheap checks before parsing. Returns the links to give back if the
+    # page stops here, or None if it should be parsed
 
     # 1.to deal with weird 600 codes
     if 600 <= resp.status < 700:
         print(f"Skipping URL due to unknown 601 error (status {resp.status}): {url}")
+        note_outcome(url, "error")
         return []
 
     # 2. redirects from 300s
     if 300 <= resp.status <= 399:
-        new_url = resp.raw_response.headers.get("Location")
+        new_url = resp.headers.get("Location")
         if new_url:
             print(f"Redirecting {url} - {new_url}")
+            note_outcome(url, "redirect")
             return [new_url]  # goes to next direct
         else:
             print(f"Skipping redirect : {url}") # couldnt find so left
+            note_outcome(url, "error")
             return []
 
     # 2. response status is 300
-    if resp.status != 200 or resp.raw_response is None:
+    if resp.status != 200 or resp.content is None:
+        note_outcome(url, "error")
         return []
 
-    # 3. Too long of a page
-    if len(resp.raw_response.content) > MAX_PAGE_SIZE:
-        print(f"Skipping large file (>1MB): {url}")
+    # 3. Too long of a page, not html or too few words, straight from the bytes and
+    # headers so nothing gets parsed for it (page_gate.py)
+    reason = check_page(resp.content, resp.headers, MAX_PAGE_SIZE, MIN_WORD_COUNT)
+    if reason != GATE_OK:
+        with state_lock:
+            gate_rejections[reason] += 1
+        print(f"Skipping page before parsing ({reason}): {url}")
+        note_outcome(url, "gated")
         return []
 
     # 4. is a trap ????
     if is_trap(url):
         print(f"Skipping potential crawler trap: {url}")
+        note_outcome(url, "trap")
         return []
+    return None
+
+def note_outcome(url, outcome):
+    # how the page turned out: "unique", "duplicate", "low_content", "trap",
+    # "gated", "redirect" or "error" (crawler/scoring.py)
+    if page_outcomes is not None:
+        page_outcomes(url, outcome)
+
+def content_digest(words):
+    # checksum of the text with whitespace normalized, words is text.split()
+    return digest64(" ".join(words))
+
+def analyze_page(url, content, known_digests=None):
+    # steps 5-7, all the heavy work. Only reads the page (no globals) so it is safe
+    # to run in another process; the result is a plain picklable dict. With
+    # known_digests (a SeenSet of content digests) an exact copy of a page seen
+    # before stops right after the text is extracted
+    # 5. Parsing the pages text (and links, the stream extractor gets both at once)
+    start = perf_counter()
+    if HTML_EXTRACTOR == "stream":
+        text_content, links = extract_text_and_links(url, content)
+    else:
+        soup = BeautifulSoup(bytes(content), "html.parser")
+        text_content = soup.get_text()
+        links = extract_next_links(url, soup)
+
+    words = text_content.split()
+    digest = content_digest(words)
+    parsed = perf_counter()
+    if known_digests is not None and known_digests.contains_digest(digest):
+        return {"digest": digest, "simhash": None, "word_count": len(words), "words": {}, "links": [],
+                "timings": {"parse": parsed - start}}
+
+    # 6 . we process i.e. tokens, counted straight from the text
+    page_counts = tokenize_and_count(text_content, MIN_TOKEN_LENGTH, DROP_NUMERIC_TOKENS)
+    tokenized = perf_counter()
+    simhash = make_simhash_fast(text_content)
+    hashed = perf_counter()
+
+    # 7. validate links
+    valid_links = [link for link in links if is_valid(link)]
+    return {
+        "digest": digest,
+        "simhash": simhash,
+        "word_count": len(words),
+        "words": page_counts,
+        "links": valid_links,
+        "timings": {"parse": parsed - start, "tokenize": tokenized - parsed,
+                    "simhash": hashed - tokenized, "links": perf_counter() - hashed}
+    }
+
+def apply_page(url, page):
+    # step 8, merges what analyze_page found into the shared stats
+    PAGES_PARSED.inc()
+    for stage, seconds in page.get("timings", {}).items():
+        STAGE_TIMES[stage].observe(seconds)
+    with APPLY_TIME.time():
+        return _apply_page(url, page)
+
+def _apply_page(url, page):
+    global longest_page # longest page
 
-    # 5. Parsing the pages text
-    soup = BeautifulSoup(resp.raw_response.content, "html.parser")
-    text_content = soup.get_text()
+    # -> 8.0 Same text as a page we already had, checksum only (no SimHash)
+    with state_lock:
+        exact = not content_digests.add_digest(page["digest"])
+    if exact:
+        print(f"Skipping exact duplicate page: {url}")
+        return skip_page(url, page, "exact")
 
-    # -> 5.1 Check for duplicate content our (SimHash)
-    if is_similar(text_content):
+    # -> 8.1 Check for duplicate content our (SimHash)
+    if is_similar_hash(page["simhash"]):
         print(f"Skipping duplicate page: {url}")
-        return []
+        return skip_page(url, page, "near")
 
-    # -> 5.2 Avoid low-content pages around 50 words
-    word_count = len(text_content.split())
+    # -> 8.2 Avoid low-content pages around 50 words
+    word_count = page["word_count"]
     if word_count < MIN_WORD_COUNT:
         print(f"Skipping low-content page (<50 words): {url}")
-        return []
-
-    # 6 . we process i.e. tokens
-    tokens = tokenize(text_content)
-    update_word_counts(tokens)
-
-    # 7. we update our longest page again
-    if word_count > longest_page[1]:
-        longest_page = (url, word_count)
-
-    # 8 make sure our unique pages are saved in logs
-    track_unique_pages(url)
-
-    # 9. Extract and validate links
-    links = extract_next_links(url, soup)
-    valid_links = [link for link in links if is_valid(link)]
-
-    # 10. Add new valid links to the queue**
-    for link in valid_links:
-        if link not in visited_urls:
-            visited_urls.add(link)
-            url_queue.append(link)
-
-    # 11. needs our log function!
-    save_log() # saves progress
+        return skip_page(url, page, None)
+    valid_links = page["links"]
+
+    # everything below touches the shared stats, one worker at a time
+    with state_lock:
+        page_counts = update_word_counts(page["words"])
+
+        # -> 8.3 we update our longest page again
+        if word_count > longest_page[1]:
+            longest_page = (url, word_count)
+
+        # -> 8.4 make sure our unique pages are saved in logs
+        tracked = track_unique_pages(url)
+
+        # -> 8.5 Add new valid links to the queue**
+        new_links = []
+        for link in valid_links:
+            if link not in visited_urls:
+                visited_urls.add(link)
+                url_queue.append(link)
+                new_links.append(link)
+
+        # -> 8.6 needs our log function! only what changed on this page goes in the log
+        save_log({
+            "url": url,
+            "tracked": tracked,
+            "words": page_counts,
+            "word_count": word_count,
+            "new_urls": new_links,
+            "digest": page["digest"]
+        }) # saves progress
+    note_outcome(url, "unique")
     return valid_links
 
+def skip_page(url, page, duplicate):
+    # a page that is dropped after parsing, logged so its digest and the
+    # duplicate counts survive a restart
+    with state_lock:
+        if duplicate:
+            duplicates[duplicate] += 1
+        save_log({
+            "url": url,
+            "tracked": False,
+            "words": {},
+            "word_count": 0,
+            "new_urls": [],
+            "digest": page["digest"],
+            "duplicate": duplicate
+        })
+    note_outcome(url, "duplicate" if duplicate else "low_content")
+    return []
+
 def extract_next_links(url, soup):
     # next links in to be extracted from current url/soup
     links = []
@@ -192,34 +337,12 @@ def is_valid(url):
     # Decide whether to crawl this url or not. 
     # If you decide to crawl it, return True; otherwise return False.
     # There are already some conditions that return False.
+    # The scheme, domain and extension checks live in url_filter.py now, traps are
+    # checked separately by is_trap like before
     try:
-        parsed = urlparse(url)
-        if parsed.scheme not in set(["http", "https"]):
-            return False
-
-        # our allowed domains
-        allowed_domains = [
-            ".ics.uci.edu",
-            ".cs.uci.edu",
-            ".informatics.uci.edu",
-            ".stat.uci.edu"
-        ]
-        if not any(parsed.netloc.endswith(domain) for domain in allowed_domains):
-            return False
-
-        if re.match(
-                r".*\.(css|js|bmp|gif|jpg|jpeg|png|pdf|ico"
-                + r"|tiff?|mid|mp2|mp3|mp4|wav|avi|mov|mpeg|m4v|mkv|ogg|ogv"
-                + r"|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx"
-                + r"|data|dat|exe|bz2|tar|msi|bin|7z|dmg|iso"
-                + r"|epub|dll|cnf|tgz|sha1|thmx|mso|arff|rtf|jar|csv"
-                + r"|rm|smil|wmv|swf|wma|zip|rar|gz|ical|ppsx|pps|mol)$",
-                parsed.path.lower()):
-            # we added more extensions we learned from ed and trials
-            return False
-        return True
+        return url_classifier.classify(url) not in INVALID
     except TypeError:
-        print ("TypeError for ", parsed)
+        print ("TypeError for ", url)
         raise
 
 def track_unique_pages(url):
@@ -235,36 +358,131 @@ def track_unique_pages(url):
             subdomains[domain] += 1
         else:
             subdomains[domain] = 1
+        return True
+    return False
 
 def update_word_counts(tokens):
-   # updates our count of words
-    global word_counts
-    for word in tokens:
-        word_counts[word] = word_counts.get(word, 0) + 1
-
-
-def save_log():
-    """Saves to our log.json."""
-    log_data = {
-        "visited_urls": list(visited_urls),
-        "word_counts": word_counts,
+   # updates our count of words, takes a token list or {word: count} for a page and
+   # returns this page's counts for the log
+    if isinstance(tokens, dict):
+        page_counts = tokens
+    else:
+        page_counts = {}
+        for word in tokens:
+            page_counts[word] = page_counts.get(word, 0) + 1
+    word_counts.update(page_counts)
+    return page_counts
+
+
+def configure_log(checkpoint_pages, checkpoint_secs, fresh=False):
+    """Sets how often page records are flushed; fresh=True drops the old log."""
+    global state_log
+    state_log = StateLog(LOG_FILE, checkpoint_pages, checkpoint_secs)
+    if fresh:
+        state_log.remove()
+
+
+def reset_stats():
+    """Empties every stat, for rebuilding them in the same process (reanalyze.py)."""
+    global visited_urls, visited_hashes, content_digests, word_counts, longest_page
+    with state_lock:
+        visited_urls = SeenSet()
+        visited_hashes = SimHashIndex(max_k=SIMHASH_THRESHOLD - 1)
+        content_digests = SeenSet()
+        word_counts = COUNTERS[WORD_COUNTER]()
+        longest_page = (None, 0)
+        for stats in (duplicates, subdomains, gate_rejections):
+            stats.clear()
+        url_queue.clear()
+
+
+def _full_state():
+    return {
+        "visited_digests": visited_urls.dump(),
         "subdomains": subdomains,
-        "longest_page": longest_page
+        "longest_page": longest_page,
+        "content_digests": content_digests.dump(),
+        "duplicates": duplicates
     }
-    with open(LOG_FILE, "w") as file:
-        json.dump(log_data, file)
+
+
+def _replay_record(record):
+    # applies one page record from the log, same updates scraper() made
+    global longest_page
+    url = record["url"]
+    if record["tracked"]:
+        visited_urls.add(url)
+        domain = urlparse(url).netloc
+        subdomains[domain] = subdomains.get(domain, 0) + 1
+    word_counts.update(record["words"])
+    if record["word_count"] > longest_page[1]:
+        longest_page = (url, record["word_count"])
+    visited_urls.update(record["new_urls"])
+    if "digest" in record:  # logs from before the digests don't have them
+        content_digests.add_digest(record["digest"])
+    if record.get("duplicate"):
+        duplicates[record["duplicate"]] += 1
+
+
+def get_report(domain="ics.uci.edu"):
+    """The report.txt text from the current stats."""
+    with state_lock:
+        return format_report(sum(subdomains.values()), longest_page, word_counts.top(50), subdomains, domain)
+
+
+def format_report(unique_pages, longest, top_words, subdomain_counts, domain="ics.uci.edu"):
+    lines = [f"Total Unique Pages: {unique_pages}",
+             f"Longest Page: {longest[0]} with {longest[1]} words",
+             "",
+             f"Top {len(top_words)} Most Common Words:"]
+    lines += [f"{word}: {count}" for word, count in top_words]
+    lines += ["", f"Subdomains in {domain}:"]
+    # alphabetical, like the assignment asks
+    lines += [f"{name}, {count}" for name, count in sorted(subdomain_counts.items())
+              if name == domain or name.endswith("." + domain)]
+    return "\n".join(lines) + "\n"
+
+
+def save_log(record=None):
+    """Adds a page record to the log, or with no record writes a full snapshot."""
+    with SAVE_LOG_TIME.time():
+        _save_log(record)
+
+def _save_log(record):
+    if record is not None:
+        state_log.append(record)
+        if not state_log.needs_compaction():
+            return
+    if isinstance(word_counts, WordCounts):
+        # one word per line after the rest of the state, report.py reads them in pieces
+        state_log.write_snapshot(_full_state(), words=word_counts.counts)
+    else:
+        state_log.write_snapshot(dict(_full_state(), word_counts=word_counts.to_state()))
 
 def load_log():
-    """Loads from the previous crawl's .json."""
-    global visited_urls, word_counts, subdomains, longest_page
+    """Loads from the previous crawl's snapshot and replays the page records after it."""
+    global visited_urls, word_counts, subdomains, longest_page, content_digests
     try:
-        with open(LOG_FILE, "r") as file:
-            log_data = json.load(file)
-            visited_urls = set(log_data["visited_urls"])
-            word_counts.update(log_data["word_counts"])
+        log_data, records = state_log.load()
+        if log_data:
+            visited_urls = SeenSet()
+            if "visited_digests" in log_data:
+                visited_urls.load(log_data["visited_digests"])
+            else:
+                visited_urls.update(log_data["visited_urls"]) # logs from before digests
+            word_counts = COUNTERS[WORD_COUNTER]()
+            if "words" in log_data:
+                word_counts.update(log_data["words"])  # exact counts
+            else:
+                word_counts.load(log_data["word_counts"])
             subdomains.update(log_data["subdomains"])
             longest_page = tuple(log_data["longest_page"])
-            print("Previous crawl state loaded.")
+            content_digests = SeenSet()
+            content_digests.load(log_data.get("content_digests", ""))
+            duplicates.update(log_data.get("duplicates", {}))
+        for record in records:
+            _replay_record(record)
+        print(f"Previous crawl state loaded ({len(records)} records after the snapshot).")
 
     except FileNotFoundError:
         print("No previous log file found. Starting fresh crawl.")
@@ -1,5 +1,13 @@
 import re
 import hashlib
+from itertools import combinations
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, make_simhash_batch falls back to make_simhash
+    np = None
+
+HAVE_NUMPY = np is not None
 
 def make_features(input_str, length=3):
     input_str = input_str.lower()
@@ -30,4 +38,170 @@ def make_simhash(input_str, hash_size=64):
 
 def simhash_diff(hash_1, hash_2):
     x = hash_1 ^ hash_2
-    return bin(x).count('1')
\ No newline at end of file
+    return bin(x).count('1')
+
+
+# NumPy engine: same trigram features as make_features, but every trigram of a
+# document is hashed at once (splitmix64 on the packed code points instead of md5)
+# and the bit votes are one matrix reduction instead of a 64 step loop per feature.
+# Fingerprints are not bit-for-bit equal to make_simhash since the feature hash is
+# different, so don't mix the two engines in one SimHashIndex.
+CHUNK_FEATURES = 1 << 16  # rows of the bit matrix handled at once (64 bytes each)
+
+
+def _feature_hashes(input_str, length=3):
+    out_str = re.sub(r'[^\w]+', '', input_str.lower())
+    codes = np.frombuffer(out_str.encode("utf-32-le"), dtype="<u4").astype(np.uint64)
+    n = len(codes)
+    if n < length:
+        # make_features gives a single (short or empty) feature here
+        codes = np.concatenate([codes, np.zeros(length - n, dtype=np.uint64)])
+        n = length
+    # pack each window of code points into one uint64 (21 bits per code point)
+    keys = np.zeros(n - length + 1, dtype=np.uint64)
+    for j in range(length):
+        keys = (keys << np.uint64(21)) | codes[j:n - length + 1 + j]
+    # splitmix64 finalizer
+    z = keys + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def _bit_counts(hashes):
+    # number of set bits at each of the 64 positions, summed over all rows
+    counts = np.zeros(64, dtype=np.int64)
+    for start in range(0, len(hashes), CHUNK_FEATURES):
+        chunk = hashes[start:start + CHUNK_FEATURES].astype("<u8")
+        bits = np.unpackbits(chunk.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+        counts += bits.sum(axis=0, dtype=np.int64)
+    return counts
+
+
+def _votes_to_simhash(counts, total):
+    # bit i is set when more features had it set than not (v[i] > 0 in make_simhash)
+    bits = (2 * counts > total).astype(np.uint8)
+    return int.from_bytes(np.packbits(bits, bitorder="little").tobytes(), "little")
+
+
+def make_simhash_batch(texts):
+    """Fingerprints for a list of texts, hashed together in as few numpy calls as possible."""
+    if not HAVE_NUMPY:
+        return [make_simhash(text) for text in texts]
+
+    results = [0] * len(texts)
+    group, group_hashes, group_size = [], [], 0
+
+    def flush():
+        # unpack the whole group at once, then each document is a slice of the matrix
+        hashes = np.concatenate(group_hashes)
+        bits = np.unpackbits(hashes.astype("<u8").view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+        start = 0
+        for idx, hashes_for_doc in zip(group, group_hashes):
+            end = start + len(hashes_for_doc)
+            counts = bits[start:end].sum(axis=0, dtype=np.int64)
+            results[idx] = _votes_to_simhash(counts, end - start)
+            start = end
+
+    for idx, text in enumerate(texts):
+        hashes = _feature_hashes(text)
+        if len(hashes) >= CHUNK_FEATURES:
+            # big page, do it on its own in chunks
+            results[idx] = _votes_to_simhash(_bit_counts(hashes), len(hashes))
+            continue
+        if group_size + len(hashes) > CHUNK_FEATURES:
+            flush()
+            group, group_hashes, group_size = [], [], 0
+        group.append(idx)
+        group_hashes.append(hashes)
+        group_size += len(hashes)
+    if group:
+        flush()
+    return results
+
+
+def make_simhash_fast(input_str):
+    if not HAVE_NUMPY:
+        return make_simhash(input_str)
+    hashes = _feature_hashes(input_str)
+    return _votes_to_simhash(_bit_counts(hashes), len(hashes))
+
+
+class SimHashIndex(object):
+    # Near duplicate lookup for fingerprints (Manku et al. "Detecting near-duplicates
+    # for web crawling"). The fingerprint is cut into `blocks` pieces; if two hashes
+    # differ in at most max_k bits then at least (blocks - max_k) pieces are the same,
+    # so we keep one table per combination of (blocks - max_k) pieces and only compare
+    # against fingerprints that share that key. Same answers as a linear scan.
+    def __init__(self, max_k=4, hash_size=64, blocks=None):
+        if blocks is None:
+            blocks = max_k + 2
+        if not max_k < blocks <= hash_size:
+            raise ValueError("need max_k < blocks <= hash_size")
+        self.max_k = max_k
+        self.hash_size = hash_size
+        self.fingerprints = set()
+
+        # split the bits as evenly as possible
+        masks = []
+        start = 0
+        for i in range(blocks):
+            width = hash_size // blocks + (1 if i < hash_size % blocks else 0)
+            masks.append(((1 << width) - 1) << start)
+            start += width
+
+        self.key_masks = []
+        for combo in combinations(masks, blocks - max_k):
+            key_mask = 0
+            for mask in combo:
+                key_mask |= mask
+            self.key_masks.append(key_mask)
+        self.tables = [{} for _ in self.key_masks]
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    def __contains__(self, fingerprint):
+        return fingerprint in self.fingerprints
+
+    def __iter__(self):
+        return iter(self.fingerprints)
+
+    def add(self, fingerprint):
+        if fingerprint in self.fingerprints:
+            return
+        self.fingerprints.add(fingerprint)
+        for key_mask, table in zip(self.key_masks, self.tables):
+            key = fingerprint & key_mask
+            bucket = table.get(key)
+            if bucket is None:
+                table[key] = [fingerprint]
+            else:
+                bucket.append(fingerprint)
+
+    def query_within(self, fingerprint, k=None):
+        # every stored fingerprint with simhash_diff(fingerprint, old) <= k
+        if k is None:
+            k = self.max_k
+        if k > self.max_k:
+            raise ValueError(f"index was built for k <= {self.max_k}")
+        found = set()
+        for key_mask, table in zip(self.key_masks, self.tables):
+            for old in table.get(fingerprint & key_mask, ()):
+                if old not in found and simhash_diff(fingerprint, old) <= k:
+                    found.add(old)
+        return list(found)
+
+    def has_within(self, fingerprint, k=None):
+        # same as bool(query_within(...)) but stops at the first hit
+        if k is None:
+            k = self.max_k
+        if k > self.max_k:
+            raise ValueError(f"index was built for k <= {self.max_k}")
+        if fingerprint in self.fingerprints:
+            return True
+        for key_mask, table in zip(self.key_masks, self.tables):
+            for old in table.get(fingerprint & key_mask, ()):
+                if simhash_diff(fingerprint, old) <= k:
+                    return True
+        return False
@@ -1,5 +1,6 @@
 import sys
 import re
+from collections import Counter
 
 Token = ""
 
@@ -7,9 +8,53 @@ STOPWORDS = {
     "a", "about", "above", "after", "again", "against", "all", "am", "an", "and", "any", "are", "aren't", "as", "at", "be", "because", "been", "before", "being", "below", "between", "both", "but", "by", "can't", "cannot", "could", "couldn't", "did", "didn't", "do", "does", "doesn't", "doing", "don't", "down", "during", "each", "few", "for", "from", "further", "had", "hadn't", "has", "hasn't", "have", "haven't", "having", "he", "he'd", "he'll", "he's", "her", "here", "here's", "hers", "herself", "him", "himself", "his", "how", "how's", "i", "i'd", "i'll", "i'm", "i've", "if", "in", "into", "is", "isn't", "it", "it's", "its", "itself", "let's", "me", "more", "most", "mustn't", "my", "myself", "no", "nor", "not", "of", "off", "on", "once", "only", "or", "other", "ought", "our", "ours", "ourselves", "out", "over", "own", "same", "shan't", "she", "she'd", "she'll", "she's", "should", "shouldn't", "so", "some", "such", "than", "that", "that's", "the", "their", "theirs", "them", "themselves", "then", "there", "there's", "these", "they", "they'd", "they'll", "they're", "they've", "this", "those", "through", "to", "too", "under", "until", "up", "very", "was", "wasn't", "we", "we'd", "we'll", "we're", "we've", "were", "weren't", "what", "what's", "when", "when's", "where", "where's", "which", "while", "who", "who's", "whom", "why", "why's", "with", "won't", "would", "wouldn't", "you", "you'd", "you'll", "you're", "you've", "your", "yours", "yourself", "yourselves"
 }
 
-def tokenize(text: str) -> list[Token]:
-    regex_pattern = re.compile(r"[A-Za-z0-9]+")
-    return [word.lower() for word in regex_pattern.findall(text) if word.lower() not in STOPWORDS]
+# Tokens are runs of ASCII letters and digits ([A-Za-z0-9]+, lowercased). Instead
+# of a regex the text goes through one ASCII encode (anything else becomes "?"),
+# one lowercase pass and a byte table that turns every other char into a space,
+# then a plain split(); same tokens, about half the work.
+_WORD_CHARS = b"0123456789abcdefghijklmnopqrstuvwxyz"
+SEPARATORS = bytes(c if c in _WORD_CHARS else 32 for c in range(256))
+WORD_BOUNDARY = re.compile(r"[^A-Za-z0-9]")
+CHUNK_SIZE = 1 << 16  # iter_tokens works through huge texts this many chars at a time
+
+def _words(text: str) -> list[Token]:
+    return text.encode("ascii", "replace").lower().translate(SEPARATORS).decode("ascii").split()
+
+def _keep(token: Token, min_length: int, drop_numeric: bool) -> bool:
+    return (len(token) >= min_length and token not in STOPWORDS
+            and not (drop_numeric and token.isdigit()))
+
+def tokenize(text: str, min_length: int = 1, drop_numeric: bool = False) -> list[Token]:
+    tokens = _words(text)
+    if min_length <= 1 and not drop_numeric:
+        return [word for word in tokens if word not in STOPWORDS]
+    return [word for word in tokens if _keep(word, min_length, drop_numeric)]
+
+def iter_tokens(text: str, min_length: int = 1, drop_numeric: bool = False):
+    # same tokens as tokenize() but a chunk at a time, so a huge page never turns
+    # into one big lowercase copy and token list
+    start = 0
+    while start < len(text):
+        # don't cut a word in half, move the cut on to the next non word char
+        boundary = WORD_BOUNDARY.search(text, start + CHUNK_SIZE)
+        end = boundary.end() if boundary else len(text)
+        for word in _words(text[start:end]):
+            if _keep(word, min_length, drop_numeric):
+                yield word
+        start = end
+
+def tokenize_and_count(text: str, min_length: int = 1, drop_numeric: bool = False) -> Counter:
+    # {token: count} straight from the text, stopwords and filters applied to the
+    # distinct words after counting instead of to every token
+    counts = Counter(_words(text))
+    dropped = STOPWORDS.intersection(counts)
+    if min_length > 1:
+        dropped.update(word for word in counts if len(word) < min_length)
+    if drop_numeric:
+        dropped.update(word for word in counts if word.isdigit())
+    for word in dropped:
+        del counts[word]
+    return counts
 
 def compute_word_frequencies(tokens: list[Token]) -> dict[Token, int]:
     token_dict = {}
@@ -0,0 +1,91 @@
+# Precompiled url checks for scraper.is_valid / scraper.is_trap. Everything is
+# built once: trap patterns that are plain strings become substring checks and the
+# rest are compiled, the allowed domains are a set of suffixes, the blocked
+# extensions a set. classify() gives a reason code instead of a bool and remembers
+# its answers for the most recent urls.
+import re
+from functools import lru_cache
+from urllib.parse import urlparse
+
+OK = "ok"
+BAD_SCHEME = "bad_scheme"
+BAD_DOMAIN = "bad_domain"
+BAD_EXTENSION = "bad_extension"
+TRAP = "trap"
+INVALID = (BAD_SCHEME, BAD_DOMAIN, BAD_EXTENSION)  # what is_valid rejects
+REGEX_SPECIAL = set(".^$*+?{}[]()|")
+
+
+def as_literal(pattern):
+    ''' The plain string a pattern matches (the pattern for a literal "?share="
+    gives "?share="), or None if it really needs the regex engine. '''
+    chars = []
+    escaped = False
+    for char in pattern:
+        if escaped:
+            if char.isalnum():
+                return None  # \d, \w, ...
+            chars.append(char)
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char in REGEX_SPECIAL:
+            return None
+        else:
+            chars.append(char)
+    return None if escaped else "".join(chars)
+
+
+class UrlClassifier(object):
+    def __init__(self, allowed_domains, blocked_extensions, trap_patterns,
+                 schemes=("http", "https"), cache_size=1 << 16):
+        self.schemes = frozenset(schemes)
+        # ".ics.uci.edu" style suffixes are looked up at each "." of the netloc,
+        # anything else falls back to endswith
+        self.domain_suffixes = frozenset(d for d in allowed_domains if d.startswith("."))
+        self.other_domains = tuple(d for d in allowed_domains if not d.startswith("."))
+        self.blocked_extensions = frozenset(blocked_extensions)
+        # substring checks are much cheaper than re.search (or one big alternation,
+        # which loses the literal prefix scan), so only real regexes go to re
+        self.trap_checks = []
+        for pattern in trap_patterns:
+            literal = as_literal(pattern)
+            if literal is not None:
+                self.trap_checks.append((pattern, literal, None))
+            else:
+                self.trap_checks.append((pattern, None, re.compile(pattern).search))
+        self.classify = lru_cache(maxsize=cache_size)(self._classify)
+        self.trap_pattern = lru_cache(maxsize=cache_size)(self._trap_pattern)
+
+    def allowed_domain(self, netloc):
+        dot = netloc.find(".")
+        while dot != -1:
+            if netloc[dot:] in self.domain_suffixes:
+                return True
+            dot = netloc.find(".", dot + 1)
+        return bool(self.other_domains) and netloc.endswith(self.other_domains)
+
+    def blocked_extension(self, path):
+        # same as re.match(r".*\.(ext|...)$", path.lower())
+        dot = path.rfind(".")
+        return dot != -1 and path[dot + 1:].lower() in self.blocked_extensions
+
+    def _trap_pattern(self, url):
+        ''' The trap pattern the url matches, or None. '''
+        for pattern, literal, search in self.trap_checks:
+            if (literal in url) if search is None else search(url):
+                return pattern
+        return None
+
+    def _classify(self, url):
+        ''' One of OK, BAD_SCHEME, BAD_DOMAIN, BAD_EXTENSION, TRAP. '''
+        parsed = urlparse(url)
+        if parsed.scheme not in self.schemes:
+            return BAD_SCHEME
+        if not self.allowed_domain(parsed.netloc):
+            return BAD_DOMAIN
+        if self.blocked_extension(parsed.path):
+            return BAD_EXTENSION
+        if self.trap_pattern(url):
+            return TRAP
+        return OK
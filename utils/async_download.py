@@ -0,0 +1,119 @@
+import asyncio
+from urllib.parse import urlencode
+
+from utils.response import Response
+from utils.download import DECODE_TIME
+
+# asyncio version of utils.download.download. Requests go over a bounded pool of
+# keep-alive HTTP/1.1 connections to the cache server, so many urls can be in
+# flight from one thread and no connection is opened per url. A pooled
+# connection the server closed while it sat idle fails before any byte of an
+# answer: the request goes again once on a new connection (requests/urllib3, the
+# threaded path, do the same) instead of failing the url.
+
+
+class AsyncDownloader(object):
+    def __init__(self, config, pool_size=8, timeout=30.0, logger=None):
+        self.host, self.port = config.cache_server
+        self.user_agent = config.user_agent
+        self.recorder = getattr(config, "recorder", None)  # launch.py --record
+        self.timeout = timeout
+        self.logger = logger
+        self.pool_size = pool_size
+        self.idle = []        # open connections nobody is using
+        self.slots = None     # semaphore, created inside the running loop
+
+    async def fetch(self, url):
+        ''' Same result as download(url, config), a Response for the url. '''
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.pool_size)
+        async with self.slots:
+            try:
+                status, body = await asyncio.wait_for(self._get(url), self.timeout)
+            except asyncio.TimeoutError:
+                return self._error(url, f"Timed out after {self.timeout}s", 0)
+            except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+                return self._error(url, f"Connection error {e!r}", 0)
+        if self.recorder is not None and status == 200 and body:
+            self.recorder.record(url, body)
+        try:
+            if status == 200 and body:
+                with DECODE_TIME.time():
+                    return Response.from_payload(body)
+        except (EOFError, ValueError):
+            pass
+        return self._error(url, f"<Response [{status}]>", status)
+
+    def _error(self, url, reason, status):
+        message = f"Spacetime Response error {reason} with url {url}."
+        if self.logger:
+            self.logger.error(message)
+        return Response({"error": message, "status": status, "url": url})
+
+    async def _get(self, url, fresh=False):
+        reused = bool(self.idle) and not fresh
+        reader, writer = self.idle.pop() if reused else await asyncio.open_connection(self.host, self.port)
+        try:
+            query = urlencode([("q", url), ("u", self.user_agent)])
+            try:
+                writer.write(
+                    f"GET /?{query} HTTP/1.1\r\n"
+                    f"Host: {self.host}:{self.port}\r\n"
+                    f"User-Agent: python-asyncio\r\n"
+                    f"Accept-Encoding: identity\r\n"
+                    f"Connection: keep-alive\r\n\r\n".encode("latin-1"))
+                await writer.drain()
+                status_line = await reader.readline()
+            except ConnectionError:
+                if not reused:
+                    raise
+                status_line = b""  # reset instead of closed, same thing
+            if not status_line and reused:
+                writer.close()
+                return await self._get(url, fresh=True)  # closed while idle, nothing was answered
+            status, body, keep_alive = await self._read_response(reader, status_line)
+        except BaseException:
+            # half used connection, don't give it back to the pool
+            writer.close()
+            raise
+        if keep_alive:
+            self.idle.append((reader, writer))
+        else:
+            writer.close()
+        return status, body
+
+    @staticmethod
+    async def _read_response(reader, status_line):
+        if not status_line:
+            raise asyncio.IncompleteReadError(b"", None)
+        version, status = status_line.split(None, 2)[:2]
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = headers.get("connection", "").lower() != "close" and version != b"HTTP/1.0"
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            body = b"".join(chunks)
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await reader.read()
+            keep_alive = False
+        return int(status), body, keep_alive
+
+    def close(self):
+        for reader, writer in self.idle:
+            writer.close()
+        self.idle = []
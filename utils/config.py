@@ -9,11 +9,57 @@ class Config(object):
         assert re.match(r"^[a-zA-Z0-9_ ,]+$", self.user_agent), "User agent should not have any special characters outside '_', ',' and 'space'"
         self.threads_count = int(config["LOCAL PROPERTIES"]["THREADCOUNT"])
         self.save_file = config["LOCAL PROPERTIES"]["SAVE"]
+        # frontier storage backend (see crawler/storage.py) and its write batching
+        self.frontier_store = config["LOCAL PROPERTIES"].get("STORE", "shelve").strip()
+        self.store_batch_size = int(config["LOCAL PROPERTIES"].get("STOREBATCH", "500"))
+        self.store_batch_secs = float(config["LOCAL PROPERTIES"].get("STOREBATCHSECONDS", "5"))
+        # put a Bloom filter in front of the frontier's seen set
+        self.seen_bloom = config["LOCAL PROPERTIES"].get("SEENBLOOM", "false").strip().lower() == "true"
+        # how often the crawl stats log is flushed (pages / seconds)
+        self.checkpoint_pages = int(config["LOCAL PROPERTIES"].get("CHECKPOINTPAGES", "50"))
+        self.checkpoint_secs = float(config["LOCAL PROPERTIES"].get("CHECKPOINTSECONDS", "30"))
+        # metrics (utils/metrics.py): JSON snapshot file and how often, localhost port (0 = off)
+        self.metrics_file = config["LOCAL PROPERTIES"].get("METRICSFILE", "metrics.json").strip()
+        self.metrics_secs = float(config["LOCAL PROPERTIES"].get("METRICSSECONDS", "10"))
+        self.metrics_port = int(config["LOCAL PROPERTIES"].get("METRICSPORT", "0"))
+        # keep every downloaded page in a page store (utils/page_store.py), empty = off
+        self.page_store = config["LOCAL PROPERTIES"].get("PAGESTORE", "").strip()
+        self.page_store_compress = int(config["LOCAL PROPERTIES"].get("PAGESTORECOMPRESS", "0"))
 
         self.host = config["CONNECTION"]["HOST"]
         self.port = int(config["CONNECTION"]["PORT"])
 
         self.seed_urls = config["CRAWLER"]["SEEDURL"].split(",")
         self.time_delay = float(config["CRAWLER"]["POLITENESS"])
+        # per host delay (crawler/rate_control.py): "adaptive" or "fixed" (always POLITENESS)
+        self.rate_control = config["CRAWLER"].get("RATECONTROL", "adaptive").strip()
+        self.delay_floor = float(config["CRAWLER"].get("POLITENESSFLOOR", str(self.time_delay)))
+        self.delay_ceiling = float(config["CRAWLER"].get("POLITENESSCEILING", "60"))
+        self.circuit_errors = int(config["CRAWLER"].get("CIRCUITERRORS", "5"))
+        self.circuit_secs = float(config["CRAWLER"].get("CIRCUITSECONDS", "300"))
+        # which url goes next per host: "lifo" (newest first) or "priority" (crawler/scoring.py)
+        self.frontier_order = config["CRAWLER"].get("FRONTIERORDER", "priority").strip()
+        # robots.txt (crawler/robots.py): on/off, hosts kept, seconds kept, fetch threads,
+        # urls taken from each host's sitemaps (0 = none)
+        self.robots = config["CRAWLER"].get("ROBOTS", "true").strip().lower() == "true"
+        self.robots_cache = int(config["CRAWLER"].get("ROBOTSCACHE", "5000"))
+        self.robots_ttl = float(config["CRAWLER"].get("ROBOTSTTL", "86400"))
+        self.robots_fetchers = int(config["CRAWLER"].get("ROBOTSFETCHERS", "2"))
+        self.sitemap_urls = int(config["CRAWLER"].get("SITEMAPURLS", "5000"))
+        # "threads" (THREADCOUNT Worker threads) or "async" (one asyncio AsyncWorker)
+        self.downloader = config["CRAWLER"].get("DOWNLOADER", "threads").strip()
+        self.async_concurrency = int(config["CRAWLER"].get("ASYNCCONCURRENCY", "16"))
+        self.download_timeout = float(config["CRAWLER"].get("DOWNLOADTIMEOUT", "30"))
+        # parse pages in a process pool (0 = parse on the worker thread)
+        self.parse_processes = int(config["CRAWLER"].get("PARSEPROCESSES", "0"))
+        self.parse_queue_size = int(config["CRAWLER"].get("PARSEQUEUE", "64"))
+        # crawl budget (0 = no limit) and how long a stop waits for the pages in
+        # flight (crawler/shutdown.py)
+        self.max_seconds = float(config["CRAWLER"].get("MAXSECONDS", "0"))
+        self.max_pages = int(config["CRAWLER"].get("MAXPAGES", "0"))
+        self.max_bytes = int(config["CRAWLER"].get("MAXBYTES", "0"))
+        self.drain_secs = float(config["CRAWLER"].get("DRAINSECONDS", "30"))
 
-        self.cache_server = None
\ No newline at end of file
+        self.cache_server = None
+        self.recorder = None  # utils.replay.CorpusWriter with launch.py --record
+        self.shard = None  # crawler.sharding.ShardNode with launch.py --shards
\ No newline at end of file
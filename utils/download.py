@@ -1,17 +1,34 @@
 import requests
-import cbor
 import time
+import threading
 
 from utils.response import Response
+from utils.metrics import metrics
+
+# one keep-alive session per worker thread instead of a new connection per url
+_local = threading.local()
+DECODE_TIME = metrics.histogram("decode_seconds", "reading the cache server's payload (the pickle is left for later)")
+
+
+def _session():
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+    return session
+
 
 def download(url, config, logger=None):
     host, port = config.cache_server
-    resp = requests.get(
+    resp = _session().get(
         f"http://{host}:{port}/",
         params=[("q", f"{url}"), ("u", f"{config.user_agent}")])
+    recorder = getattr(config, "recorder", None)
+    if recorder is not None and resp.content:
+        recorder.record(url, resp.content)  # launch.py --record, see utils/replay.py
     try:
         if resp and resp.content:
-            return Response(cbor.loads(resp.content))
+            with DECODE_TIME.time():
+                return Response.from_payload(resp.content)
     except (EOFError, ValueError) as e:
         pass
     logger.error(f"Spacetime Response error {resp} with url {url}.")
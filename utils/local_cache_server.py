@@ -0,0 +1,93 @@
+import time
+import pickle
+import random
+from threading import Thread
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import cbor
+import requests
+
+# Stand-in for the spacetime cache server, for benchmarks and offline runs. It
+# answers GET /?q=<url>&u=<useragent> with the same CBOR payload the real server
+# sends: {"url", "status", "response": pickled requests.Response} or {"error"}.
+
+
+def make_raw_response(url, status, content, headers=None):
+    raw = requests.models.Response()
+    raw.url = url
+    raw.status_code = status
+    raw._content = content
+    raw.headers.update(headers or {"Content-Type": "text/html; charset=utf-8"})
+    return raw
+
+
+def encode_payload(url, status, content=None, headers=None, error=None):
+    resp_dict = {"url": url, "status": status}
+    if error is not None:
+        resp_dict["error"] = error
+    if content is not None:
+        resp_dict["response"] = pickle.dumps(make_raw_response(url, status, content, headers))
+    return cbor.dumps(resp_dict)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # lots of clients connect at once
+
+
+class LocalCacheServer(object):
+    ''' `pages` is a callable url -> (status, content bytes, headers) or the cbor
+    payload bytes directly. Each request waits `latency` seconds first and fails
+    with a 5xx / 6xx reply with probability `error_rate`. With `idle_timeout` a
+    keep-alive connection left idle that long is closed, like real servers do. '''
+    def __init__(self, pages, latency=0.0, error_rate=0.0, host="127.0.0.1", port=0, idle_timeout=None):
+        self.pages = pages
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real server
+            disable_nagle_algorithm = True  # headers and body go out as two writes
+            timeout = idle_timeout  # handle() gives up on the connection after this
+
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                url = query.get("q", [""])[0]
+                server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                body = server.payload_for(url)
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = _Server((host, port), Handler)
+        self.address = self.httpd.server_address[:2]
+        self.thread = None
+
+    def payload_for(self, url):
+        if self.error_rate and random.random() < self.error_rate:
+            if random.random() < 0.5:
+                return encode_payload(url, 500, b"")
+            return encode_payload(url, 604, error="Simulated cache server error.")
+        page = self.pages(url)
+        if isinstance(page, bytes):
+            return page
+        status, content, headers = page
+        return encode_payload(url, status, content, headers)
+
+    def start(self):
+        self.thread = Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self.address
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,280 @@
+import json
+import os
+import time
+from bisect import bisect_left
+from threading import Lock, Thread, Event
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Crawl metrics. Modules make their metrics once at import time from the shared
+# `metrics` registry and update them on the hot path:
+#   PAGES = metrics.counter("pages_total", "pages downloaded", label="status")
+#   PAGES.inc(label_value="200")
+#   with DOWNLOAD_TIME.time(): ...
+# An update is a lock and an add (a histogram also does a bisect), about a
+# microsecond, against milliseconds of work per page. MetricsReporter writes
+# JSON snapshots every few seconds and serves the Prometheus text format on
+# localhost.
+
+# seconds, for the stage timers
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Counter(object):
+    kind = "counter"
+
+    def __init__(self, name, help="", label=None):
+        self.name = name
+        self.help = help
+        self.label = label  # name of the one label, e.g. "reason"
+        self.values = {}
+        self.lock = Lock()
+
+    def inc(self, amount=1, label_value=""):
+        with self.lock:
+            self.values[label_value] = self.values.get(label_value, 0) + amount
+
+    def value(self, label_value=""):
+        return self.values.get(label_value, 0)
+
+    def total(self):
+        return sum(self.values.values())
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.values) if self.label else self.values.get("", 0)
+
+
+class Gauge(object):
+    ''' A value read when the metrics are collected, from `read()` (a number, or
+    {label value: number} when the gauge has a label), or set by hand. '''
+    kind = "gauge"
+
+    def __init__(self, name, help="", read=None, label=None):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.label = label
+        self.current = 0
+
+    def set(self, value):
+        self.current = value
+
+    def snapshot(self):
+        if self.read is None:
+            return self.current
+        try:
+            return self.read()
+        except Exception:
+            return None  # whatever it reads from may be gone at shutdown
+
+
+class _Timer(object):
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Histogram(object):
+    kind = "histogram"
+
+    def __init__(self, name, help="", buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = None
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.lock = Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def time(self):
+        ''' with histogram.time(): ... observes how long the block took. '''
+        return _Timer(self)
+
+    def quantile(self, q):
+        ''' Estimate from the buckets, linear inside the bucket it falls in. '''
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, self.counts):
+            if count and seen + count >= rank:
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return self.buckets[-1]  # past the last bucket, the best we can say
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "count": self.count,
+                "sum": self.sum,
+                "mean": self.sum / self.count if self.count else 0.0,
+                "p50": self.quantile(0.5),
+                "p99": self.quantile(0.99),
+            }
+
+
+class Registry(object):
+    def __init__(self):
+        self.metrics = {}
+        self.lock = Lock()
+        self.started = time.time()
+
+    def _get(self, cls, name, *args, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already a {metric.kind}.")
+            return metric
+
+    def counter(self, name, help="", label=None):
+        return self._get(Counter, name, help, label)
+
+    def histogram(self, name, help="", buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help, buckets)
+
+    def gauge(self, name, help="", read=None, label=None):
+        gauge = self._get(Gauge, name, help, None, label)
+        if read is not None:
+            gauge.read = read  # the newest owner wins, e.g. a restarted Frontier
+        return gauge
+
+    def snapshot(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return {
+            "time": time.time(),
+            "uptime": time.time() - self.started,
+            "metrics": {metric.name: metric.snapshot() for metric in metrics},
+        }
+
+    def prometheus(self):
+        ''' Everything in the Prometheus text exposition format. '''
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            name = f"crawler_{metric.name}"
+            if metric.help:
+                lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            if isinstance(metric, Histogram):
+                with metric.lock:
+                    counts, total, count = list(metric.counts), metric.sum, metric.count
+                cumulative = 0
+                for bound, bucket in zip(metric.buckets + (float("inf"),), counts):
+                    cumulative += bucket
+                    edge = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{name}_bucket{{le="{edge}"}} {cumulative}')
+                lines.append(f"{name}_sum {total}")
+                lines.append(f"{name}_count {count}")
+                continue
+            value = metric.snapshot()
+            if isinstance(value, dict):
+                for label_value, number in sorted(value.items()):
+                    escaped = str(label_value).replace("\\", "\\\\").replace('"', '\\"')
+                    lines.append(f'{name}{{{metric.label}="{escaped}"}} {number}')
+            elif value is not None:
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Registry()
+
+
+class MetricsReporter(object):
+    ''' Writes metrics.snapshot() (plus per second rates of the counters since
+    the last one) to `path` every `interval` seconds, and serves
+    registry.prometheus() at http://127.0.0.1:`port`/metrics if port is set. '''
+    def __init__(self, registry=metrics, path=None, interval=10.0, port=0):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self.port = port
+        self.stopped = Event()
+        self.last = None
+        self.thread = None
+        self.server = None
+
+    def start(self):
+        if self.path:
+            self.thread = Thread(target=self._run, daemon=True)
+            self.thread.start()
+        if self.port:
+            registry = self.registry
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split("?")[0] not in ("/", "/metrics"):
+                        self.send_error(404)
+                        return
+                    body = registry.prometheus().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args):
+                    pass  # scrapes every few seconds would flood the console
+
+            self.server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+            self.server.daemon_threads = True
+            Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.write()
+
+    def write(self):
+        snapshot = self.registry.snapshot()
+        snapshot["rates"] = self._rates(snapshot)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as file:
+            json.dump(snapshot, file, indent=1)
+        os.replace(tmp, self.path)
+
+    def _rates(self, snapshot):
+        totals = {}
+        for name, value in snapshot["metrics"].items():
+            if isinstance(self.registry.metrics.get(name), Counter):
+                totals[name] = sum(value.values()) if isinstance(value, dict) else value
+        rates = {}
+        if self.last is not None:
+            elapsed = max(snapshot["time"] - self.last[0], 1e-9)
+            for name, total in totals.items():
+                rates[f"{name}_per_sec"] = (total - self.last[1].get(name, 0)) / elapsed
+        self.last = (snapshot["time"], totals)
+        return rates
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+        if self.path:
+            self.write()  # the final numbers
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
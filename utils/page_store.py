@@ -0,0 +1,287 @@
+import os
+import mmap
+import zlib
+from array import array
+from collections import namedtuple
+from threading import Lock
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+# Append-only store of downloaded pages, so the stats can be recomputed later
+# without crawling again (see reanalyze.py). A store is a directory with
+#   bodies.bin   the page bodies back to back, each one zlib'd if compress > 0
+#   urls.bin     the urls back to back, utf-8
+#   types.txt    one Content-Type per line, the type column points into it
+#   <column>.col one fixed-width array per column below, row i is page i
+# Bodies and urls are written before the columns, so a crash can only leave a
+# partial last row, which the reader ignores and the writer cuts off. Readers
+# mmap every file and hand out memoryview slices, nothing is copied until a
+# compressed body is inflated.
+
+COLUMNS = (
+    ("body_offset", "Q"),
+    ("body_length", "I"),  # bytes in bodies.bin
+    ("raw_length", "I"),  # bytes before compression, the page's real size
+    ("url_offset", "Q"),
+    ("url_length", "I"),
+    ("status", "H"),
+    ("flags", "B"),
+    ("content_type", "H"),
+    ("simhash", "Q"),  # 0 for pages that were never analyzed
+    ("word_count", "I"),
+)
+COMPRESSED = 1  # flags bit
+
+PageRecord = namedtuple("PageRecord", "index url status content_type length simhash word_count")
+
+
+def _column_path(path, name):
+    return os.path.join(path, f"{name}.col")
+
+
+def _rows(path):
+    ''' Complete rows in the store, the shortest column decides. '''
+    rows = None
+    for name, typecode in COLUMNS:
+        column = _column_path(path, name)
+        size = os.path.getsize(column) if os.path.exists(column) else 0
+        count = size // array(typecode).itemsize
+        rows = count if rows is None else min(rows, count)
+    return rows
+
+
+class PageStore(object):
+    ''' Writer. add() is thread safe; rows are written every `batch` pages and
+    on flush()/close(). '''
+    def __init__(self, path, compress=0, batch=64, fresh=False):
+        self.path = path
+        self.compress = compress  # zlib level, 0 stores bodies as they are
+        self.batch = batch
+        self.lock = Lock()
+        os.makedirs(path, exist_ok=True)
+        if fresh:
+            self.remove(path)
+        self.rows = _rows(path)
+        self._truncate()
+        self.types = self._load_types()
+        self.bodies = open(os.path.join(path, "bodies.bin"), "ab")
+        self.urls = open(os.path.join(path, "urls.bin"), "ab")
+        self.body_end = self.bodies.tell()
+        self.url_end = self.urls.tell()
+        self.pending = {name: array(typecode) for name, typecode in COLUMNS}
+        self.pending_bodies = []
+        self.pending_urls = []
+
+    @staticmethod
+    def remove(path):
+        names = ["bodies.bin", "urls.bin", "types.txt"] + [f"{name}.col" for name, _ in COLUMNS]
+        for name in names:
+            if os.path.exists(os.path.join(path, name)):
+                os.remove(os.path.join(path, name))
+
+    def _truncate(self):
+        # cut every file back to the last complete row (after a crash mid-write)
+        last = {}
+        for name, typecode in COLUMNS:
+            column = _column_path(self.path, name)
+            values = array(typecode)
+            if os.path.exists(column):
+                with open(column, "rb") as file:
+                    values.frombytes(file.read(self.rows * values.itemsize))
+            with open(column, "wb") as file:
+                values.tofile(file)
+            last[name] = values[-1] if self.rows else 0
+        ends = {"bodies.bin": last["body_offset"] + last["body_length"],
+                "urls.bin": last["url_offset"] + last["url_length"]}
+        for name, end in ends.items():
+            with open(os.path.join(self.path, name), "ab") as file:
+                file.truncate(end)
+
+    def _load_types(self):
+        path = os.path.join(self.path, "types.txt")
+        if not os.path.exists(path):
+            return {}
+        with open(path, encoding="utf-8") as file:
+            return {line.rstrip("\n"): i for i, line in enumerate(file)}
+
+    def __len__(self):
+        return self.rows + len(self.pending_urls)
+
+    def add(self, url, status, content, content_type="", simhash=None, word_count=0):
+        ''' Appends one page, returns its row number. '''
+        content = content or b""
+        body = zlib.compress(content, self.compress) if self.compress else content
+        url_bytes = url.encode("utf-8")
+        content_type = (content_type or "").replace("\n", " ").strip()
+        with self.lock:
+            type_id = self.types.get(content_type)
+            if type_id is None:
+                type_id = self.types[content_type] = len(self.types)
+                with open(os.path.join(self.path, "types.txt"), "a", encoding="utf-8") as file:
+                    file.write(content_type + "\n")
+            row = {
+                "body_offset": self.body_end,
+                "body_length": len(body),
+                "raw_length": len(content),
+                "url_offset": self.url_end,
+                "url_length": len(url_bytes),
+                "status": status,
+                "flags": COMPRESSED if self.compress else 0,
+                "content_type": type_id,
+                "simhash": simhash or 0,
+                "word_count": word_count,
+            }
+            for name, value in row.items():
+                self.pending[name].append(value)
+            self.pending_bodies.append(body)
+            self.pending_urls.append(url_bytes)
+            self.body_end += len(body)
+            self.url_end += len(url_bytes)
+            index = self.rows + len(self.pending_urls) - 1
+            if len(self.pending_urls) >= self.batch:
+                self._flush()
+        return index
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if not self.pending_urls:
+            return
+        self.bodies.write(b"".join(self.pending_bodies))
+        self.urls.write(b"".join(self.pending_urls))
+        self.bodies.flush()
+        self.urls.flush()
+        for name, values in self.pending.items():
+            with open(_column_path(self.path, name), "ab") as file:
+                values.tofile(file)
+            del values[:]
+        self.rows += len(self.pending_urls)
+        self.pending_bodies = []
+        self.pending_urls = []
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            self.bodies.close()
+            self.urls.close()
+
+
+class PageReader(object):
+    ''' Read side, every file mmapped. Safe to open in many processes at once
+    (and while a PageStore is still appending, it sees the rows up to open). '''
+    def __init__(self, path):
+        self.path = path
+        self.rows = _rows(path)
+        self.maps = []
+        self.views = []
+        self.columns = {}
+        for name, typecode in COLUMNS:
+            view = self._map(_column_path(path, name))
+            size = array(typecode).itemsize
+            self.columns[name] = view[:self.rows * size].cast(typecode)
+        self.bodies = self._map(os.path.join(path, "bodies.bin"))
+        self.urls = self._map(os.path.join(path, "urls.bin"))
+        types = os.path.join(path, "types.txt")
+        if os.path.exists(types):
+            with open(types, encoding="utf-8") as file:
+                self.types = [line.rstrip("\n") for line in file]
+        else:
+            self.types = []
+
+    def _map(self, path):
+        if not os.path.exists(path) or not os.path.getsize(path):
+            return memoryview(b"")  # mmap can't map an empty file
+        with open(path, "rb") as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.maps.append(mapped)
+        view = memoryview(mapped)
+        self.views.append(view)
+        return view
+
+    def __len__(self):
+        return self.rows
+
+    def column(self, name):
+        ''' The whole column as a memoryview of ints, e.g. sum(column("word_count")). '''
+        return self.columns[name]
+
+    def url(self, i):
+        start = self.columns["url_offset"][i]
+        return str(self.urls[start:start + self.columns["url_length"][i]], "utf-8")
+
+    def content_type(self, i):
+        return self.types[self.columns["content_type"][i]]
+
+    def body(self, i):
+        ''' The page as it was downloaded: a memoryview into the mmap, or bytes
+        for a compressed body. '''
+        start = self.columns["body_offset"][i]
+        view = self.bodies[start:start + self.columns["body_length"][i]]
+        if self.columns["flags"][i] & COMPRESSED:
+            return zlib.decompress(view)
+        return view
+
+    def record(self, i):
+        columns = self.columns
+        return PageRecord(i, self.url(i), columns["status"][i], self.content_type(i),
+                          columns["raw_length"][i], columns["simhash"][i] or None, columns["word_count"][i])
+
+    def records(self, start=0, stop=None):
+        for i in range(start, self.rows if stop is None else min(stop, self.rows)):
+            yield self.record(i)
+
+    def __iter__(self):
+        return self.records()
+
+    def ranges(self, parts):
+        ''' Split the rows into about `parts` contiguous (start, stop) ranges. '''
+        step = max(1, -(-self.rows // max(1, parts)))
+        return [(start, min(start + step, self.rows)) for start in range(0, self.rows, step)]
+
+    def close(self):
+        for view in list(self.columns.values()) + self.views:
+            view.release()
+        self.columns = {}
+        self.views = []
+        for mapped in self.maps:
+            try:
+                mapped.close()
+            except BufferError:
+                pass  # a body view is still held somewhere, the mmap goes with it
+        self.maps = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+_readers = {}  # one PageReader per store per worker process
+
+
+def _map_range(path, function, start, stop):
+    reader = _readers.get(path)
+    if reader is None:
+        reader = _readers[path] = PageReader(path)
+    return function(reader, start, stop)
+
+
+def map_store(path, function, processes=None, chunk_rows=2000):
+    ''' Runs function(reader, start, stop) over the store in a process pool, one
+    call per range of about chunk_rows rows, and yields the results in row
+    order. `function` has to be a module level function so it can be pickled. '''
+    with PageReader(path) as reader:
+        ranges = reader.ranges(max(1, -(-len(reader) // chunk_rows)))
+    processes = processes or os.cpu_count() or 1
+    if processes == 1:
+        for start, stop in ranges:
+            yield _map_range(path, function, start, stop)
+        return
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(processes, mp_context=context) as executor:
+        yield from executor.map(_map_range, [path] * len(ranges), [function] * len(ranges),
+                                [start for start, _ in ranges], [stop for _, stop in ranges])
@@ -0,0 +1,118 @@
+import os
+import random
+import struct
+from threading import Lock
+
+from utils.local_cache_server import LocalCacheServer, encode_payload
+
+# Record and replay cache server traffic. A corpus file is a run of entries,
+# each a 4-byte big endian length and then `url\n` + the payload exactly as the
+# cache server sent it (the CBOR dict with the pickled requests.Response), so a
+# replayed page goes through the same decoding as a live one.
+#   launch.py --record corpus.bin   saves every page the crawl downloads
+#   launch.py --replay corpus.bin   crawls offline from a stand-in server
+# write_synthetic_corpus makes a made-up site for benchmarks.
+
+HEADER = struct.Struct(">I")
+_letters = random.Random(0)
+VOCABULARY = ["".join(_letters.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(_letters.randint(3, 10)))
+              for _ in range(20000)]
+SEED_HOSTS = ("www.ics.uci.edu", "www.cs.uci.edu", "www.informatics.uci.edu", "www.stat.uci.edu")
+
+
+class CorpusWriter(object):
+    def __init__(self, path):
+        self.file = open(path, "ab")
+        self.lock = Lock()  # every worker thread records through the same writer
+
+    def record(self, url, payload):
+        entry = url.encode("utf-8") + b"\n" + payload
+        with self.lock:
+            self.file.write(HEADER.pack(len(entry)) + entry)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+def read_corpus(path):
+    ''' (url, payload) for every entry; a torn last entry is left out. '''
+    with open(path, "rb") as file:
+        while True:
+            header = file.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            (length,) = HEADER.unpack(header)
+            entry = file.read(length)
+            if len(entry) < length:
+                return
+            url, payload = entry.split(b"\n", 1)
+            yield url.decode("utf-8"), payload
+
+
+def load_corpus(path):
+    return dict(read_corpus(path))  # a url recorded twice keeps its last payload
+
+
+def replay_server(path, latency=0.0, error_rate=0.0, host="127.0.0.1", port=0):
+    ''' LocalCacheServer answering from a corpus file, 404 for urls not in it. '''
+    corpus = load_corpus(path)
+
+    def pages(url):
+        payload = corpus.get(url)
+        return payload if payload is not None else (404, b"", None)
+    return LocalCacheServer(pages, latency=latency, error_rate=error_rate, host=host, port=port)
+
+
+def _synthetic_page(rng, url, links, words):
+    # each page draws from its own slice of a big vocabulary, so pages are not
+    # near duplicates of each other by accident
+    start = rng.randrange(len(VOCABULARY) - 400)
+    topic = VOCABULARY[start:start + 400]
+    parts = [f"<html><head><title>{url}</title></head><body>"]
+    for _ in range(max(1, words // 40)):
+        parts.append("<p>" + " ".join(rng.choice(topic) for _ in range(40)) + "</p>")
+    parts.extend(f'<a href="{link}">{link}</a>' for link in links)
+    parts.append("</body></html>")
+    return "".join(parts).encode("utf-8")
+
+
+def write_synthetic_corpus(path, pages=2000, seed=121):
+    ''' A made-up crawl of `pages` urls over the seed hosts, reachable from the
+    seed urls: mostly html, with exact and near duplicate pages, PDFs, short
+    pages, redirects, 404s and trap urls mixed in. '''
+    rng = random.Random(seed)
+    urls = [f"https://{SEED_HOSTS[i % len(SEED_HOSTS)]}/page/{i}" for i in range(pages)]
+    copies = {}
+    if os.path.exists(path):
+        os.remove(path)
+    writer = CorpusWriter(path)
+    for host in SEED_HOSTS:
+        links = [url for url in urls[:8] if f"//{host}/" in url] + rng.sample(urls, min(5, pages))
+        writer.record(f"https://{host}", encode_payload(
+            f"https://{host}", 200, _synthetic_page(rng, host, links, 200)))
+    for i, url in enumerate(urls):
+        links = urls[i + 1:i + 4] + rng.sample(urls, min(6, pages))
+        if rng.random() < 0.05:
+            links.append(f"{url}?replytocom={i}")  # a trap, never fetched
+        kind = rng.random()
+        if kind < 0.05 and copies:
+            content = rng.choice(list(copies.values()))  # exact duplicate
+        elif kind < 0.08:
+            content = b"%PDF-1.4\n" + os.urandom(rng.randint(2000, 20000))
+        elif kind < 0.12:
+            content = _synthetic_page(rng, url, links, 20)  # too short to count
+        elif kind < 0.14:
+            writer.record(url, encode_payload(url, 302, b"", {"Location": urls[(i + 7) % pages]}))
+            continue
+        elif kind < 0.16:
+            writer.record(url, encode_payload(url, 404, b""))
+            continue
+        else:
+            content = _synthetic_page(rng, url, links, rng.randint(100, 1500))
+            if len(copies) < 50:
+                copies[url] = content
+        headers = {"Content-Type": "application/pdf"} if content.startswith(b"%PDF") and rng.random() < 0.5 else None
+        writer.record(url, encode_payload(url, 200, content, headers))
+    writer.close()
+    return [f"https://{host}" for host in SEED_HOSTS]
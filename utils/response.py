@@ -1,14 +1,177 @@
 import pickle
+import struct
+
+import cbor
+
+# The cache server's payload is a CBOR map {"url", "status", "error",
+# "response": pickled requests.Response}. Unpickling the whole Response for
+# every fetch was most of the decode time, and most fetches never look at the
+# body (errors, redirects, pages page_gate.py turns down). So:
+#  - from_payload reads the top level of the map by hand, the pickle stays a
+#    memoryview slice of the downloaded bytes (cbor.loads when it's anything
+#    but the flat map the server sends)
+#  - headers unpickle a copy of the pickle with the page body cut out, a
+#    requests.Response pickles _content first and as one bytes opcode
+#  - content is that body as a memoryview into the download, no copy, and it
+#    goes to the parser like that
+#  - raw_response still works, it unpickles everything the first time it's used
+# Under LAZY_BYTES the C cbor.loads and one plain unpickle are quicker than
+# cutting things up, so a small payload only gets the unpickle put off.
+
+LAZY_BYTES = 64 * 1024
+_UNSET = object()
+_CONTENT_KEYS = (b"\x8c\x08_content", b"X\x08\x00\x00\x00_content")  # protocol 4+, protocol 3
+_MEMO = {0x94: 1, ord("q"): 2, ord("r"): 5}  # MEMOIZE, BINPUT, LONG_BINPUT -> opcode + argument
+_BYTES = {ord("C"): 1, ord("B"): 4, 0x8e: 8}  # SHORT_BINBYTES, BINBYTES, BINBYTES8 -> length size
+_FRAME = 0x95
+_EMPTY_BYTES = b"C\x00"
+
+
+def _cbor_head(data, pos):
+    # (major type, argument, position after the head)
+    byte = data[pos]
+    major, info = byte >> 5, byte & 0x1f
+    pos += 1
+    if info < 24:
+        return major, info, pos
+    if info > 27:
+        raise ValueError("indefinite length")
+    size = 1 << (info - 24)
+    return major, int.from_bytes(data[pos:pos + size], "big"), pos + size
+
+
+def _cbor_map(payload):
+    ''' The top level map of a payload, byte strings as memoryview slices. Only
+    ints, strings, bytes and null/true/false, ValueError on anything else. '''
+    data = memoryview(payload)
+    major, count, pos = _cbor_head(data, 0)
+    if major != 5:
+        raise ValueError("not a map")
+    items = []
+    for _ in range(count * 2):
+        major, arg, pos = _cbor_head(data, pos)
+        if major == 0:
+            items.append(arg)
+        elif major == 1:
+            items.append(-1 - arg)
+        elif major in (2, 3):
+            if pos + arg > len(data):
+                raise ValueError("truncated")
+            value = data[pos:pos + arg]
+            items.append(value if major == 2 else str(value, "utf-8"))
+            pos += arg
+        elif major == 7 and arg in (20, 21, 22):
+            items.append((False, True, None)[arg - 20])
+        else:
+            raise ValueError(f"cbor major type {major}")
+    return dict(zip(items[::2], items[1::2]))
+
+
+def _split_pickle(data):
+    ''' (pickle with an empty _content, the content as a memoryview) for a
+    pickled requests.Response, None if the body can't be found. '''
+    data = memoryview(data)
+    start = bytes(data[:256])  # _content is the first thing in the state dict
+    for key in _CONTENT_KEYS:
+        pos = start.find(key)
+        if pos >= 0:
+            pos += len(key)
+            break
+    else:
+        return None
+    pos += _MEMO.get(data[pos], 0)
+    size = _BYTES.get(data[pos])
+    if size is None:
+        return None
+    body = pos + 1 + size
+    end = body + int.from_bytes(data[pos + 1:body], "little")
+    if end > len(data):
+        return None
+    head = bytearray(data[:pos])
+    if len(head) > 11 and head[0] == 0x80 and head[2] == _FRAME:
+        # protocol 4+ frames: a body under 64KB sits inside the first frame,
+        # which gets shorter; a bigger one is written between two frames
+        frame_end = 11 + struct.unpack_from("<Q", head, 3)[0]
+        if pos < frame_end:
+            struct.pack_into("<Q", head, 3, frame_end - 11 - (end - pos - len(_EMPTY_BYTES)))
+        elif pos != frame_end:
+            return None
+    head += _EMPTY_BYTES
+    head += data[end:]
+    return bytes(head), data[body:end]
+
 
 class Response(object):
     def __init__(self, resp_dict):
         self.url = resp_dict["url"]
         self.status = resp_dict["status"]
         self.error = resp_dict["error"] if "error" in resp_dict else None
-        try:
-            self.raw_response = (
-                pickle.loads(resp_dict["response"])
-                if "response" in resp_dict else
-                None)
-        except TypeError:
-            self.raw_response = None
+        self._pickled = resp_dict["response"] if "response" in resp_dict else None
+        self.size = 0  # bytes downloaded for it, set by from_payload
+        self._raw = _UNSET
+        self._split = _UNSET
+        self._headers = _UNSET
+
+    @classmethod
+    def from_payload(cls, payload):
+        ''' A Response for the cache server's CBOR bytes, nothing unpickled yet. '''
+        if len(payload) < LAZY_BYTES:
+            fields = cbor.loads(payload)
+        else:
+            try:
+                fields = _cbor_map(payload)
+            except (ValueError, IndexError, UnicodeDecodeError):
+                fields = cbor.loads(payload)
+        response = cls(fields)
+        response.size = len(payload)
+        return response
+
+    @property
+    def raw_response(self):
+        ''' The whole requests.Response, unpickled the first time. '''
+        if self._raw is _UNSET:
+            try:
+                self._raw = pickle.loads(self._pickled) if self._pickled is not None else None
+            except TypeError:
+                self._raw = None
+        return self._raw
+
+    def _parts(self):
+        if self._split is _UNSET:
+            self._split = None
+            if (isinstance(self._pickled, (bytes, memoryview)) and len(self._pickled) >= LAZY_BYTES
+                    and self._raw is _UNSET):
+                try:
+                    self._split = _split_pickle(self._pickled)
+                except (IndexError, ValueError):
+                    pass
+        return self._split
+
+    @property
+    def headers(self):
+        ''' The response headers ({} without a response), the body isn't unpickled. '''
+        if self._headers is _UNSET:
+            headers = None
+            parts = self._parts()
+            if parts is not None:
+                try:
+                    headers = pickle.loads(parts[0]).headers
+                except Exception:
+                    self._split = None  # not what it looked like, do it the slow way
+            if headers is None:
+                raw = self.raw_response
+                headers = raw.headers if raw is not None else {}
+            self._headers = headers
+        return self._headers
+
+    @property
+    def content(self):
+        ''' The page body, a memoryview into the download when it could be cut
+        out of the pickle, else raw_response.content. None without a response. '''
+        if self._pickled is None:
+            return None
+        self.headers  # makes sure the cut out pickle really was a Response
+        if self._split is not None:
+            return self._split[1]
+        raw = self.raw_response
+        return raw.content if raw is not None else None
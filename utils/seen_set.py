@@ -0,0 +1,219 @@
+import math
+import base64
+from array import array
+from hashlib import blake2b
+
+# Compact "have we seen this url" sets. A url (or urlhash) is reduced to a 64-bit
+# digest and stored in an open-addressing table backed by array('Q'), 8 bytes a
+# slot instead of a whole Python str in a set. An optional scalable Bloom filter
+# sits in front: it answers most "not seen" checks on its own, and with
+# exact=False it is the only tier (a few bits per url, with a reported false
+# positive rate).
+
+
+def digest64(key):
+    ''' 64-bit digest of a str key, never 0 (0 marks an empty slot). '''
+    return int.from_bytes(blake2b(key.encode("utf-8"), digest_size=8).digest(), "little") or 1
+
+
+class DigestTable(object):
+    ''' Set of non-zero 64-bit ints with linear probing. '''
+    MAX_LOAD = 0.65
+
+    def __init__(self, capacity=1 << 16):
+        size = 1
+        while size < capacity / self.MAX_LOAD:
+            size <<= 1
+        self.slots = array("Q", bytes(8 * size))
+        self.mask = size - 1
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, digest):
+        slots, mask = self.slots, self.mask
+        i = digest & mask
+        while True:
+            value = slots[i]
+            if value == digest:
+                return True
+            if not value:
+                return False
+            i = (i + 1) & mask
+
+    def add(self, digest):
+        ''' True if the digest was not there before. '''
+        slots, mask = self.slots, self.mask
+        i = digest & mask
+        while True:
+            value = slots[i]
+            if value == digest:
+                return False
+            if not value:
+                slots[i] = digest
+                self.count += 1
+                if self.count > self.MAX_LOAD * len(slots):
+                    self._grow()
+                return True
+            i = (i + 1) & mask
+
+    def reserve(self, count):
+        ''' Room for `count` digests in all, so adding them doesn't grow (and
+        re-add everything) again and again. '''
+        if count > self.MAX_LOAD * len(self.slots):
+            size = len(self.slots)
+            while count > self.MAX_LOAD * size:
+                size <<= 1
+            self._grow(size)
+
+    def _grow(self, size=None):
+        old = self.slots
+        self.slots = array("Q", bytes(8 * (size or 2 * len(old))))
+        self.mask = len(self.slots) - 1
+        self.count = 0
+        for digest in old:
+            if digest:
+                self.add(digest)
+
+    def __iter__(self):
+        return (digest for digest in self.slots if digest)
+
+    def nbytes(self):
+        return self.slots.itemsize * len(self.slots)
+
+
+class BloomFilter(object):
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bits = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.bits / capacity * math.log(2))))
+        self.array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    # positions come from double hashing on the two halves of the digest; the
+    # loops are written out so a miss usually stops after the first probe
+
+    def __contains__(self, digest):
+        array, bits = self.array, self.bits
+        position, step = digest & 0xFFFFFFFF, (digest >> 32) | 1
+        for _ in range(self.hashes):
+            position %= bits
+            if not array[position >> 3] & (1 << (position & 7)):
+                return False
+            position += step
+        return True
+
+    def add(self, digest):
+        array, bits = self.array, self.bits
+        position, step = digest & 0xFFFFFFFF, (digest >> 32) | 1
+        for _ in range(self.hashes):
+            position %= bits
+            array[position >> 3] |= 1 << (position & 7)
+            position += step
+        self.count += 1
+
+    def false_positive_rate(self):
+        # from how full it actually is
+        return (1 - math.exp(-self.hashes * self.count / self.bits)) ** self.hashes
+
+
+class ScalableBloomFilter(object):
+    ''' Adds a bigger, stricter filter whenever the current one is full, so the
+    overall false positive rate stays under `error_rate` however many urls come. '''
+    GROWTH = 4
+    TIGHTENING = 0.8
+
+    def __init__(self, capacity=1 << 16, error_rate=0.001):
+        self.error_rate = error_rate
+        self.filters = [BloomFilter(capacity, error_rate * (1 - self.TIGHTENING))]
+
+    def __contains__(self, digest):
+        return any(digest in bloom for bloom in self.filters)
+
+    def add(self, digest):
+        bloom = self.filters[-1]
+        if bloom.count >= bloom.capacity:
+            bloom = BloomFilter(bloom.capacity * self.GROWTH, bloom.error_rate * self.TIGHTENING)
+            self.filters.append(bloom)
+        bloom.add(digest)
+
+    def false_positive_rate(self):
+        miss = 1.0
+        for bloom in self.filters:
+            miss *= 1 - bloom.false_positive_rate()
+        return 1 - miss
+
+    def nbytes(self):
+        return sum(len(bloom.array) for bloom in self.filters)
+
+
+class SeenSet(object):
+    ''' Drop-in for a set of urls (add, in, update, len). exact=False keeps only
+    the Bloom filter; bloom=True puts one in front of the exact table. '''
+    def __init__(self, exact=True, bloom=False, capacity=1 << 16, error_rate=0.001):
+        self.table = DigestTable(capacity) if exact else None
+        self.bloom = ScalableBloomFilter(capacity, error_rate) if bloom or not exact else None
+        self.count = 0
+        self.bloom_checks = 0  # lookups the Bloom filter couldn't answer alone
+        self.lookups = 0
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, key):
+        return self.contains_digest(digest64(key))
+
+    def contains_digest(self, digest):
+        self.lookups += 1
+        if self.bloom is not None:
+            if digest not in self.bloom:
+                return False
+            self.bloom_checks += 1
+            if self.table is None:
+                return True
+        return digest in self.table
+
+    def add(self, key):
+        ''' True if the key is new. '''
+        return self.add_digest(digest64(key))
+
+    def add_digest(self, digest):
+        if self.table is not None:
+            if not self.table.add(digest):
+                return False
+        elif digest in self.bloom:
+            return False  # maybe a false positive, see false_positive_rate()
+        if self.bloom is not None:
+            self.bloom.add(digest)
+        self.count += 1
+        return True
+
+    def update(self, keys):
+        for key in keys:
+            self.add(key)
+
+    def false_positive_rate(self):
+        ''' Chance that a new key is reported as seen: the Bloom filter's estimate
+        when it is the only tier, otherwise the chance of a 64-bit digest clash. '''
+        if self.table is None:
+            return self.bloom.false_positive_rate()
+        return min(1.0, self.count / 2.0 ** 64)
+
+    def nbytes(self):
+        return ((self.table.nbytes() if self.table is not None else 0)
+                + (self.bloom.nbytes() if self.bloom is not None else 0))
+
+    def dump(self):
+        ''' The digests as base64 text, for saving with the rest of the crawl state
+        (exact tier only). '''
+        return base64.b64encode(array("Q", self.table).tobytes()).decode("ascii")
+
+    def load(self, text):
+        digests = array("Q")
+        digests.frombytes(base64.b64decode(text))
+        if self.table is not None:
+            self.table.reserve(self.count + len(digests))
+        for digest in digests:
+            self.add_digest(digest)
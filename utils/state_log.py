@@ -0,0 +1,135 @@
+import os
+import json
+import time
+from json.encoder import encode_basestring_ascii
+
+# Crawl state is kept as a full JSON snapshot plus an append-only log of per page
+# records. Records are buffered and appended every `checkpoint_pages` pages or
+# `checkpoint_secs` seconds, so a crash loses at most one checkpoint interval. Once
+# the delta log gets bigger than the snapshot it is compacted into a new snapshot,
+# which keeps the per page cost constant instead of growing with the crawl.
+# The snapshot's first line is the state, exact word counts follow it one
+# `"word": count` per line (json escapes newlines in strings), so the biggest
+# part of it can be cut at any line break and read in pieces, see report.py.
+MIN_COMPACT_BYTES = 4 * 1024 * 1024
+
+
+def parse_word_lines(data):
+    """{word: count} from a run of whole word lines (bytes)."""
+    data = data.strip()
+    if not data:
+        return {}
+    return json.loads(b"{" + data.replace(b"\n", b",") + b"}")
+
+
+class StateLog(object):
+    def __init__(self, path, checkpoint_pages=50, checkpoint_secs=30.0):
+        self.path = path
+        self.delta_path = f"{path}.delta"
+        self.checkpoint_pages = max(1, checkpoint_pages)
+        self.checkpoint_secs = checkpoint_secs
+        self.pending = []
+        self.seq = 0  # sequence number of the last record handed to append()
+        self.closed = False
+        self.last_checkpoint = time.time()
+        self.snapshot_bytes = os.path.getsize(path) if os.path.exists(path) else 0
+        self.delta_bytes = os.path.getsize(self.delta_path) if os.path.exists(self.delta_path) else 0
+
+    def remove(self):
+        for path in (self.path, self.delta_path, f"{self.path}.tmp"):
+            if os.path.exists(path):
+                os.remove(path)
+        self.pending = []
+        self.seq = 0
+        self.snapshot_bytes = self.delta_bytes = 0
+
+    def append(self, record):
+        """Buffers one page record, returns True if this triggered a checkpoint."""
+        if self.closed:
+            return False  # a page still being worked on when the crawl stopped, its url stays pending
+        self.seq += 1
+        record["seq"] = self.seq
+        self.pending.append(record)
+        if (len(self.pending) >= self.checkpoint_pages
+                or time.time() - self.last_checkpoint >= self.checkpoint_secs):
+            self.checkpoint()
+            return True
+        return False
+
+    def checkpoint(self):
+        """Appends the buffered records to the delta log and fsyncs it."""
+        self.last_checkpoint = time.time()
+        if not self.pending:
+            return
+        data = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in self.pending)
+        with open(self.delta_path, "a") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        self.delta_bytes += len(data)
+        self.pending = []
+
+    def close(self):
+        """Last checkpoint, records appended and snapshots written after this are
+        dropped: a page that missed the end is still pending in the frontier."""
+        self.checkpoint()
+        self.closed = True
+
+    def needs_compaction(self):
+        return not self.closed and self.delta_bytes > max(self.snapshot_bytes, MIN_COMPACT_BYTES)
+
+    def write_snapshot(self, state, words=None):
+        """Writes the full state and truncates the delta log. `state` must already
+        include every record appended so far. `words` (exact word counts) go on
+        their own lines after it."""
+        if self.closed:
+            return
+        state = dict(state, seq=self.seq)
+        if words is not None:
+            state["word_lines"] = len(words)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as file:
+            file.write(json.dumps(state) + "\n")
+            if words is not None:
+                file.writelines(f"{encode_basestring_ascii(word)}: {count}\n" for word, count in words.items())
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.path)
+        # a crash right here is fine, load() skips records older than the snapshot
+        open(self.delta_path, "w").close()
+        self.snapshot_bytes = os.path.getsize(self.path)
+        self.delta_bytes = 0
+        self.pending = []
+        self.last_checkpoint = time.time()
+
+    def load(self):
+        """Returns (snapshot or None, records written after it). Raises
+        FileNotFoundError if there is no saved state at all."""
+        snapshot = None
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as file:
+                snapshot = json.loads(file.readline())  # the whole file for old snapshots
+                if "word_lines" in snapshot:
+                    snapshot["words"] = parse_word_lines(file.read())
+        elif not os.path.exists(self.delta_path):
+            raise FileNotFoundError(self.path)
+
+        done = snapshot.get("seq", 0) if snapshot else 0
+        records = []
+        if os.path.exists(self.delta_path):
+            good_bytes = 0
+            with open(self.delta_path, "rb") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # half written last line from a crash
+                    good_bytes += len(line)
+                    if record["seq"] > done:
+                        records.append(record)
+            if good_bytes < os.path.getsize(self.delta_path):
+                # drop the torn tail so new appends don't land after it
+                os.truncate(self.delta_path, good_bytes)
+            self.delta_bytes = good_bytes
+        self.seq = records[-1]["seq"] if records else done
+        return snapshot, records
@@ -0,0 +1,152 @@
+import zlib
+import base64
+from array import array
+from collections import Counter
+
+# Word frequency aggregators for the crawl report. Both take one page's
+# {word: count} at a time and keep the current top words on the side, so
+# "top 50" is read off a K-sized table instead of sorting every word seen.
+#   WordCounts       exact, a Counter of every word
+#   ApproxWordCounts fixed memory, a Count-Min Sketch plus the heavy hitters
+# to_state()/load() turn them into JSON-friendly data for the crawl snapshot.
+
+
+class TopK(object):
+    ''' The k words with the largest counts. Counts offered for a word only ever
+    go up, so a word that drops out can only come back with a bigger count. '''
+    def __init__(self, k=50):
+        self.k = k
+        self.counts = {}
+        self.min_word = None
+        self.floor = 0  # smallest count in here once it is full, else 0
+
+    def offer(self, word, count):
+        counts = self.counts
+        if word in counts:
+            counts[word] = count
+            if word != self.min_word:
+                return
+        elif len(counts) < self.k:
+            counts[word] = count
+            if len(counts) < self.k:
+                return
+        elif count > self.floor:
+            del counts[self.min_word]
+            counts[word] = count
+        else:
+            return
+        self.min_word = min(counts, key=counts.get)
+        self.floor = counts[self.min_word]
+
+    def items(self, n=None):
+        top = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)
+        return top if n is None else top[:n]
+
+
+class WordCounts(object):
+    def __init__(self, k=50):
+        self.counts = Counter()
+        self.top_words = TopK(k)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def get(self, word, default=0):
+        return self.counts.get(word, default)
+
+    def update(self, page_counts):
+        counts, top_words = self.counts, self.top_words
+        counts.update(page_counts)
+        floor, tracked = top_words.floor, top_words.counts
+        for word in page_counts:
+            count = counts[word]
+            if count > floor or word in tracked:
+                top_words.offer(word, count)
+                floor = top_words.floor
+
+    def top(self, n=50):
+        ''' [(word, count), ...] biggest first, at most k of them. '''
+        return self.top_words.items(n)
+
+    def to_state(self):
+        return dict(self.counts)
+
+    def load(self, state):
+        if "table" in state:
+            state = state["top"]  # saved by ApproxWordCounts, only its top words are exact enough
+        self.update(state)
+
+
+class ApproxWordCounts(object):
+    ''' Count-Min Sketch (conservative update) of depth x width counters; a
+    word's estimate is never below its real count and is above it by at most
+    about e / width of all the words seen, most of the time. '''
+    def __init__(self, k=50, width=1 << 18, depth=4):
+        self.width = width
+        self.depth = depth
+        self.table = array("Q", bytes(8 * width * depth))
+        self.total = 0
+        self.top_words = TopK(k)
+
+    def __len__(self):
+        return len(self.top_words.counts)
+
+    def _cells(self, word):
+        # double hashing, two cheap checksums give the depth row positions
+        data = word.encode("utf-8")
+        h1, h2 = zlib.crc32(data), zlib.adler32(data) | 1
+        width = self.width
+        return [row * width + (h1 + row * h2) % width for row in range(self.depth)]
+
+    def get(self, word, default=0):
+        table = self.table
+        return min(table[cell] for cell in self._cells(word)) or default
+
+    def update(self, page_counts):
+        table, top_words = self.table, self.top_words
+        floor, tracked = top_words.floor, top_words.counts
+        width, offsets = self.width, range(0, self.width * self.depth, self.width)
+        crc32, adler32 = zlib.crc32, zlib.adler32
+        for word, count in page_counts.items():
+            data = word.encode("utf-8")
+            h1, h2 = crc32(data), adler32(data) | 1
+            cells = [offset + (h1 + offset // width * h2) % width for offset in offsets]
+            estimate = min([table[cell] for cell in cells]) + count
+            for cell in cells:
+                if table[cell] < estimate:
+                    table[cell] = estimate
+            if estimate > floor or word in tracked:
+                top_words.offer(word, estimate)
+                floor = top_words.floor
+        self.total += sum(page_counts.values())
+
+    def top(self, n=50):
+        return self.top_words.items(n)
+
+    def nbytes(self):
+        return self.table.itemsize * len(self.table)
+
+    def to_state(self):
+        return {
+            "width": self.width,
+            "depth": self.depth,
+            "total": self.total,
+            "table": base64.b64encode(zlib.compress(self.table.tobytes())).decode("ascii"),
+            "top": dict(self.top_words.counts)
+        }
+
+    def load(self, state):
+        if "table" not in state:
+            self.update(state)  # exact counts saved by WordCounts
+            return
+        self.width, self.depth, self.total = state["width"], state["depth"], state["total"]
+        self.table = array("Q")
+        self.table.frombytes(zlib.decompress(base64.b64decode(state["table"])))
+        for word, count in state["top"].items():
+            self.top_words.offer(word, count)
+
+
+COUNTERS = {
+    "exact": WordCounts,
+    "approx": ApproxWordCounts,
+}